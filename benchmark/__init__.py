@@ -0,0 +1 @@
+"""Benchmarks for pythonping, not shipped with the package"""
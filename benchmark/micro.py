@@ -0,0 +1,178 @@
+"""Microbenchmarks of the packet and result hot paths, runnable offline and without root
+
+Run with `python -m benchmark.micro`, use --output to save a baseline and --compare to check
+a later run against it."""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from pythonping import executor, icmp, payload_provider, utils
+
+
+SIZES = [1, 64, 512, 1500, 8192, 65536]
+IP_HEADER = bytes(20)
+PATTERN = b'abc'
+PROVIDER_PAYLOADS = 64
+
+
+def bench_checksum(size):
+    data = bytes(size)
+    return lambda: icmp.checksum(data)
+
+
+def bench_icmp_packet(size):
+    payload = bytes(size)
+    return lambda: icmp.ICMP(icmp.Types.EchoRequest, payload=payload, identifier=1).packet
+
+
+def bench_icmp_unpack(size):
+    raw = IP_HEADER + icmp.ICMP(icmp.Types.EchoReply, payload=bytes(size), identifier=1).packet
+    packet = icmp.ICMP()
+    return lambda: packet.unpack(raw)
+
+
+def bench_response_list_append(size):
+    reply = icmp.ICMP.generate_from_raw(
+        IP_HEADER + icmp.ICMP(icmp.Types.EchoReply, payload=bytes(size), identifier=1).packet
+    )
+    response = executor.Response(executor.Message('', reply, '127.0.0.1'), 0.001)
+    responses = executor.ResponseList()
+    return lambda: responses.append(response)
+
+
+def bench_random_text(size):
+    return lambda: utils.random_text(size)
+
+
+def bench_provider_list(size):
+    payloads = [bytes(size)] * PROVIDER_PAYLOADS
+    return lambda: list(payload_provider.List(payloads))
+
+
+def bench_provider_repeat(size):
+    payload = bytes(size)
+    return lambda: list(payload_provider.Repeat(payload, PROVIDER_PAYLOADS))
+
+
+def bench_provider_sweep(size):
+    start = max(1, size - PROVIDER_PAYLOADS + 1)
+    return lambda: list(payload_provider.Sweep(PATTERN, start, size))
+
+
+BENCHMARKS = {
+    'icmp.checksum': bench_checksum,
+    'icmp.ICMP.packet': bench_icmp_packet,
+    'icmp.ICMP.unpack': bench_icmp_unpack,
+    'executor.ResponseList.append': bench_response_list_append,
+    'utils.random_text': bench_random_text,
+    'payload_provider.List': bench_provider_list,
+    'payload_provider.Repeat': bench_provider_repeat,
+    'payload_provider.Sweep': bench_provider_sweep,
+}
+
+
+def measure(function, repeat=5, min_time=0.2):
+    """Measures the time of one call to a function, as the best of several repeats
+
+    :param function: The function to time, called without arguments
+    :type function: callable
+    :param repeat: How many times to repeat the measure, the fastest is kept
+    :type repeat: int
+    :param min_time: Minimum duration of each repeat, in seconds
+    :type min_time: float
+    :return: Seconds per call
+    :rtype: float"""
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 10 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    return min([elapsed] + timer.repeat(repeat - 1, number)) / number
+
+
+def run(names=None, sizes=SIZES, repeat=5, min_time=0.2, out=None):
+    """Runs the benchmarks
+
+    :param names: Names of the benchmarks to run, None for all of them
+    :type names: Union[None, list]
+    :param sizes: Payload sizes to run each benchmark with, in bytes
+    :type sizes: list
+    :param repeat: How many times to repeat each measure, the fastest is kept
+    :type repeat: int
+    :param min_time: Minimum duration of each repeat, in seconds
+    :type min_time: float
+    :param out: Stream where to print progress, None to stay silent
+    :type out: Union[None, file]
+    :return: Machine-readable results, seconds per call for each benchmark and size
+    :rtype: dict"""
+    results = {}
+    for name in names or BENCHMARKS:
+        results[name] = {}
+        for size in sizes:
+            results[name][str(size)] = measure(BENCHMARKS[name](size), repeat, min_time)
+            if out is not None:
+                print('{0:<32}{1:>8} B{2:>14.3f} us'.format(name, size, results[name][str(size)] * 1000000), file=out)
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Finds benchmarks slower than in the baseline
+
+    :param baseline: Results of a previous run
+    :type baseline: dict
+    :param current: Results of the current run
+    :type current: dict
+    :param tolerance: Allowed slowdown ratio before reporting a regression, 0.2 means 20% slower
+    :type tolerance: float
+    :return: Regressions as (benchmark, size, baseline seconds, current seconds)
+    :rtype: list"""
+    regressions = []
+    for name, sizes in current['results'].items():
+        for size, seconds in sizes.items():
+            previous = baseline['results'].get(name, {}).get(size)
+            if previous is not None and seconds > previous * (1 + tolerance):
+                regressions.append((name, size, previous, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks of pythonping hot paths')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run, all of them if omitted')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Payload sizes in bytes')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats of each measure, the fastest is kept')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per repeat')
+    parser.add_argument('--output', help='Save the results as JSON to this file')
+    parser.add_argument('--compare', help='Compare against a baseline JSON file, exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown ratio when comparing')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {0}, choose from {1}'.format(', '.join(sorted(unknown)),
+                                                                       ', '.join(BENCHMARKS)))
+    results = run(args.names, args.sizes, args.repeat, args.min_time, out=sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.tolerance)
+        for name, size, previous, seconds in regressions:
+            print('REGRESSION {0} at {1} B: {2:.3f} us -> {3:.3f} us'.format(
+                name, size, previous * 1000000, seconds * 1000000
+            ))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""End-to-end scaling benchmark of the engine against the simulated network, runnable offline and without root
+
+Runs a matrix of target counts, payload sizes, threads and requests in flight per target, and reports for each
+combination the achieved probes per second, the CPU time per probe, the memory per in-flight request and the RTT
+added on top of the simulated latency. Run with `python -m benchmark.scaling --output results.json`."""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+import pythonping
+from pythonping import executor, payload_provider, simulation
+
+# Allocations counted as memory of the engine: those of the package, but not of the simulated network
+ENGINE_FRAMES = [
+    tracemalloc.Filter(True, os.path.join(os.path.dirname(pythonping.__file__), '*')),
+    tracemalloc.Filter(False, simulation.__file__),
+]
+
+
+class Snapshot(Exception):
+    """Stops a prober once its requests in flight are sent, carrying the allocations traced at that time"""
+
+
+class SnapshotSocket(simulation.Socket):
+    """Simulated transport taking a snapshot of the traced allocations once a number of requests is sent"""
+    def __init__(self, simulated_network, destination, requests):
+        """Creates a transport stopping the prober using it at the given request
+
+        :param requests: Requests sent before taking the snapshot
+        :type requests: int
+
+        See simulation.Socket for the other parameters"""
+        super().__init__(simulated_network, destination)
+        self.requests = requests
+
+    def send(self, packet):
+        self.requests -= 1
+        if not self.requests:
+            raise Snapshot(tracemalloc.take_snapshot())
+        super().send(packet)
+
+
+def target_addresses(targets):
+    """Builds the addresses of the simulated targets
+
+    :param targets: Number of targets
+    :type targets: int
+    :return: IPv4 addresses
+    :rtype: list"""
+    return ['10.{0}.{1}.{2}'.format(n >> 16 & 0xFF, n >> 8 & 0xFF, n & 0xFF) for n in range(1, targets + 1)]
+
+
+def prober(address, transport, size, count=10, timeout=1, in_flight=1):
+    """Builds what pings a target: a Communicator, which waits for each reply before the next request, with one
+    request in flight, or a Flood keeping in_flight requests waiting for a reply otherwise
+
+    :return: The prober, see run_scenario for the parameters
+    :rtype: executor.Communicator"""
+    payload = bytes(size)
+    if in_flight > 1:
+        return executor.Flood(address, count, payload, timeout, batch=in_flight, seed_id=1, transport=transport,
+                              window=in_flight)
+    return executor.Communicator(address, payload_provider.Repeat(payload, count), timeout, 0, seed_id=1,
+                                 transport=transport)
+
+
+def run_scenario(targets, size, threads, count=10, latency=0.001, timeout=1, in_flight=1):
+    """Pings every target from a pool of threads, each thread serving its share of targets one after the other
+
+    The requests in flight are as many per target as in_flight, times the busy threads.
+
+    :param targets: Number of targets
+    :type targets: int
+    :param size: Payload size, in bytes
+    :type size: int
+    :param threads: Number of threads
+    :type threads: int
+    :param count: Probes sent to each target
+    :type count: int
+    :param latency: Simulated round trip time, in seconds
+    :type latency: float
+    :param timeout: Timeout of each probe, in seconds
+    :type timeout: float
+    :param in_flight: Requests waiting for a reply at once, per target
+    :type in_flight: int
+    :return: Probes sent, wall seconds, CPU seconds and the round trip times of the replies
+    :rtype: (int, float, float, list)"""
+    network = simulation.Network(latency=latency)
+    addresses = target_addresses(targets)
+    rtts = []
+    lock = threading.Lock()
+
+    def worker(share):
+        for address in share:
+            comm = prober(address, network.socket(address), size, count, timeout, in_flight)
+            comm.run()
+            if isinstance(comm, executor.Flood):
+                times = comm.rtts
+            else:
+                times = [response.time_elapsed for response in comm.responses if response.success]
+            with lock:
+                rtts.extend(times)
+
+    pool = [threading.Thread(target=worker, args=(addresses[n::threads],)) for n in range(threads)]
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return targets * count, wall, cpu, rtts
+
+
+def engine_memory(size, count=10, timeout=1, in_flight=1):
+    """Measures the memory allocated by the engine to ping a target, from building its prober until its requests in
+    flight are sent
+
+    Only allocations made by the package are counted, those of the simulated network and of the benchmark are not.
+
+    :return: Size in bytes, see run_scenario for the parameters
+    :rtype: int"""
+    requests = min(in_flight, count)
+    transport = SnapshotSocket(simulation.Network(), target_addresses(1)[0], requests)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        try:
+            prober(transport.destination, transport, size, count, timeout, in_flight).run()
+            raise RuntimeError('Fewer than {0} requests sent'.format(requests))
+        except Snapshot as snapshot:
+            after, = snapshot.args
+    finally:
+        tracemalloc.stop()
+    stats = after.filter_traces(ENGINE_FRAMES).compare_to(before.filter_traces(ENGINE_FRAMES), 'filename')
+    return sum(stat.size_diff for stat in stats)
+
+
+def measure(targets, size, threads, count=10, latency=0.001, timeout=1, in_flight=1):
+    """Runs a scenario and computes its metrics
+
+    Memory is measured apart from the run, so that tracing allocations does not affect time measures.
+
+    :return: Parameters and metrics of the scenario
+    :rtype: dict"""
+    probes, wall, cpu, rtts = run_scenario(targets, size, threads, count, latency, timeout, in_flight=in_flight)
+    # Requests in flight at once: the window of each target pinged concurrently, at most the requests of a target
+    total_in_flight = min(threads, targets) * min(in_flight, count)
+    return {
+        'targets': targets,
+        'size': size,
+        'threads': threads,
+        'count': count,
+        'latency': latency,
+        'in_flight': in_flight,
+        'total_in_flight': total_in_flight,
+        'probes': probes,
+        'lost': probes - len(rtts),
+        'probes_per_second': probes / wall,
+        'cpu_per_probe': cpu / probes,
+        'memory_per_in_flight': engine_memory(size, count, timeout, in_flight) / min(in_flight, count),
+        'rtt_overhead': sum(rtts) / len(rtts) - latency if rtts else None
+    }
+
+
+def run(targets=(1, 10, 100), sizes=(64, 1400), threads=(1, 4, 16), count=10, latency=0.001, timeout=1, out=None,
+        in_flight=(1, 8)):
+    """Runs the whole matrix of scenarios
+
+    :param out: Stream where to print progress, None to stay silent
+    :type out: Union[None, file]
+    :return: Machine-readable results, one row per scenario
+    :rtype: dict"""
+    rows = []
+    for target_count, size, thread_count, window in itertools.product(targets, sizes, threads, in_flight):
+        row = measure(target_count, size, thread_count, count, latency, timeout, window)
+        rows.append(row)
+        if out is not None:
+            print('targets={targets:<6} size={size:<6} threads={threads:<4} in_flight={in_flight:<4} '
+                  '{probes_per_second:>10.0f} pps '
+                  '{cpu_us:>8.1f} us cpu/probe {memory_per_in_flight:>10.0f} B/in-flight '
+                  '{overhead_us} us rtt overhead'.format(
+                      cpu_us=row['cpu_per_probe'] * 1000000,
+                      overhead_us='-' if row['rtt_overhead'] is None
+                      else '{0:.1f}'.format(row['rtt_overhead'] * 1000000),
+                      **row
+                  ), file=out)
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': rows
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end scaling benchmark of the pythonping engine')
+    parser.add_argument('--targets', type=int, nargs='+', default=[1, 10, 100], help='Target counts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1400], help='Payload sizes in bytes')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16], help='Thread counts')
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 8],
+                        help='Requests waiting for a reply at once, per target')
+    parser.add_argument('--count', type=int, default=10, help='Probes per target')
+    parser.add_argument('--latency', type=float, default=0.001, help='Simulated round trip time in seconds')
+    parser.add_argument('--timeout', type=float, default=1, help='Timeout of each probe in seconds')
+    parser.add_argument('--output', help='Save the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.targets, args.sizes, args.threads, args.count, args.latency, args.timeout, out=sys.stdout,
+                  in_flight=args.in_flight)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
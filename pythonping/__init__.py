@@ -1,11 +1,34 @@
+import collections
 import sys
+import threading
 from random import randint
-from . import network, executor, payload_provider
-from .utils import random_text
+from . import network, executor, payload_provider, dispatcher, scanner
+from .cache import ResultCache, SingleFlight, cache_key
+from .capture import Capture
+from .executor import SuccessOn
+from .utils import random_text, cached_payload
+
+# Names imported by "from pythonping import *", with the modules of the package, which it imported before __all__
+__all__ = ['ping', 'traceroute', 'discover_mtu', 'flood', 'scan', 'ResultCache', 'SingleFlight', 'cache_key',
+           'random_text', 'SuccessOn', 'Capture', 'SEED_IDs', 'network', 'executor', 'payload_provider', 'icmp',
+           'utils', 'dispatcher', 'scanner', 'capture', 'cache']
 
 
 # this needs to be available across all thread usages and will hold ints
 SEED_IDs = []
+_SEED_IDS_LOCK = threading.Lock()
+# path MTU found by discover_mtu, by target and address family, least recently used first
+MTU_CACHE = collections.OrderedDict()
+MAX_MTU_CACHE = 1024
+_MTU_CACHE_LOCK = threading.Lock()
+# round trip time estimators used by ping with adaptive_timeout, by target and address family, least recently used first
+RTT_ESTIMATORS = collections.OrderedDict()
+MAX_RTT_ESTIMATORS = 1024
+_RTT_ESTIMATORS_LOCK = threading.Lock()
+# results of recent pings, used by ping with cache=True
+RESULT_CACHE = ResultCache()
+# pings in progress, joined by ping with coalesce=True
+SINGLE_FLIGHT = SingleFlight()
 
 
 def ping(target,
@@ -21,7 +44,19 @@ def ping(target,
          out=sys.stdout,
          match=False,
          source=None,
-         out_format='legacy'):
+         out_format='legacy',
+         tracer=None,
+         family=None,
+         stop_on=None,
+         adaptive_timeout=False,
+         dispatch=False,
+         receive_buffer=None,
+         send_buffer=None,
+         cache=None,
+         coalesce=False,
+         timestamp_payload=False,
+         capture=None,
+         stop_event=None):
     """Pings a remote host and handles the responses
 
     :param target: The remote hostname or IP address to ping
@@ -34,7 +69,7 @@ def ping(target,
     :type size: int
     :param interval: Interval to wait between pings
     :type interval: int
-    :param payload: Payload content, leave None if size is set to use random text
+    :param payload: Payload content, leave None if size is set to use random text (cached by size)
     :type payload: Union[str, bytes]
     :param sweep_start: If size is not set, initial size in a sweep of sizes
     :type sweep_start: int
@@ -53,36 +88,409 @@ def ping(target,
     :type match: bool
     :param repr_format: How to __repr__ the response. Allowed: legacy, None
     :type repr_format: str
+    :param tracer: Records the time spent in each stage of each probe, see tracing.Tracer
+    :type tracer: Union[None, tracing.Tracer]
+    :param family: Address family to use: ipv4, ipv6, None to prefer IPv4 when the target has both, or dual to ping the
+    first address of each family of the target concurrently and return the responses of the fastest one
+    :type family: Union[None, str]
+    :param stop_on: Stop pinging as soon as the outcome of success(stop_on) is known, e.g. at the first reply with
+    SuccessOn.One, None to always send count pings
+    :type stop_on: Union[None, SuccessOn]
+    :param adaptive_timeout: Wait for each reply as long as the past round trip times of the target suggest, with timeout
+    as maximum. True to use an estimator kept across calls for this target, or the executor.RttEstimator to use
+    :type adaptive_timeout: Union[bool, executor.RttEstimator]
+    :param dispatch: Share one socket and receiving thread with the other threads pinging with dispatch, instead of
+    opening a socket that receives the replies of every thread. Only used when df, source and the buffer sizes are not
+    set. All their replies go through the receive buffer of the shared socket, which may drop some under heavy load
+    :type dispatch: bool
+    :param receive_buffer: Size in bytes of the kernel buffer holding replies not read yet (SO_RCVBUF), None for the
+    system default. Replies dropped because it was full are reported in stats_kernel_drops of the responses
+    :type receive_buffer: Union[None, int]
+    :param send_buffer: Size in bytes of the kernel buffer holding requests not sent yet (SO_SNDBUF), None for the
+    system default
+    :type send_buffer: Union[None, int]
+    :param cache: Return the responses of a previous call with the same target and probe parameters if still fresh,
+    and store the responses of this call otherwise. True to use RESULT_CACHE, shared by the whole process, or the
+    cache.ResultCache to use. Cached responses are shared between the calls returning them
+    :type cache: Union[None, bool, cache.ResultCache]
+    :param coalesce: Join the call in progress with the same target and probe parameters, if any, instead of probing
+    again, so that concurrent callers share one probe run and its responses
+    :type coalesce: bool
+    :param timestamp_payload: Send payloads holding their send time and a cookie authenticating it, and compute the
+    round trip time from the payload echoed by each reply, so that the time of a late reply to an earlier ping is still
+    right. The payload is size bytes, at least 16, payload and sweeps are not supported
+    :type timestamp_payload: bool
+    :param capture: Records the packets sent and received to a pcap file, see capture.Capture. Responses returned from
+    a cache or by a coalesced call are not recorded
+    :type capture: Union[None, capture.Capture]
+    :param stop_event: Stop pinging once set, e.g. from another thread, after the ping in progress. With family dual,
+    it is set once the fastest family is done, to stop the others
+    :type stop_event: Union[None, threading.Event]
     :return: List with the result of each ping
     :rtype: executor.ResponseList"""
+    if cache is True:
+        cache = RESULT_CACHE
+    use_cache = cache is not None and cache is not False
+    if use_cache or coalesce:
+        # Parameters changing what is probed, the others only change how results are presented or measured
+        probe = dict(timeout=timeout, count=count, size=size, interval=interval, payload=payload,
+                     sweep_start=sweep_start, sweep_end=sweep_end, df=df, match=match, source=source, family=family,
+                     stop_on=stop_on, timestamp_payload=timestamp_payload)
+        key = cache_key(target, **probe)
+        responses = cache.get(key) if use_cache else None
+        shared = responses is not None
+        if not shared:
+            def run():
+                return ping(target, verbose=verbose, out=out, out_format=out_format, tracer=tracer,
+                            adaptive_timeout=adaptive_timeout, dispatch=dispatch, receive_buffer=receive_buffer,
+                            send_buffer=send_buffer, capture=capture, stop_event=stop_event, **probe)
+
+            if coalesce:
+                responses, shared = SINGLE_FLIGHT.run(key, run)
+            else:
+                responses = run()
+            if use_cache and not shared:
+                cache.put(key, responses)
+        if shared and verbose:
+            for response in responses:
+                print(response, file=out)
+        return responses
+    if family == 'dual':
+        return _ping_dual_stack(target, timeout=timeout, count=count, size=size, interval=interval, payload=payload,
+                                sweep_start=sweep_start, sweep_end=sweep_end, df=df, verbose=verbose, out=out,
+                                match=match, source=source, out_format=out_format, tracer=tracer,
+                                stop_on=stop_on, adaptive_timeout=adaptive_timeout, dispatch=dispatch,
+                                receive_buffer=receive_buffer, send_buffer=send_buffer,
+                                timestamp_payload=timestamp_payload, capture=capture, stop_event=stop_event)
     provider = payload_provider.Repeat(b'', 0)
-    if sweep_start and sweep_end and sweep_end >= sweep_start:
+    if timestamp_payload:
+        if payload or sweep_start or sweep_end:
+            raise ValueError('Timestamped payloads cannot be combined with a payload or a sweep')
+        provider = payload_provider.Timestamp(count, size)
+    elif sweep_start and sweep_end and sweep_end >= sweep_start:
         if not payload:
-            payload = random_text(sweep_start)
+            payload = cached_payload(sweep_start)
         provider = payload_provider.Sweep(payload, sweep_start, sweep_end)
     elif size and size > 0:
         if not payload:
-            payload = random_text(size)
+            payload = cached_payload(size)
         provider = payload_provider.Repeat(payload, count)
     options = ()
     if df:
         options = network.Socket.DONT_FRAGMENT
 
-    # Fix to allow for pythonping multithreaded usage;
-    # no need to protect this loop as no one will ever surpass 0xFFFF amount of threads
-    while True:
-        # seed_id needs to be less than or equal to 65535 (as original code was seed_id = getpid() & 0xFFFF)
-        seed_id = randint(0x1, 0xFFFF)
-        if seed_id not in SEED_IDs:
-            SEED_IDs.append(seed_id)
-            break
+    rtt_estimator = None
+    if isinstance(adaptive_timeout, executor.RttEstimator):
+        rtt_estimator = adaptive_timeout
+    elif adaptive_timeout:
+        rtt_estimator = _rtt_estimator(target, family, timeout)
 
+    seed_id = _allocate_seed_id()
+    transport = None
+    try:
+        if dispatch and not options and source is None and receive_buffer is None and send_buffer is None:
+            transport = dispatcher.transport(target, seed_id, family)
+        comm = executor.Communicator(target, provider, timeout, interval, socket_options=options, verbose=verbose,
+                                     output=out, seed_id=seed_id, source=source, repr_format=out_format,
+                                     tracer=tracer, family=family, rtt_estimator=rtt_estimator, transport=transport,
+                                     receive_buffer=receive_buffer, send_buffer=send_buffer, capture=capture)
+        comm.run(match_payloads=match, stop_on=stop_on, stop_event=stop_event)
+    finally:
+        if transport is not None:
+            transport.close()
+        SEED_IDs.remove(seed_id)
+
+    return comm.responses
 
-    comm = executor.Communicator(target, provider, timeout, interval, socket_options=options, verbose=verbose, output=out,
-                                 seed_id=seed_id, source=source, repr_format=out_format)
 
-    comm.run(match_payloads=match)
+def traceroute(target,
+               max_hops=30,
+               timeout=2,
+               payload=b'',
+               verbose=False,
+               out=sys.stdout,
+               source=None,
+               out_format='legacy',
+               family=None):
+    """Traces the path to a remote host, probing all the hops at once
 
-    SEED_IDs.remove(seed_id)
+    Sends one probe for each TTL from 1 to max_hops without waiting, then collects the Time Exceeded
+    messages of the routers and the reply of the target, so that tracing takes about one timeout.
 
+    :param target: The remote hostname or IP address to trace
+    :type target: str
+    :param max_hops: Highest TTL to probe
+    :type max_hops: int
+    :param timeout: Time in seconds to wait for the replies to all the probes
+    :type timeout: Union[int, float]
+    :param payload: Payload content of the probes
+    :type payload: Union[str, bytes]
+    :param verbose: Print the hops once traced
+    :type verbose: bool
+    :param out: Stream to which redirect the verbose output
+    :type out: stream
+    :param source: Source IP to use
+    :type source: Union[None, str]
+    :param out_format: How to __repr__ the response. Allowed: legacy, None
+    :type out_format: str
+    :param family: Address family to use: ipv4, ipv6, or None to prefer IPv4 when the target has both
+    :type family: Union[None, str]
+    :return: One response per hop, in order, the last one from the target if reached, timed out if a hop did not answer
+    :rtype: executor.ResponseList"""
+    seed_id = _allocate_seed_id()
+    try:
+        comm = executor.Traceroute(target, timeout, max_hops, payload, seed_id=seed_id, verbose=verbose, output=out,
+                                   source=source, repr_format=out_format, family=family)
+        comm.run()
+    finally:
+        SEED_IDs.remove(seed_id)
     return comm.responses
+
+
+def discover_mtu(target,
+                 low=68,
+                 high=1500,
+                 timeout=2,
+                 verbose=False,
+                 out=sys.stdout,
+                 source=None,
+                 out_format='legacy',
+                 family=None,
+                 use_cache=True):
+    """Finds the path MTU towards a remote host
+
+    Sends probes with the Don't Fragment flag set, searching the largest size that gets a reply with a binary
+    search, and jumping to the next-hop MTU reported in Fragmentation Required (Packet Too Big in IPv6) messages.
+    A range of 68 to 1500 bytes takes about 10 probes, instead of one per size with a sweep.
+
+    :param target: The remote hostname or IP address
+    :type target: str
+    :param low: Smallest MTU to consider, in bytes
+    :type low: int
+    :param high: Largest MTU to consider, in bytes
+    :type high: int
+    :param timeout: Time in seconds before considering a probe lost, which counts as too big
+    :type timeout: Union[int, float]
+    :param verbose: Print the result of each probe
+    :type verbose: bool
+    :param out: Stream to which redirect the verbose output
+    :type out: stream
+    :param source: Source IP to use
+    :type source: Union[None, str]
+    :param out_format: How to __repr__ the response. Allowed: legacy, None
+    :type out_format: str
+    :param family: Address family to use: ipv4, ipv6, or None to prefer IPv4 when the target has both
+    :type family: Union[None, str]
+    :param use_cache: Return the MTU found by a previous call for the same target, if between low and high
+    :type use_cache: bool
+    :return: Size in bytes of the largest IP packet reaching the target, None if not even low gets a reply
+    :rtype: Union[None, int]"""
+    key = (target, family)
+    if use_cache:
+        with _MTU_CACHE_LOCK:
+            mtu = MTU_CACHE.get(key)
+            if mtu is not None:
+                MTU_CACHE.move_to_end(key)
+        if mtu is not None and low <= mtu <= high:
+            return mtu
+    seed_id = _allocate_seed_id()
+    try:
+        comm = executor.MtuDiscovery(target, timeout, low, high, seed_id=seed_id, verbose=verbose, output=out,
+                                     source=source, repr_format=out_format, family=family)
+        comm.run()
+    finally:
+        SEED_IDs.remove(seed_id)
+    if comm.mtu is not None:
+        with _MTU_CACHE_LOCK:
+            MTU_CACHE[key] = comm.mtu
+            MTU_CACHE.move_to_end(key)
+            while len(MTU_CACHE) > MAX_MTU_CACHE:
+                MTU_CACHE.popitem(last=False)
+    return comm.mtu
+
+
+def flood(target,
+          count=1000,
+          size=56,
+          timeout=1,
+          rate=None,
+          batch=64,
+          verbose=False,
+          out=sys.stdout,
+          source=None,
+          family=None,
+          receive_buffer=1 << 22,
+          send_buffer=None,
+          window=None):
+    """Sends echo requests to a remote host as fast as possible, like ping -f, to test its capacity
+
+    Requests are built before sending starts and sent in batches, with one sendmmsg system call per batch
+    where available. Replies are received concurrently and matched by sequence number.
+
+    :param target: The remote hostname or IP address to flood
+    :type target: str
+    :param count: How many requests to send
+    :type count: int
+    :param size: Size of the payload of each request, in bytes
+    :type size: int
+    :param timeout: Time in seconds to wait for replies once every request is sent
+    :type timeout: Union[int, float]
+    :param rate: Requests to send per second, None for as fast as possible
+    :type rate: Union[None, float]
+    :param batch: Requests sent with each system call
+    :type batch: int
+    :param verbose: Print the report once done
+    :type verbose: bool
+    :param out: Stream to which redirect the verbose output
+    :type out: stream
+    :param source: Source IP to use
+    :type source: Union[None, str]
+    :param family: Address family to use: ipv4, ipv6, or None to prefer IPv4 when the target has both
+    :type family: Union[None, str]
+    :param receive_buffer: Size in bytes of the kernel receive buffer, large so that bursts of replies are not dropped
+    :type receive_buffer: Union[None, int]
+    :param send_buffer: Size in bytes of the kernel send buffer, None for the system default
+    :type send_buffer: Union[None, int]
+    :param window: Most requests waiting for a reply at once, see executor.Flood
+    :type window: Union[None, int]
+    :return: Requests sent and replies received, per second as well, loss ratio and round trip times, see
+    executor.Flood.summary
+    :rtype: dict"""
+    seed_id = _allocate_seed_id()
+    try:
+        comm = executor.Flood(target, count, cached_payload(size), timeout, rate, batch, seed_id=seed_id,
+                              verbose=verbose, output=out, source=source, family=family,
+                              receive_buffer=receive_buffer, send_buffer=send_buffer, window=window)
+        comm.run()
+    finally:
+        SEED_IDs.remove(seed_id)
+    return comm.summary()
+
+
+def scan(networks,
+         rate=1000,
+         timeout=1,
+         size=16,
+         verbose=False,
+         out=sys.stdout):
+    """Finds the hosts replying to pings in IPv4 networks, keeping no state per request, like zmap
+
+    Replies are validated with a keyed hash of their source address carried by the identifier and sequence number
+    of the request, and their round trip time is read from the send time in their payload, see scanner.Scanner.
+
+    :param networks: Networks to scan, in CIDR notation, or a single one
+    :type networks: Union[str, Iterable[str]]
+    :param rate: Requests to send per second, None for as fast as possible
+    :type rate: Union[None, float]
+    :param timeout: Time in seconds to wait for replies once every request is sent
+    :type timeout: Union[int, float]
+    :param size: Size of the payload of each request, in bytes, at least 16
+    :type size: int
+    :param verbose: Print each reply as it arrives
+    :type verbose: bool
+    :param out: Stream to which redirect the verbose output
+    :type out: stream
+    :return: Address and round trip time in seconds of each reply, in order of arrival
+    :rtype: list"""
+    replies = []
+
+    def record(address, rtt):
+        replies.append((address, rtt))
+        if verbose:
+            print('Reply from {0} in {1}ms'.format(address, executor.represent_seconds_in_ms(rtt or 0)), file=out)
+
+    scan_engine = scanner.Scanner(networks, rate=rate, timeout=timeout, size=size)
+    try:
+        scan_engine.run(record)
+    finally:
+        scan_engine.close()
+    return replies
+
+
+def _rtt_estimator(target, family, ceiling):
+    """Finds the estimator kept for a target, creating it if missing, and evicting the least recently used one if
+    there are too many
+
+    :param target: The remote hostname or IP address
+    :type target: str
+    :param family: Address family of the pings
+    :type family: Union[None, str]
+    :param ceiling: Maximum timeout of this call, in seconds
+    :type ceiling: Union[int, float]
+    :return: The estimator
+    :rtype: executor.RttEstimator"""
+    key = (target, family)
+    with _RTT_ESTIMATORS_LOCK:
+        estimator = RTT_ESTIMATORS.get(key)
+        if estimator is None:
+            estimator = RTT_ESTIMATORS[key] = executor.RttEstimator(ceiling=ceiling)
+            while len(RTT_ESTIMATORS) > MAX_RTT_ESTIMATORS:
+                RTT_ESTIMATORS.popitem(last=False)
+        else:
+            RTT_ESTIMATORS.move_to_end(key)
+            estimator.set_ceiling(ceiling)
+    return estimator
+
+
+def _allocate_seed_id():
+    """Picks an ICMP identifier not used by other threads, release it by removing it from SEED_IDs
+
+    :return: The identifier
+    :rtype: int"""
+    # Fix to allow for pythonping multithreaded usage, two threads must not pick the same identifier at once, e.g. the
+    # dispatcher refuses a second subscription to an identifier
+    with _SEED_IDS_LOCK:
+        while True:
+            # seed_id needs to be less than or equal to 65535 (as original code was seed_id = getpid() & 0xFFFF)
+            seed_id = randint(0x1, 0xFFFF)
+            if seed_id not in SEED_IDs:
+                SEED_IDs.append(seed_id)
+                return seed_id
+
+
+def _ping_dual_stack(target, stop_event=None, **kwargs):
+    """Pings the first address of each address family of a target concurrently
+
+    Once a family is done, the pings of the others stop after the ping in progress, in background.
+
+    :param target: The remote hostname or IP address to ping
+    :type target: str
+    :param stop_event: Set once the fastest family is done, None to create one
+    :type stop_event: Union[None, threading.Event]
+    :param kwargs: Other parameters of ping
+    :type kwargs: dict
+    :return: Responses of the first family to complete successfully, or of the first to complete if none did. The
+    error of the first family to fail is raised if every family failed, e.g. with no route to the target
+    :rtype: executor.ResponseList"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    addresses = collections.OrderedDict()
+    for family, address in network.resolve(target):
+        addresses.setdefault(family, address)
+    if stop_event is None:
+        stop_event = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(addresses))
+    try:
+        futures = [pool.submit(ping, address, family=family, stop_event=stop_event, **kwargs)
+                   for family, address in addresses.items()]
+        first = None
+        error = None
+        for future in as_completed(futures):
+            try:
+                responses = future.result()
+            except Exception as e:
+                # Another family may still work, e.g. IPv4 on a host with no IPv6 route
+                if error is None:
+                    error = e
+                continue
+            if responses.success():
+                return responses
+            if first is None:
+                first = responses
+        if first is None:
+            raise error
+        return first
+    finally:
+        # Do not wait for slower families, their threads stop in background
+        stop_event.set()
+        pool.shutdown(wait=False)
@@ -0,0 +1,163 @@
+"""Module exporting responses to NumPy arrays and analyzing them with vectorized operations
+
+NumPy is an optional dependency, install it with `pip install pythonping[numpy]`."""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Fields of the records exported by to_numpy
+RESPONSE_DTYPE = [
+    ('rtt', 'f8'),          # Round trip time in seconds, the timeout for requests with no reply
+    ('success', '?'),       # Whether the reply was successful
+    ('error', 'i4'),        # ICMP type and code of the reply as type << 8 | code, -1 if there was no reply
+    ('sequence', 'i4'),     # Sequence number of the request, -1 if unknown
+    ('timestamp', 'f8'),    # When the request was sent, in seconds since the epoch, NaN if unknown
+]
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('NumPy is required for analytics, install it with "pip install pythonping[numpy]"')
+
+
+def to_numpy(responses):
+    """Exports responses to a structured array, in one pass
+
+    :param responses: The responses to export
+    :type responses: Iterable[executor.Response]
+    :return: One record per response, see RESPONSE_DTYPE
+    :rtype: numpy.ndarray"""
+    _require_numpy()
+    records = []
+    for response in responses:
+        request = response.source_request
+        records.append((
+            response.time_elapsed,
+            response.success,
+            -1 if response.message_type is None else response.message_type << 8 | response.message_code,
+            -1 if request is None else request.sequence_number,
+            numpy.nan if response.timestamp is None else response.timestamp
+        ))
+    return numpy.array(records, dtype=RESPONSE_DTYPE)
+
+
+def percentiles(array, q=(50, 90, 99)):
+    """Computes percentiles of the round trip time of successful responses
+
+    :param array: Records exported by to_numpy
+    :type array: numpy.ndarray
+    :param q: Percentiles to compute, between 0 and 100
+    :type q: Iterable[float]
+    :return: The percentiles in seconds, NaN if no response was successful
+    :rtype: numpy.ndarray"""
+    _require_numpy()
+    rtt = array['rtt'][array['success']]
+    if not len(rtt):
+        return numpy.full(len(q), numpy.nan)
+    return numpy.percentile(rtt, q)
+
+
+def loss_bursts(array):
+    """Finds the runs of consecutive unsuccessful responses
+
+    :param array: Records exported by to_numpy
+    :type array: numpy.ndarray
+    :return: Index of the first response and length of each run, in order
+    :rtype: (numpy.ndarray, numpy.ndarray)"""
+    _require_numpy()
+    lost = numpy.concatenate(([0], (~array['success']).astype(numpy.int8), [0]))
+    changes = numpy.diff(lost)
+    starts = numpy.flatnonzero(changes == 1)
+    ends = numpy.flatnonzero(changes == -1)
+    return starts, ends - starts
+
+
+def window_aggregates(array, size=None, seconds=None):
+    """Aggregates responses in consecutive windows, of a number of responses or of a duration
+
+    :param array: Records exported by to_numpy
+    :type array: numpy.ndarray
+    :param size: Number of responses in each window
+    :type size: Union[None, int]
+    :param seconds: Duration of each window, based on timestamps, used if size is None. Responses with no timestamp,
+    e.g. from Traceroute, belong to no window
+    :type seconds: Union[None, float]
+    :return: For each window, its number of responses (sent), lost responses (lost), loss ratio (loss_ratio),
+    mean (rtt_avg) and maximum (rtt_max) round trip time of successful responses, NaN if none was successful
+    :rtype: dict"""
+    _require_numpy()
+    if size:
+        windows = numpy.arange(len(array)) // size
+    elif seconds:
+        array = array[~numpy.isnan(array['timestamp'])]
+        timestamps = array['timestamp']
+        start = timestamps.min() if len(timestamps) else 0
+        windows = ((timestamps - start) // seconds).astype(numpy.int64)
+    else:
+        raise ValueError('Either size or seconds must be set')
+    count = int(windows.max()) + 1 if len(windows) else 0
+    success = array['success']
+    sent = numpy.bincount(windows, minlength=count)
+    returned = numpy.bincount(windows, weights=success, minlength=count)
+    rtt_sum = numpy.bincount(windows, weights=numpy.where(success, array['rtt'], 0), minlength=count)
+    rtt_max = numpy.full(count, -numpy.inf)
+    numpy.maximum.at(rtt_max, windows[success], array['rtt'][success])
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'sent': sent,
+            'lost': sent - returned.astype(numpy.int64),
+            'loss_ratio': 1 - returned / sent,
+            'rtt_avg': rtt_sum / returned,
+            'rtt_max': numpy.where(numpy.isinf(rtt_max), numpy.nan, rtt_max)
+        }
+
+
+def summarize(targets, rtt, success, count, percentile=99):
+    """Computes statistics of each target from columns of responses, see executor.MultiResponseList.summaries
+
+    :param targets: Index of the target of each response
+    :type targets: Union[array.array, numpy.ndarray]
+    :param rtt: Round trip time of each response
+    :type rtt: Union[array.array, numpy.ndarray]
+    :param success: Whether each response was successful
+    :type success: Union[array.array, numpy.ndarray]
+    :param count: Number of targets
+    :type count: int
+    :param percentile: Percentile of the round trip time to compute, between 0 and 100 (nearest rank)
+    :type percentile: float
+    :return: Statistics of each target, NaN if no response of the target was successful
+    :rtype: dict"""
+    _require_numpy()
+    # Views of the columns, without copy
+    targets = numpy.asarray(targets, dtype=numpy.int64)
+    rtt = numpy.asarray(rtt, dtype=numpy.float64)
+    success = numpy.asarray(success, dtype=bool)
+    sent = numpy.bincount(targets, minlength=count)
+    returned = numpy.bincount(targets[success], minlength=count)
+    successful_targets = targets[success]
+    successful_rtt = rtt[success]
+    rtt_min = numpy.full(count, numpy.inf)
+    numpy.minimum.at(rtt_min, successful_targets, successful_rtt)
+    rtt_max = numpy.full(count, -numpy.inf)
+    numpy.maximum.at(rtt_max, successful_targets, successful_rtt)
+    # Sort by target then RTT, so that the RTTs of each target are contiguous and sorted
+    order = numpy.lexsort((successful_rtt, successful_targets))
+    sorted_rtt = successful_rtt[order]
+    starts = numpy.searchsorted(successful_targets[order], numpy.arange(count))
+    ranks = numpy.maximum(0, numpy.ceil(percentile / 100 * returned).astype(numpy.int64) - 1)
+    has_rtt = returned > 0
+    rtt_percentile = numpy.full(count, numpy.nan)
+    rtt_percentile[has_rtt] = sorted_rtt[(starts + ranks)[has_rtt]]
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'sent': sent,
+            'returned': returned,
+            'loss_ratio': 1 - returned / sent,
+            'rtt_min': numpy.where(has_rtt, rtt_min, numpy.nan),
+            'rtt_avg': numpy.bincount(successful_targets, weights=successful_rtt, minlength=count) / returned,
+            'rtt_max': numpy.where(has_rtt, rtt_max, numpy.nan),
+            'rtt_percentile': rtt_percentile
+        }
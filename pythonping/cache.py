@@ -0,0 +1,143 @@
+"""Module caching the results of recent pings and sharing the results of concurrent ones, to answer repeated checks
+of the same target without probing it again"""
+
+import collections
+import threading
+import time
+
+
+def cache_key(target, **parameters):
+    """Builds the key identifying a ping, two pings with the same key probe the same way
+
+    :param target: The remote hostname or IP address
+    :type target: str
+    :param parameters: Parameters of the ping changing what is probed, e.g. count or size, a bytearray or
+    memoryview is keyed by its content
+    :type parameters: dict
+    :return: A hashable key
+    :rtype: tuple"""
+    return (target,) + tuple(sorted(
+        (name, bytes(value) if isinstance(value, (bytearray, memoryview)) else value)
+        for name, value in parameters.items()
+    ))
+
+
+class ResultCache:
+    """Keeps the responses of recent pings for a short time, the least recently used are evicted first
+
+    Successful results are kept for ttl seconds, unsuccessful ones for negative_ttl, so that an unreachable
+    target may be checked again sooner (or later) than a reachable one."""
+    def __init__(self, ttl=1, negative_ttl=None, max_entries=1024, clock=time.monotonic):
+        """Creates an empty cache
+
+        :param ttl: How long successful results are fresh, in seconds
+        :type ttl: float
+        :param negative_ttl: How long unsuccessful results are fresh, in seconds, None to use ttl, 0 to not cache them
+        :type negative_ttl: Union[None, float]
+        :param max_entries: Most results kept at once
+        :type max_entries: int
+        :param clock: Function returning the current time in seconds
+        :type clock: callable"""
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats_hits = 0
+        self.stats_misses = 0
+        self._entries = collections.OrderedDict()   # Key to (expiry, responses), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Finds a fresh result
+
+        :param key: Key of the ping, see cache_key
+        :type key: tuple
+        :return: The responses, None if there are none or they expired
+        :rtype: Union[None, executor.ResponseList]"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, responses = entry
+                if self.clock() < expiry:
+                    self._entries.move_to_end(key)
+                    self.stats_hits += 1
+                    return responses
+                del self._entries[key]
+            self.stats_misses += 1
+            return None
+
+    def put(self, key, responses):
+        """Stores a result, evicting the least recently used one if the cache is full
+
+        :param key: Key of the ping, see cache_key
+        :type key: tuple
+        :param responses: Responses of the ping
+        :type responses: executor.ResponseList"""
+        ttl = self.ttl if responses.success() else self.negative_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, responses)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forgets every result"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Flight:
+    """A call in progress, and its outcome once done"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs a function once for concurrent calls with the same key, every caller gets the result of that run
+
+    Calls arriving after the run completed start a new run, combine with ResultCache to reuse past results."""
+    def __init__(self):
+        self.stats_runs = 0
+        self.stats_shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        """Calls function, or waits for the call in progress with the same key
+
+        :param key: Key of the call, see cache_key
+        :type key: tuple
+        :param function: Function to call, without parameters
+        :type function: callable
+        :return: The result of the function, and whether it comes from the call of another caller
+        :rtype: (object, bool)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            shared = flight is not None
+            if shared:
+                self.stats_shared += 1
+            else:
+                flight = self._flights[key] = _Flight()
+                self.stats_runs += 1
+        if shared:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
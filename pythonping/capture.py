@@ -0,0 +1,201 @@
+"""Module capturing the packets sent and received to a pcap file, to inspect them with tcpdump or Wireshark
+
+Packets are copied to a buffer allocated once, and written to the file in one call each time the buffer is full,
+so that capturing costs a copy per packet and can stay enabled in production."""
+
+import socket
+import struct
+import threading
+import time
+from . import network
+
+LINKTYPE_RAW = 101      # Packets start with their IPv4 or IPv6 header, no link layer
+# Header of the file: magic number (microsecond timestamps), version 2.4, time zone, accuracy, snapshot length, link
+FILE_HEADER = struct.Struct('<IHHiIII')
+# Header of each packet: timestamp in seconds and microseconds, length captured and original length
+RECORD_HEADER = struct.Struct('<IIII')
+
+
+def ipv4_header(source, destination, payload_length, ttl=64):
+    """Creates an IPv4 header for an ICMP packet, as raw sockets receive it
+
+    :param source: Source IPv4 address
+    :type source: str
+    :param destination: Destination IPv4 address
+    :type destination: str
+    :param payload_length: Length of the ICMP packet, in bytes
+    :type payload_length: int
+    :param ttl: Time to live
+    :type ttl: int
+    :return: The packed header, without checksum
+    :rtype: bytes"""
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + payload_length, 0, 0, ttl, socket.IPPROTO_ICMP, 0,
+                       socket.inet_aton(source), socket.inet_aton(destination))
+
+
+def ipv6_header(source, destination, payload_length, hop_limit=64):
+    """Creates an IPv6 header for an ICMPv6 packet, which raw sockets do not receive
+
+    :param source: Source IPv6 address
+    :type source: str
+    :param destination: Destination IPv6 address
+    :type destination: str
+    :param payload_length: Length of the ICMPv6 packet, in bytes
+    :type payload_length: int
+    :param hop_limit: Hop limit
+    :type hop_limit: int
+    :return: The packed header
+    :rtype: bytes"""
+    return struct.pack('!IHBB16s16s', 6 << 28, payload_length, socket.IPPROTO_ICMPV6, hop_limit,
+                       socket.inet_pton(socket.AF_INET6, source), socket.inet_pton(socket.AF_INET6, destination))
+
+
+class Capture:
+    """Writes IP packets to a pcap file, through a buffer flushed when full and when the capture is closed
+
+    May be shared by threads, e.g. by every ping of a process."""
+    def __init__(self, file, buffer_size=1 << 20, snapshot_length=65535, clock=time.time):
+        """Creates a capture and writes the header of the file
+
+        :param file: Path of the file, or file open in binary mode
+        :type file: Union[str, file]
+        :param buffer_size: Size in bytes of the buffer, packets are written to the file once it is full
+        :type buffer_size: int
+        :param snapshot_length: Bytes kept of each packet, the rest is cut
+        :type snapshot_length: int
+        :param clock: Function returning the time of a packet, in seconds since the epoch
+        :type clock: callable"""
+        self.file = open(file, 'wb') if isinstance(file, str) else file
+        self._owns_file = isinstance(file, str)
+        self.buffer = bytearray(buffer_size)
+        self.snapshot_length = snapshot_length
+        self.clock = clock
+        self.stats_packets = 0
+        self.stats_writes = 0
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.file.write(FILE_HEADER.pack(0xa1b2c3d4, 2, 4, 0, 0, snapshot_length, LINKTYPE_RAW))
+
+    def record(self, packet, timestamp=None):
+        """Adds a packet to the capture
+
+        :param packet: The packet, starting with its IP header
+        :type packet: bytes
+        :param timestamp: When the packet was sent or received, in seconds since the epoch, None for now
+        :type timestamp: Union[None, float]"""
+        if timestamp is None:
+            timestamp = self.clock()
+        seconds = int(timestamp)
+        length = min(len(packet), self.snapshot_length)
+        end = RECORD_HEADER.size + length
+        with self._lock:
+            if self._offset + end > len(self.buffer):
+                self._write()
+            if end > len(self.buffer):
+                # Larger than the whole buffer, written on its own
+                self.file.write(RECORD_HEADER.pack(seconds, int((timestamp - seconds) * 1e6), length, len(packet)))
+                self.file.write(packet[:length])
+                self.stats_writes += 1
+            else:
+                offset = self._offset
+                RECORD_HEADER.pack_into(self.buffer, offset, seconds, int((timestamp - seconds) * 1e6), length,
+                                        len(packet))
+                offset += RECORD_HEADER.size
+                self.buffer[offset:offset + length] = packet[:length]
+                self._offset = offset + length
+            self.stats_packets += 1
+
+    def _write(self):
+        if self._offset:
+            self.file.write(memoryview(self.buffer)[:self._offset])
+            self.stats_writes += 1
+            self._offset = 0
+
+    def flush(self):
+        """Writes the packets buffered to the file"""
+        with self._lock:
+            self._write()
+            self.file.flush()
+
+    def close(self):
+        """Writes the packets buffered and closes the file, if opened by the capture"""
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Transport(network.Transport):
+    """Transport recording the packets exchanged by another transport in a Capture
+
+    Requests are sent without IP header, and ICMPv6 replies are received without one, so a header is made
+    up for them. The local address is not known and is left unspecified."""
+    def __init__(self, transport, capture):
+        """Wraps a transport
+
+        :param transport: The transport carrying the packets
+        :type transport: network.Transport
+        :param capture: Where to record the packets
+        :type capture: Capture"""
+        self.transport = transport
+        self.capture = capture
+        self.family = transport.family
+        self.destination = getattr(transport, 'destination', None)
+        self.local_address = getattr(transport, 'source', None) or \
+            ('::' if self.family == socket.AF_INET6 else '0.0.0.0')
+        self.ttl = 64
+
+    @property
+    def tracer(self):
+        return self.transport.tracer
+
+    @tracer.setter
+    def tracer(self, value):
+        self.transport.tracer = value
+
+    @property
+    def kernel_drops(self):
+        return self.transport.kernel_drops
+
+    def _header(self, source, destination, packet, ttl):
+        if self.family == socket.AF_INET6:
+            return ipv6_header(source, destination, len(packet), ttl)
+        return ipv4_header(source, destination, len(packet), ttl)
+
+    def send(self, packet):
+        self.transport.send(packet)
+        if self.destination is not None:
+            self.capture.record(self._header(self.local_address, self.destination, packet, self.ttl) + bytes(packet))
+
+    def send_batch(self, packets):
+        sent = self.transport.send_batch(packets)
+        if self.destination is not None:
+            now = self.capture.clock()
+            for packet in packets[:sent]:
+                self.capture.record(self._header(self.local_address, self.destination, packet, self.ttl)
+                                    + bytes(packet), now)
+        return sent
+
+    def set_ttl(self, ttl):
+        self.transport.set_ttl(ttl)
+        self.ttl = ttl
+
+    def receive(self, timeout=2):
+        packet, source, time_left = self.transport.receive(timeout)
+        if packet:
+            if self.family == socket.AF_INET6:
+                self.capture.record(ipv6_header(source[0], self.local_address, len(packet)) + packet)
+            else:
+                self.capture.record(packet)
+        return packet, source, time_left
+
+    def close(self):
+        """Closes the transport carrying the packets, if it can be closed"""
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            close()
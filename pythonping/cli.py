@@ -0,0 +1,130 @@
+"""Command line interface, pinging many targets concurrently with one line of output per target, like fping"""
+
+import argparse
+import sys
+
+# Exit codes, as fping
+EXIT_ALIVE = 0          # Every target replied
+EXIT_UNREACHABLE = 1    # Some target did not reply
+EXIT_ERROR = 2          # Some target could not be resolved, or the arguments are invalid
+
+
+def parse_arguments(argv=None):
+    """Parses the command line
+
+    :param argv: Arguments, without the program name, None to use sys.argv
+    :type argv: Union[None, list]
+    :return: The parsed arguments
+    :rtype: argparse.Namespace"""
+    parser = argparse.ArgumentParser(
+        prog='pythonping',
+        description='Pings many targets concurrently, printing one line per target as soon as it is done.')
+    parser.add_argument('targets', nargs='*', help='hostnames or IP addresses to ping')
+    parser.add_argument('-f', '--file', help='read targets from a file, one per line, - for standard input')
+    parser.add_argument('-c', '--count', type=int, default=1, help='pings to send to each target (default 1)')
+    parser.add_argument('-t', '--timeout', type=float, default=500,
+                        help='time to wait for each reply, in milliseconds (default 500)')
+    parser.add_argument('-p', '--period', type=float, default=0,
+                        help='time between pings to the same target, in milliseconds (default 0)')
+    parser.add_argument('-b', '--size', type=int, default=56, help='payload size in bytes (default 56)')
+    parser.add_argument('-j', '--jobs', type=int, default=64, help='targets pinged at once (default 64)')
+    parser.add_argument('-S', '--source', help='source address of the pings')
+    parser.add_argument('-a', '--alive', action='store_true', help='only print the targets that replied')
+    parser.add_argument('-u', '--unreachable', action='store_true', help='only print the targets that did not reply')
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('-4', '--ipv4', dest='family', action='store_const', const='ipv4', help='only use IPv4')
+    family.add_argument('-6', '--ipv6', dest='family', action='store_const', const='ipv6', help='only use IPv6')
+    return parser.parse_args(argv)
+
+
+def read_targets(lines):
+    """Reads targets from lines of text, skipping blank lines and comments starting with #
+
+    :param lines: Lines of text, e.g. an open file
+    :type lines: Iterable[str]
+    :return: The targets, in order
+    :rtype: list"""
+    targets = []
+    for line in lines:
+        target = line.split('#', 1)[0].strip()
+        if target:
+            targets.append(target)
+    return targets
+
+
+def format_result(target, responses):
+    """Formats the result of a target as one machine-parsable line, as fping -c
+
+    :param target: The target
+    :type target: str
+    :param responses: Responses of the target
+    :type responses: executor.ResponseList
+    :return: The line, e.g. "host : xmt/rcv/%loss = 4/4/0%, min/avg/max = 0.03/0.04/0.05" (times in ms)
+    :rtype: str"""
+    sent = responses.stats_packets_sent
+    returned = responses.stats_packets_returned
+    line = '{0} : xmt/rcv/%loss = {1}/{2}/{3:.0f}%'.format(
+        target, sent, returned, 100 * (sent - returned) / sent if sent else 0)
+    if returned:
+        # Timed out requests are not round trips
+        rtts = [response.time_elapsed_ms for response in responses if response.success]
+        line += ', min/avg/max = {0}/{1}/{2}'.format(min(rtts), round(sum(rtts) / len(rtts), 2), max(rtts))
+    return line
+
+
+def run(arguments, out=sys.stdout, err=sys.stderr):
+    """Pings every target of the parsed arguments, printing a line per target as soon as it is done
+
+    :param arguments: Arguments, see parse_arguments
+    :type arguments: argparse.Namespace
+    :param out: Stream where to print the results
+    :type out: stream
+    :param err: Stream where to print the errors
+    :type err: stream
+    :return: The exit code
+    :rtype: int"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from . import ping
+
+    targets = list(arguments.targets)
+    if arguments.file == '-':
+        targets += read_targets(sys.stdin)
+    elif arguments.file:
+        with open(arguments.file) as file:
+            targets += read_targets(file)
+    if not targets:
+        print('pythonping: no target given', file=err)
+        return EXIT_ERROR
+
+    exit_code = EXIT_ALIVE
+    with ThreadPoolExecutor(max_workers=max(1, min(arguments.jobs, len(targets)))) as pool:
+        futures = {
+            pool.submit(ping, target, timeout=arguments.timeout / 1000, count=arguments.count, size=arguments.size,
+                        interval=arguments.period / 1000, source=arguments.source, family=arguments.family): target
+            for target in targets
+        }
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                responses = future.result()
+            except (OSError, RuntimeError) as e:
+                print('{0}: {1}'.format(target, e), file=err, flush=True)
+                exit_code = EXIT_ERROR
+                continue
+            alive = responses.success()
+            if not alive and exit_code == EXIT_ALIVE:
+                exit_code = EXIT_UNREACHABLE
+            if (arguments.alive and not alive) or (arguments.unreachable and alive):
+                continue
+            print(format_result(target, responses), file=out, flush=True)
+    return exit_code
+
+
+def main(argv=None):
+    """Entry point of the pythonping command
+
+    :param argv: Arguments, without the program name, None to use sys.argv
+    :type argv: Union[None, list]
+    :return: The exit code
+    :rtype: int"""
+    return run(parse_arguments(argv))
@@ -0,0 +1,214 @@
+"""Module sharing one raw socket and one receiving thread between concurrent pings
+
+Every raw ICMP socket receives a copy of every ICMP packet reaching the host, so with a socket per thread
+each reply is read and parsed once per thread. A Dispatcher reads each packet once and hands it to the
+thread that sent the request, found by the ICMP identifier."""
+
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+from . import icmp
+from . import network
+from . import tracing
+
+# Dispatchers shared by the whole process, by address family
+DISPATCHERS = {}
+_DISPATCHERS_LOCK = threading.Lock()
+
+
+def transport(destination, identifier, family=None):
+    """Creates a transport receiving its packets from the dispatcher of the process, close it once done
+
+    :param destination: Destination hostname or IP address
+    :type destination: str
+    :param identifier: ICMP identifier of the packets sent, replies with this identifier are routed to the transport
+    :type identifier: int
+    :param family: Name of the address family to use (ipv4 or ipv6), None to prefer IPv4 when the destination has both
+    :type family: Union[None, str]
+    :return: The transport
+    :rtype: Transport"""
+    address_family, address = network.resolve_preferred(destination, family)
+    with _DISPATCHERS_LOCK:
+        dispatcher = DISPATCHERS.get(address_family)
+        if dispatcher is None:
+            dispatcher = DISPATCHERS[address_family] = Dispatcher(address_family)
+    return Transport(dispatcher, address, identifier)
+
+
+class Dispatcher:
+    """Receives the ICMP packets of an address family on one socket, and routes them to subscribers by identifier
+
+    The socket and the receiving thread exist only while there are subscribers."""
+    POLL_INTERVAL = 0.1     # How often the receiving thread checks whether subscribers are left, in seconds
+
+    def __init__(self, family=socket.AF_INET, buffer_size=2048, receive_buffer=None):
+        """Creates a dispatcher, the socket is opened on the first subscription
+
+        :param family: Address family, socket.AF_INET or socket.AF_INET6
+        :type family: int
+        :param buffer_size: Size in bytes of the largest packet received
+        :type buffer_size: int
+        :param receive_buffer: Size in bytes of the kernel buffer of the socket (SO_RCVBUF), None for the system default
+        :type receive_buffer: Union[None, int]"""
+        self.family = family
+        self.buffer_size = buffer_size
+        self.receive_buffer = receive_buffer
+        # Packets dropped by the kernel on every socket of the dispatcher, None if the kernel does not report them
+        self.kernel_drops = None
+        self._socket_drops = 0
+        self.packet_class = icmp.ICMPv6 if family == socket.AF_INET6 else icmp.ICMP
+        self.socket = None
+        self.stats_received = 0
+        self.stats_dispatched = 0
+        self._queues = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, identifier):
+        """Starts routing the packets with an identifier to a new queue
+
+        :param identifier: ICMP identifier, not subscribed already
+        :type identifier: int
+        :return: The queue receiving the packets and where they come from
+        :rtype: queue.Queue"""
+        with self._lock:
+            if identifier in self._queues:
+                raise ValueError('Identifier {0} is already subscribed'.format(identifier))
+            if self.socket is None:
+                protocol = socket.IPPROTO_ICMPV6 if self.family == socket.AF_INET6 else socket.IPPROTO_ICMP
+                self.socket = socket.socket(self.family, socket.SOCK_RAW, protocol)
+                self.socket.setblocking(False)
+                if self.receive_buffer:
+                    self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+                if network.enable_drop_counter(self.socket):
+                    # The counter of a new socket starts from 0
+                    self.kernel_drops = self.kernel_drops or 0
+                    self._socket_drops = 0
+            packets = self._queues[identifier] = queue.Queue()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._receive_loop, args=(self.socket,),
+                                                name='pythonping-dispatcher', daemon=True)
+                self._thread.start()
+            return packets
+
+    def unsubscribe(self, identifier):
+        """Stops routing the packets with an identifier, they are discarded from now on
+
+        :param identifier: ICMP identifier
+        :type identifier: int"""
+        with self._lock:
+            self._queues.pop(identifier, None)
+
+    def send(self, packet, destination):
+        """Sends a raw ICMP packet from the shared socket
+
+        :param packet: The raw packet to send
+        :type packet: bytes
+        :param destination: Destination IP address
+        :type destination: str"""
+        sending_socket = self.socket
+        while True:
+            try:
+                sending_socket.sendto(packet, (destination, 0))
+                return
+            except (BlockingIOError, InterruptedError):
+                # The shared socket does not block, wait for room in its send buffer
+                select.select([], [sending_socket], [], self.POLL_INTERVAL)
+
+    def identify(self, packet):
+        """Finds the identifier a packet must be routed to
+
+        :param packet: The packet as read from the socket
+        :type packet: bytes
+        :return: The identifier of the packet, or of the request quoted by an error message, None if unknown
+        :rtype: Union[None, int]"""
+        try:
+            message_type, _, _, identifier, _ = self.packet_class.parse(packet)
+        except struct.error:
+            return None
+        if message_type in self.packet_class.ERROR_TYPES:
+            quoted = self.packet_class.generate_from_raw(packet).quoted
+            return None if quoted is None else quoted.id
+        return identifier
+
+    def _receive_loop(self, receiving_socket):
+        while True:
+            with self._lock:
+                if not self._queues:
+                    # Nobody left to receive, the next subscription opens a new socket and thread
+                    self._thread = None
+                    self.socket = None
+                    receiving_socket.close()
+                    return
+            ready, _, _ = select.select([receiving_socket], [], [], self.POLL_INTERVAL)
+            if not ready:
+                continue
+            # Drain the socket before waiting again
+            while True:
+                try:
+                    if self.kernel_drops is None:
+                        packet, source = receiving_socket.recvfrom(self.buffer_size)
+                    else:
+                        packet, source, drops = network.receive_counting_drops(receiving_socket, self.buffer_size)
+                        if drops is not None:
+                            self.kernel_drops += drops - self._socket_drops
+                            self._socket_drops = drops
+                except (BlockingIOError, InterruptedError):
+                    break
+                self.stats_received += 1
+                packets = self._queues.get(self.identify(packet))
+                if packets is not None:
+                    self.stats_dispatched += 1
+                    packets.put((packet, source))
+
+
+class Transport(network.Transport):
+    """Transport sending from the socket of a Dispatcher and receiving the packets it routes to its identifier
+
+    The TTL is shared by every transport of the dispatcher and cannot be set."""
+    def __init__(self, dispatcher, destination, identifier):
+        """Subscribes to the packets of an identifier, close the transport to unsubscribe
+
+        :param dispatcher: The dispatcher of the address family of the destination
+        :type dispatcher: Dispatcher
+        :param destination: Destination IP address
+        :type destination: str
+        :param identifier: ICMP identifier of the packets sent
+        :type identifier: int"""
+        self.dispatcher = dispatcher
+        self.destination = destination
+        self.identifier = identifier
+        self.family = dispatcher.family
+        self.tracer = None
+        self._packets = dispatcher.subscribe(identifier)
+
+    @property
+    def kernel_drops(self):
+        """Packets dropped by the kernel on the shared socket, of every subscriber, None if unknown"""
+        return self.dispatcher.kernel_drops
+
+    def send(self, packet):
+        self.dispatcher.send(packet, self.destination)
+
+    def set_ttl(self, ttl):
+        raise NotImplementedError('The socket of a dispatcher is shared, its TTL cannot be set')
+
+    def receive(self, timeout=2):
+        start = time.perf_counter()
+        try:
+            packet, source = self._packets.get(timeout=max(0, timeout))
+        except queue.Empty:
+            if self.tracer is not None:
+                self.tracer.mark(tracing.Stages.SELECT)
+            return b'', '', 0
+        if self.tracer is not None:
+            self.tracer.mark(tracing.Stages.SELECT)
+            self.tracer.mark(tracing.Stages.RECEIVE)
+        return packet, source, timeout - (time.perf_counter() - start)
+
+    def close(self):
+        """Unsubscribes from the dispatcher"""
+        self.dispatcher.unsubscribe(self.identifier)
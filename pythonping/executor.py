@@ -1,13 +1,22 @@
 """Module that actually performs the ping, sending and receiving packets"""
 
+import array
+import errno
+import math
 import os
+import socket
+import struct
 import sys
+import threading
 import time
+from . import capture as captures
 from . import icmp
 from . import network
+from . import payload_provider as payload_providers
+from . import tracing
 
 # Python 3.5 compatibility
-if sys.version_info[1] == 5:
+if sys.version_info < (3, 6):
     from enum import IntEnum, Enum
 
     class AutoNumber(Enum):
@@ -66,9 +75,78 @@ def represent_seconds_in_ms(seconds):
     return round(seconds * 1000, 2)
 
 
+class Status(IntEnum):
+    """Outcome of a request, decided by the type of its reply"""
+    Ok = 0
+    Timeout = 1
+    Unreachable = 2
+    TimeExceeded = 3
+    PacketTooBig = 4
+    Error = 5
+
+
+# Outcome of a reply by (is IPv6, ICMP type), types not listed are Status.Error
+STATUS_TABLE = {
+    (False, icmp.Types.EchoReply.type_id): Status.Ok,
+    (False, icmp.Types.DestinationUnreachable.type_id): Status.Unreachable,
+    (False, icmp.Types.TimeExceeded.type_id): Status.TimeExceeded,
+    (True, icmp.TypesV6.EchoReply.type_id): Status.Ok,
+    (True, icmp.TypesV6.DestinationUnreachable.type_id): Status.Unreachable,
+    (True, icmp.TypesV6.TimeExceeded.type_id): Status.TimeExceeded,
+    (True, icmp.TypesV6.PacketTooBig.type_id): Status.PacketTooBig,
+}
+# Error message of a reply by (is IPv6, status), then by code where it depends on it
+ERROR_MESSAGES = {
+    (False, Status.Unreachable): (
+        'Network Unreachable',
+        'Host Unreachable',
+        'Protocol Unreachable',
+        'Port Unreachable',
+        'Fragmentation Required',
+        'Source Route Failed',
+        'Network Unknown',
+        'Host Unknown',
+        'Source Host Isolated',
+        'Communication with Destination Network is Administratively Prohibited',
+        'Communication with Destination Host is Administratively Prohibited',
+        'Network Unreachable for ToS',
+        'Host Unreachable for ToS',
+        'Communication Administratively Prohibited',
+        'Host Precedence Violation',
+        'Precedence Cutoff in Effect'
+    ),
+    (True, Status.Unreachable): (
+        'No Route to Destination',
+        'Communication with Destination Administratively Prohibited',
+        'Beyond Scope of Source Address',
+        'Address Unreachable',
+        'Port Unreachable',
+        'Source Address Failed Ingress/Egress Policy',
+        'Reject Route to Destination',
+        'Error in Source Routing Header'
+    ),
+    (False, Status.TimeExceeded): ('TTL Expired in Transit', 'Fragment Reassembly Time Exceeded'),
+    (True, Status.TimeExceeded): ('Hop Limit Exceeded in Transit', 'Fragment Reassembly Time Exceeded'),
+    (True, Status.PacketTooBig): ('Packet Too Big',),
+}
+# Error message of codes missing from ERROR_MESSAGES, by (is IPv6, status)
+DEFAULT_ERROR_MESSAGES = {
+    (False, Status.Unreachable): 'Unreachable',
+    (True, Status.Unreachable): 'Unreachable',
+    (False, Status.TimeExceeded): 'TTL Expired in Transit',
+    (True, Status.TimeExceeded): 'Hop Limit Exceeded in Transit',
+    (True, Status.PacketTooBig): 'Packet Too Big',
+}
+
+
 class Response:
-    """Represents a response to an ICMP message, with metadata like timing"""
-    def __init__(self, message, time_elapsed, source_request=None, repr_format=None):
+    """Represents a response to an ICMP message, with metadata like timing
+
+    Only the type, code and source of the reply are decoded, the Message is built when first accessed"""
+    __slots__ = ('message_type', 'message_code', 'source', 'status', 'time_elapsed', 'source_request',
+                 'repr_format', 'timestamp', '_success', '_message', '_raw', '_packet_class', '_appended')
+
+    def __init__(self, message, time_elapsed, source_request=None, repr_format=None, timestamp=None):
         """Creates a representation of ICMP message received in response
 
         :param message: The message received
@@ -78,78 +156,116 @@ class Response:
         :param source_request: ICMP packet represeting the request that originated this response
         :type source_request: ICMP
         :param repr_format: How to __repr__ the response. Allowed: legacy, None
-        :type repr_format: str"""
-        self.message = message
+        :type repr_format: str
+        :param timestamp: When the original request was sent, in seconds since the epoch
+        :type timestamp: Union[None, float]"""
         self.time_elapsed = time_elapsed
         self.source_request = source_request
         self.repr_format = repr_format
+        self.timestamp = timestamp
+        self._appended = False
+        self.message = message
+
+    @classmethod
+    def from_raw(cls, raw, packet_class, message_type, message_code, source, time_elapsed, source_request=None,
+                 repr_format=None, timestamp=None):
+        """Creates a response from a packet read from a socket, without keeping the decoded packet
+
+        :param raw: The packet as read from the socket
+        :type raw: bytes
+        :param packet_class: Class decoding the packet, icmp.ICMP or icmp.ICMPv6
+        :type packet_class: type
+        :param message_type: ICMP type of the packet
+        :type message_type: int
+        :param message_code: ICMP code of the packet
+        :type message_code: int
+        :param source: IP address the packet comes from
+        :type source: str
+        :return: The response, see __init__ for the other parameters
+        :rtype: Response"""
+        response = cls(None, time_elapsed, source_request, repr_format, timestamp)
+        response._raw = raw
+        response._packet_class = packet_class
+        response._set_reply(message_type, message_code, source)
+        return response
+
+    def _set_reply(self, message_type, message_code, source):
+        self.message_type = message_type
+        self.message_code = message_code
+        self.source = source
+        self.status = status = STATUS_TABLE.get((self._packet_class is icmp.ICMPv6, message_type), Status.Error)
+        self._success = status is Status.Ok and message_code == 0
+
+    @property
+    def message(self):
+        if self._message is None and self._raw is not None:
+            self._message = Message('', self._packet_class.generate_from_raw(self._raw), self.source)
+        return self._message
+
+    @message.setter
+    def message(self, message):
+        if self._appended:
+            # The lists holding the response counted it as it was
+            raise AttributeError('The message of a response cannot change once appended to a ResponseList')
+        self._message = message
+        self._raw = None
+        if message is None:
+            self._packet_class = self.message_type = self.message_code = self.source = None
+            self.status = Status.Timeout
+            self._success = False
+        else:
+            packet = message.packet
+            self._packet_class = type(packet)
+            self._set_reply(packet.message_type, packet.message_code, message.source)
 
     @property
     def success(self):
-        return self.error_message is None
+        return self._success
 
     @property
     def error_message(self):
-        if self.message is None:
+        status = self.status
+        if status == Status.Timeout:
             return 'No response'
-        if self.message.packet.message_type == 0 and self.message.packet.message_code == 0:
-            # Echo Reply, response OK - no error
-            return None
-        if self.message.packet.message_type == 3:
-            # Destination unreachable, returning more details based on message code
-            unreachable_messages = [
-                'Network Unreachable',
-                'Host Unreachable',
-                'Protocol Unreachable',
-                'Port Unreachable',
-                'Fragmentation Required',
-                'Source Route Failed',
-                'Network Unknown',
-                'Host Unknown',
-                'Source Host Isolated',
-                'Communication with Destination Network is Administratively Prohibited',
-                'Communication with Destination Host is Administratively Prohibited',
-                'Network Unreachable for ToS',
-                'Host Unreachable for ToS',
-                'Communication Administratively Prohibited',
-                'Host Precedence Violation',
-                'Precedence Cutoff in Effect'
-            ]
-            try:
-                return unreachable_messages[self.message.packet.message_code]
-            except IndexError:
-                # Should never generate IndexError, this serves as additional protection
-                return 'Unreachable'
-        # Error was not identified
-        return 'Network Error'
+        if status == Status.Ok:
+            # Echo Reply, response OK - no error, unless its code is unknown
+            return None if self.message_code == 0 else 'Network Error'
+        if status == Status.Error:
+            # Error was not identified
+            return 'Network Error'
+        key = (self._packet_class is icmp.ICMPv6, status)
+        messages = ERROR_MESSAGES.get(key, ())
+        if self.message_code < len(messages):
+            return messages[self.message_code]
+        return DEFAULT_ERROR_MESSAGES.get(key, 'Network Error')
 
     @property
     def time_elapsed_ms(self):
         return represent_seconds_in_ms(self.time_elapsed)
 
     def legacy_repr(self):
-        if self.message is None:
+        if self.status == Status.Timeout:
             return 'Request timed out'
         if self.success:
-            return 'Reply from {0}, {1} bytes in {2}ms'.format(self.message.source,
+            return 'Reply from {0}, {1} bytes in {2}ms'.format(self.source,
                                                                len(self.message.packet.raw),
                                                                self.time_elapsed_ms)
         # Not successful, but with some code (e.g. destination unreachable)
-        return '{0} from {1} in {2}ms'.format(self.error_message, self.message.source, self.time_elapsed_ms)
+        return '{0} from {1} in {2}ms'.format(self.error_message, self.source, self.time_elapsed_ms)
 
     def __repr__(self):
         if self.repr_format == 'legacy':
             return self.legacy_repr()
-        if self.message is None:
+        if self.status == Status.Timeout:
             return 'Timed out'
         if self.success:
             return 'status=OK\tfrom={0}\tms={1}\t\tbytes\tsnt={2}\trcv={3}'.format(
-                self.message.source,
+                self.source,
                 self.time_elapsed_ms,
                 len(self.source_request.raw)+20,
                 len(self.message.packet.raw)
             )
-        return 'status=ERR\tfrom={1}\terror="{0}"'.format(self.message.source, self.error_message)
+        return 'status=ERR\tfrom={1}\terror="{0}"'.format(self.source, self.error_message)
 
 class ResponseList:
     """Represents a series of ICMP responses"""
@@ -171,6 +287,7 @@ class ResponseList:
         self.rtt_max = 0
         self.stats_packets_sent = 0
         self.stats_packets_returned = 0
+        self.stats_kernel_drops = None
         for response in initial_set:
             self.append(response)
 
@@ -183,15 +300,46 @@ class ResponseList:
         :rtype: bool
         """
         result = False
-        success_list = [resp.success for resp in self._responses]
+        # Successful responses are counted as they are appended
+        returned = self.stats_packets_returned
         if option == SuccessOn.One:
-            result = True in success_list
+            result = returned > 0
         elif option == SuccessOn.Most:
-            result = success_list.count(True) / len(success_list) > 0.5
+            result = returned / len(self._responses) > 0.5
         elif option == SuccessOn.All:
-            result = False not in success_list
+            result = returned == len(self._responses)
         return result
 
+    def decided(self, option=SuccessOn.One, expected=None):
+        """Tells whether the outcome of success(option) is already known, before all the expected responses arrived
+
+        :param option: Sets a threshold for success sign, as in success
+        :type option: int
+        :param expected: Total number of responses expected, None if unknown
+        :type expected: Union[None, int]
+        :return: The outcome success(option) has whatever the responses still expected, None if it depends on them
+        :rtype: Union[None, bool]"""
+        returned = self.stats_packets_returned
+        failed = len(self) - returned
+        remaining = None if expected is None else max(0, expected - len(self))
+        if option == SuccessOn.One:
+            if returned:
+                return True
+            if remaining == 0:
+                return False
+        elif option == SuccessOn.Most:
+            if expected:
+                if returned / expected > 0.5:
+                    return True
+                if (returned + remaining) / expected <= 0.5:
+                    return False
+        elif option == SuccessOn.All:
+            if failed:
+                return False
+            if remaining == 0:
+                return True
+        return None
+
     @property
     def packet_loss(self):
         return self.packets_lost
@@ -212,22 +360,28 @@ class ResponseList:
         self._responses = []
         self.stats_packets_sent = 0
         self.stats_packets_returned = 0
+        self.stats_kernel_drops = None
 
 
     def append(self, value):
-        self._responses.append(value)
+        responses = self._responses
+        responses.append(value)
+        # Counted below, its message must not change anymore
+        value._appended = True
         self.stats_packets_sent += 1
-        if len(self) == 1:
-            self.rtt_avg = value.time_elapsed
-            self.rtt_max = value.time_elapsed
-            self.rtt_min = value.time_elapsed
+        time_elapsed = value.time_elapsed
+        count = len(responses)
+        if count == 1:
+            self.rtt_avg = time_elapsed
+            self.rtt_max = time_elapsed
+            self.rtt_min = time_elapsed
         else:
             # Calculate the total of time, add the new value and divide for the new number
-            self.rtt_avg = ((self.rtt_avg * (len(self)-1)) + value.time_elapsed) / len(self)
-            if value.time_elapsed > self.rtt_max:
-                self.rtt_max = value.time_elapsed
-            if value.time_elapsed < self.rtt_min:
-                self.rtt_min = value.time_elapsed
+            self.rtt_avg = ((self.rtt_avg * (count - 1)) + time_elapsed) / count
+            if time_elapsed > self.rtt_max:
+                self.rtt_max = time_elapsed
+            if time_elapsed < self.rtt_min:
+                self.rtt_min = time_elapsed
         if value.success:
             self.stats_packets_returned += 1
 
@@ -238,6 +392,26 @@ class ResponseList:
     def stats_packets_lost(self):
         return self.stats_packets_sent - self.stats_packets_returned
 
+    @property
+    def stats_network_lost(self):
+        """Lost packets not explained by packets dropped by the kernel, None if kernel drops are unknown
+
+        Kernel drops count every packet reaching the socket, including replies to other pings, so this is a lower
+        bound of the packets lost in the network."""
+        if self.stats_kernel_drops is None:
+            return None
+        return max(0, self.stats_packets_lost - self.stats_kernel_drops)
+
+    def loss_report(self):
+        """Describes where the lost packets were lost
+
+        :return: Lost packets, split between kernel drops and network loss if known
+        :rtype: str"""
+        if self.stats_kernel_drops is None:
+            return '{0} packets lost, kernel drops unknown'.format(self.stats_packets_lost)
+        return '{0} packets lost: {1} dropped by the kernel (receive buffer full), {2} lost in the network'.format(
+            self.stats_packets_lost, self.stats_kernel_drops, self.stats_network_lost)
+
     @property
     def stats_success_ratio(self):
         return self.stats_packets_returned / self.stats_packets_sent
@@ -259,17 +433,219 @@ class ResponseList:
             ret += '{0}\r\n'.format(response)
         ret += '\r\n'
         ret += 'Round Trip Times min/avg/max is {0}/{1}/{2} ms'.format(self.rtt_min_ms, self.rtt_avg_ms, self.rtt_max_ms)
+        if self.stats_kernel_drops:
+            ret += '\r\n' + self.loss_report()
         return ret
 
     def __iter__(self):
         for response in self._responses:
             yield response
 
+    def to_numpy(self):
+        """Exports the responses to a NumPy structured array, see analytics.to_numpy (requires numpy)
+
+        :return: One record per response with fields rtt, success, error, sequence and timestamp
+        :rtype: numpy.ndarray"""
+        from . import analytics
+        return analytics.to_numpy(self)
+
+
+class MultiResponseList:
+    """Results of many targets, stored in compact columns shared by all targets rather than one ResponseList each"""
+    SUMMARY_FIELDS = ('sent', 'returned', 'loss_ratio', 'rtt_min', 'rtt_avg', 'rtt_max', 'rtt_percentile')
+
+    def __init__(self, initial_set=None):
+        """Creates a MultiResponseList with initial data if available
+
+        :param initial_set: Already existing responses, by target
+        :type initial_set: Union[None, dict]"""
+        self.targets = []
+        self._target_index = {}
+        self.target_column = array.array('I')
+        self.rtt_column = array.array('d')
+        self.success_column = array.array('b')
+        self.error_column = array.array('i')      # ICMP type << 8 | code of the reply, -1 if there was no reply
+        self.sequence_column = array.array('i')   # -1 if unknown
+        for target, responses in (initial_set or {}).items():
+            self.extend(target, responses)
+
+    def _index(self, target):
+        index = self._target_index.get(target)
+        if index is None:
+            index = self._target_index[target] = len(self.targets)
+            self.targets.append(target)
+        return index
+
+    def append(self, target, response):
+        """Adds the response of a target, only its data is kept, not the Response itself
+
+        :param target: The target the response comes from
+        :type target: str
+        :param response: The response
+        :type response: Response"""
+        request = response.source_request
+        self.target_column.append(self._index(target))
+        self.rtt_column.append(response.time_elapsed)
+        self.success_column.append(response.success)
+        self.error_column.append(-1 if response.message_type is None
+                                 else response.message_type << 8 | response.message_code)
+        self.sequence_column.append(-1 if request is None else request.sequence_number)
+
+    def extend(self, target, responses):
+        """Adds all the responses of a target
+
+        :param target: The target the responses come from
+        :type target: str
+        :param responses: The responses
+        :type responses: Iterable[Response]"""
+        for response in responses:
+            self.append(target, response)
+
+    def __len__(self):
+        return len(self.target_column)
+
+    def summaries(self, percentile=99):
+        """Computes statistics of each target, with NumPy if available, see analytics.summarize to get NumPy arrays
+
+        :param percentile: Percentile of the round trip time to compute, between 0 and 100 (nearest rank)
+        :type percentile: float
+        :return: The target names (target) and, in the same order, their number of responses (sent), successful
+        responses (returned), loss ratio (loss_ratio) and minimum, mean, maximum and percentile round trip time of
+        successful responses (rtt_min, rtt_avg, rtt_max, rtt_percentile), None if none was successful. Each is a list
+        :rtype: dict"""
+        from . import analytics
+        if analytics.numpy is not None:
+            arrays = analytics.summarize(self.target_column, self.rtt_column, self.success_column,
+                                         len(self.targets), percentile)
+            # Same types as without NumPy: lists of Python numbers, None rather than NaN
+            columns = {field: [None if value != value else value for value in values.tolist()]
+                       for field, values in arrays.items()}
+        else:
+            columns = self._summarize(percentile)
+        columns['target'] = list(self.targets)
+        return columns
+
+    def _summarize(self, percentile):
+        """Computes statistics of each target in pure Python, see summaries"""
+        sent = [0] * len(self.targets)
+        rtts = [[] for _ in self.targets]
+        for index, rtt, success in zip(self.target_column, self.rtt_column, self.success_column):
+            sent[index] += 1
+            if success:
+                rtts[index].append(rtt)
+        columns = {field: [] for field in self.SUMMARY_FIELDS}
+        for count, times in zip(sent, rtts):
+            times.sort()
+            columns['sent'].append(count)
+            columns['returned'].append(len(times))
+            columns['loss_ratio'].append(1 - len(times) / count if count else None)
+            columns['rtt_min'].append(times[0] if times else None)
+            columns['rtt_avg'].append(sum(times) / len(times) if times else None)
+            columns['rtt_max'].append(times[-1] if times else None)
+            columns['rtt_percentile'].append(
+                times[max(0, math.ceil(percentile / 100 * len(times)) - 1)] if times else None
+            )
+        return columns
+
+    def summary(self, target, percentile=99):
+        """Computes statistics of one target, see summaries
+
+        :param target: The target
+        :type target: str
+        :return: The statistics of the target
+        :rtype: dict"""
+        index = self._target_index[target]
+        return {field: values[index] for field, values in self.summaries(percentile).items()}
+
+    def filter(self, field, above=None, below=None, percentile=99):
+        """Finds the targets whose statistic is within bounds, e.g. filter('loss_ratio', above=0.05)
+
+        :param field: Name of the statistic, one of SUMMARY_FIELDS
+        :type field: str
+        :param above: The statistic must be greater than this, None for no lower bound
+        :type above: Union[None, float]
+        :param below: The statistic must be lower than this, None for no upper bound
+        :type below: Union[None, float]
+        :return: Names of the matching targets, targets with no value for the statistic never match
+        :rtype: list"""
+        summaries = self.summaries(percentile)
+        return [
+            target for target, value in zip(summaries['target'], summaries[field])
+            if value is not None and (above is None or value > above) and (below is None or value < below)
+        ]
+
+    def worst(self, count=10, field='rtt_percentile', percentile=99):
+        """Finds the targets with the highest value of a statistic, e.g. worst(10, 'rtt_percentile')
+
+        :param count: How many targets to return
+        :type count: int
+        :param field: Name of the statistic, one of SUMMARY_FIELDS
+        :type field: str
+        :return: Names and values of the targets, highest value first, targets with no value for the statistic last
+        :rtype: list"""
+        summaries = self.summaries(percentile)
+        pairs = list(zip(summaries['target'], summaries[field]))
+        pairs.sort(key=lambda pair: (pair[1] is not None, pair[1] or 0), reverse=True)
+        return pairs[:count]
+
+
+class RttEstimator:
+    """Estimates how long to wait for the reply of a target from its past round trip times, as in RFC 6298"""
+    ALPHA = 1 / 8       # Weight of a new sample in the smoothed RTT
+    BETA = 1 / 4        # Weight of a new sample in the RTT variation
+    K = 4               # How many RTT variations to add to the smoothed RTT
+
+    def __init__(self, floor=0.01, ceiling=2, granularity=0.001):
+        """Creates an estimator with no samples, whose timeout is the ceiling
+
+        :param floor: Minimum timeout, in seconds
+        :type floor: Union[int, float]
+        :param ceiling: Maximum timeout, in seconds, also used until the first sample
+        :type ceiling: Union[int, float]
+        :param granularity: Resolution of the clock, minimum margin added to the smoothed RTT, in seconds
+        :type granularity: float"""
+        self.floor = floor
+        self.ceiling = ceiling
+        self.granularity = granularity
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = ceiling
+
+    def _clamp(self, timeout):
+        return min(self.ceiling, max(self.floor, timeout))
+
+    def set_ceiling(self, ceiling):
+        """Changes the maximum timeout, keeping the samples
+
+        :param ceiling: Maximum timeout, in seconds, also used until the first sample
+        :type ceiling: Union[int, float]"""
+        self.ceiling = ceiling
+        self.timeout = ceiling if self.srtt is None else self._clamp(self.timeout)
+
+    def update(self, rtt):
+        """Adds the round trip time of a reply
+
+        :param rtt: Round trip time, in seconds
+        :type rtt: float"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.timeout = self._clamp(self.srtt + max(self.granularity, self.K * self.rttvar))
+
+    def backoff(self):
+        """Doubles the timeout after a request got no reply"""
+        self.timeout = self._clamp(self.timeout * 2)
+
 
 class Communicator:
     """Instance actually communicating over the network, sending messages and handling responses"""
     def __init__(self, target, payload_provider, timeout, interval, socket_options=(), seed_id=None,
-                 verbose=False, output=sys.stdout, source=None, repr_format=None):
+                 verbose=False, output=sys.stdout, source=None, repr_format=None, tracer=None,
+                 transport=None, family=None, rtt_estimator=None, receive_buffer=None, send_buffer=None,
+                 capture=None):
         """Creates an instance that can handle communication with the target device
 
         :param target: IP or hostname of the remote device
@@ -289,14 +665,37 @@ class Communicator:
         :param output: File where to write verbose output, defaults to stdout
         :type output: file
         :param repr_format: How to __repr__ the response. Allowed: legacy, None
-        :type repr_format: str"""
-        self.socket = network.Socket(target, 'icmp', options=socket_options, source=source)
+        :type repr_format: str
+        :param tracer: Records the time spent in each stage of each probe, None to disable tracing
+        :type tracer: Union[None, tracing.Tracer]
+        :param transport: Carries the packets instead of a raw socket, target and socket_options are then ignored
+        :type transport: Union[None, network.Transport]
+        :param family: Name of the address family to use (ipv4 or ipv6), None to prefer IPv4 when the target has both
+        :type family: Union[None, str]
+        :param rtt_estimator: Adapts the timeout of each ping to the past round trip times, None to always use timeout
+        :type rtt_estimator: Union[None, RttEstimator]
+        :param receive_buffer: Size in bytes of the kernel receive buffer of the socket, None for the system default
+        :type receive_buffer: Union[None, int]
+        :param send_buffer: Size in bytes of the kernel send buffer of the socket, None for the system default
+        :type send_buffer: Union[None, int]
+        :param capture: Records the packets sent and received, None to not record them
+        :type capture: Union[None, capture.Capture]"""
+        if transport is None:
+            transport = network.Socket(target, 'icmp', options=socket_options, source=source, family=family,
+                                       receive_buffer=receive_buffer, send_buffer=send_buffer)
+        if capture is not None:
+            transport = captures.Transport(transport, capture)
+        self.socket = transport
+        self.packet_class = icmp.ICMPv6 if transport.family == socket.AF_INET6 else icmp.ICMP
+        self.socket.tracer = tracer
+        self.tracer = tracer
         self.provider = payload_provider
         self.timeout = timeout
         self.interval = interval
         self.responses = ResponseList(verbose=verbose, output=output)
         self.seed_id = seed_id
         self.repr_format = repr_format
+        self.rtt_estimator = rtt_estimator
         # note that to make Communicator instances thread safe, the seed ID must be unique per thread
         if self.seed_id is None:
             self.seed_id = os.getpid() & 0xFFFF
@@ -314,11 +713,24 @@ class Communicator:
         :param payload: The payload of the ICMP message
         :type payload: Union[str, bytes]
         :rtype: ICMP"""
-        i = icmp.ICMP(
-            icmp.Types.EchoRequest,
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.begin((packet_id, sequence_number))
+        i = self.packet_class(
+            self.packet_class.ECHO_REQUEST,
             payload=payload,
             identifier=packet_id, sequence_number=sequence_number)
-        self.socket.send(i.packet)
+        if tracer is not None:
+            # Same as i.packet, split so that each stage can be timed on its own
+            tracer.mark(tracing.Stages.BUILD)
+            i.expected_checksum
+            tracer.mark(tracing.Stages.CHECKSUM)
+            packet = i.packet
+            tracer.mark(tracing.Stages.PACK)
+            self.socket.send(packet)
+            tracer.mark(tracing.Stages.SEND)
+        else:
+            self.socket.send(i.packet)
         return i
 
     def listen_for(self, packet_id, timeout, payload_pattern=None, source_request=None):
@@ -333,25 +745,41 @@ class Communicator:
         :return: The response to the request with the specified packet_id
         :rtype: Response"""
         time_left = timeout
-        response = icmp.ICMP()
+        packet_class = self.packet_class
+        echo_request = packet_class.ECHO_REQUEST.type_id
+        payload_offset = packet_class.IP_HEADER_LENGTH + packet_class.HEADER.size
         while time_left > 0:
             # Keep listening until a packet arrives
             raw_packet, source_socket, time_left = self.socket.receive(time_left)
             # If we actually received something
             if raw_packet != b'':
-                response.unpack(raw_packet)
+                # Only the header is decoded, the whole packet is decoded if the response is accessed
+                message_type, message_code, _, identifier, _ = packet_class.parse(raw_packet)
+                if self.tracer is not None:
+                    self.tracer.mark(tracing.Stages.UNPACK)
 
                 # Ensure we have not unpacked the packet we sent (RHEL will also listen to outgoing packets)
-                if response.id == packet_id and response.message_type != icmp.Types.EchoRequest.type_id:
+                if identifier == packet_id and message_type != echo_request:
                     if payload_pattern is None:
                         # To allow Windows-like behaviour (no payload inspection, but only match packet identifiers),
                         # simply allow for it to be an always true in the legacy usage case
                         payload_matched = True
                     else:
-                        payload_matched = (payload_pattern == response.payload)
+                        payload_matched = (payload_pattern == raw_packet[payload_offset:])
 
+                    if self.tracer is not None:
+                        self.tracer.mark(tracing.Stages.MATCH)
                     if payload_matched:
-                        return Response(Message('', response, source_socket[0]), timeout - time_left, source_request, repr_format=self.repr_format)
+                        return Response.from_raw(raw_packet, packet_class, message_type, message_code,
+                                                 source_socket[0], timeout - time_left, source_request,
+                                                 repr_format=self.repr_format)
+                elif message_type in packet_class.ERROR_TYPES:
+                    # Error messages, e.g. Fragmentation Required, quote the header of the request that caused them
+                    quoted = packet_class.generate_from_raw(raw_packet).quoted
+                    if quoted is not None and quoted.id == packet_id and quoted.message_type == echo_request:
+                        return Response.from_raw(raw_packet, packet_class, message_type, message_code,
+                                                 source_socket[0], timeout - time_left, source_request,
+                                                 repr_format=self.repr_format)
         return Response(None, timeout, source_request, repr_format=self.repr_format)
 
     @staticmethod
@@ -367,22 +795,442 @@ class Communicator:
             sequence_number = 1
         return sequence_number
 
-    def run(self, match_payloads=False):
+    def run(self, match_payloads=False, stop_on=None, stop_event=None):
         """Performs all the pings and stores the responses
 
         :param match_payloads: optional to set to True to make sure requests and replies have equivalent payloads
-        :type match_payloads: bool"""
+        :type match_payloads: bool
+        :param stop_on: Stop as soon as the outcome of responses.success(stop_on) is known, None to send all the pings
+        :type stop_on: Union[None, SuccessOn]
+        :param stop_event: Stop once set, e.g. from another thread, after the ping in progress
+        :type stop_event: Union[None, threading.Event]"""
         self.responses.clear()
         identifier = self.seed_id
         seq = 1
+        try:
+            expected = len(self.provider)
+        except TypeError:
+            # The provider does not know how many payloads it will generate
+            expected = None
+        estimator = self.rtt_estimator
+        # Timestamped payloads carry their send time, the RTT of a reply is computed from the payload it echoes
+        timestamped = isinstance(self.provider, payload_providers.Timestamp)
+        drops_before = self.socket.kernel_drops
         for payload in self.provider:
+            timeout = self.timeout if estimator is None else estimator.timeout
+            sent_at = time.time()
             icmp_out = self.send_ping(identifier, seq, payload)
             if not match_payloads:
-                self.responses.append(self.listen_for(identifier, self.timeout, None, icmp_out))
+                response = self.listen_for(identifier, timeout, None, icmp_out)
             else:
-                self.responses.append(self.listen_for(identifier, self.timeout, icmp_out.payload, icmp_out))
+                response = self.listen_for(identifier, timeout, icmp_out.payload, icmp_out)
+            exact = False
+            if timestamped and response.success:
+                rtt = self.provider.rtt(response.message.packet.payload, self.provider.clock())
+                if rtt is not None:
+                    # Also valid for a late reply to an earlier request, matched by identifier only
+                    response.time_elapsed = rtt
+                    exact = True
+            response.timestamp = sent_at
+            self.responses.append(response)
+
+            if estimator is not None:
+                if response.status == Status.Timeout:
+                    estimator.backoff()
+                elif response.success and (exact or response.message.packet.sequence_number == seq):
+                    # Replies matched by identifier only may belong to an earlier request, their time is not a sample
+                    # unless computed from their payload
+                    estimator.update(response.time_elapsed)
 
             seq = self.increase_seq(seq)
 
+            if stop_on is not None and self.responses.decided(stop_on, expected) is not None:
+                break
+
+            if stop_event is not None and stop_event.is_set():
+                break
+
             if self.interval:
                 time.sleep(self.interval)
+
+        if drops_before is not None:
+            # Replies missing because the receive buffer was full, rather than lost in the network
+            self.responses.stats_kernel_drops = self.socket.kernel_drops - drops_before
+
+
+class Traceroute(Communicator):
+    """Traces the path to the target, sending the probes for all TTLs at once"""
+    def __init__(self, target, timeout, max_hops=30, payload=b'', seed_id=None, verbose=False, output=sys.stdout,
+                 source=None, repr_format=None, tracer=None, transport=None, family=None):
+        """Creates an instance that can trace the path to the target device
+
+        :param target: IP or hostname of the remote device
+        :type target: str
+        :param timeout: How long to wait for the replies to all the probes, in seconds
+        :type timeout: Union[int, float]
+        :param max_hops: Highest TTL to probe
+        :type max_hops: int
+        :param payload: The payload of the probes
+        :type payload: Union[str, bytes]
+
+        See Communicator for the other parameters"""
+        super().__init__(target, None, timeout, 0, seed_id=seed_id, verbose=verbose, output=output, source=source,
+                         repr_format=repr_format, tracer=tracer, transport=transport, family=family)
+        self.max_hops = max_hops
+        self.payload = payload
+
+    def match(self, packet, identifier):
+        """Finds the TTL of the probe a reply is answering
+
+        Echo replies carry the sequence number of the probe, which is set to its TTL, while error
+        messages such as Time Exceeded quote the header of the probe.
+
+        :param packet: The reply
+        :type packet: icmp.ICMP
+        :param identifier: The ID of the probes
+        :type identifier: int
+        :return: The TTL of the probe, None if the reply is not for a probe
+        :rtype: Union[None, int]"""
+        if packet.message_type == packet.ECHO_REPLY.type_id:
+            return packet.sequence_number if packet.id == identifier else None
+        quoted = packet.quoted
+        if quoted is not None and quoted.id == identifier and quoted.message_type == packet.ECHO_REQUEST.type_id:
+            return quoted.sequence_number
+        return None
+
+    def run(self, match_payloads=False):
+        """Sends the probes for all TTLs, then stores one response per hop up to the target
+
+        :param match_payloads: Unused, replies are matched by the quoted header
+        :type match_payloads: bool"""
+        self.responses.clear()
+        identifier = self.seed_id
+        requests = {}
+        for ttl in range(1, self.max_hops + 1):
+            self.socket.set_ttl(ttl)
+            requests[ttl] = (self.send_ping(identifier, ttl, self.payload), time.perf_counter())
+
+        hops = {}
+        last_hop = self.max_hops
+        time_left = self.timeout
+        while time_left > 0 and len(hops) < last_hop:
+            raw_packet, source_socket, time_left = self.socket.receive(time_left)
+            if raw_packet == b'':
+                break
+            received = time.perf_counter()
+            packet = self.packet_class()
+            packet.unpack(raw_packet)
+            ttl = self.match(packet, identifier)
+            if ttl not in requests or ttl in hops or ttl > last_hop:
+                continue
+            request, sent = requests[ttl]
+            hops[ttl] = Response(Message('', packet, source_socket[0]), received - sent, request,
+                                 repr_format=self.repr_format)
+            if packet.message_type == packet.ECHO_REPLY.type_id and ttl < last_hop:
+                # The target answered, probes with a higher TTL reached it as well
+                last_hop = ttl
+                hops = {hop: response for hop, response in hops.items() if hop <= last_hop}
+
+        for ttl in range(1, last_hop + 1):
+            if ttl in hops:
+                self.responses.append(hops[ttl])
+            else:
+                self.responses.append(Response(None, self.timeout, requests[ttl][0], repr_format=self.repr_format))
+
+
+class MtuDiscovery(Communicator):
+    """Finds the largest packet reaching the target without fragmentation, with a binary search"""
+    def __init__(self, target, timeout, low=68, high=1500, seed_id=None, verbose=False, output=sys.stdout,
+                 source=None, repr_format=None, tracer=None, transport=None, family=None):
+        """Creates an instance that can discover the path MTU towards the target device
+
+        :param target: IP or hostname of the remote device
+        :type target: str
+        :param timeout: Timeout of each probe, in seconds
+        :type timeout: Union[int, float]
+        :param low: Smallest MTU to consider, in bytes
+        :type low: int
+        :param high: Largest MTU to consider, in bytes
+        :type high: int
+
+        See Communicator for the other parameters"""
+        super().__init__(target, None, timeout, 0, socket_options=network.Socket.PROBE_MTU, seed_id=seed_id,
+                         verbose=verbose, output=output, source=source, repr_format=repr_format, tracer=tracer,
+                         transport=transport, family=family)
+        self.low = low
+        self.high = high
+        self.mtu = None
+        # IP and ICMP headers to add to the payload to get the size of the packet
+        self.overhead = 48 if self.packet_class is icmp.ICMPv6 else 28
+
+    def probe(self, size, sequence_number):
+        """Sends one probe with the Don't Fragment flag set
+
+        :param size: Size of the whole IP packet, in bytes
+        :type size: int
+        :param sequence_number: The sequence number to use for the packet
+        :type sequence_number: int
+        :return: Whether the probe got a reply, and the next-hop MTU if a router reported it
+        :rtype: (bool, Union[None, int])"""
+        payload = bytes(max(0, size - self.overhead))
+        try:
+            request = self.send_ping(self.seed_id, sequence_number, payload)
+        except OSError as e:
+            if e.errno != errno.EMSGSIZE:
+                raise
+            # Larger than the MTU of the local interface
+            return False, None
+        sent = time.perf_counter()
+        while True:
+            response = self.listen_for(self.seed_id, max(0, sent + self.timeout - time.perf_counter()),
+                                       source_request=request)
+            if response.message is None:
+                response.time_elapsed = self.timeout
+                break
+            packet = response.message.packet
+            # Skip late replies to previous probes, they tell nothing about this size
+            if (packet.quoted or packet).sequence_number == sequence_number:
+                response.time_elapsed = time.perf_counter() - sent
+                break
+        self.responses.append(response)
+        if response.success:
+            return True, None
+        # Timeouts count as too big, as routers may drop packets without telling (black holes)
+        return False, None if response.message is None else response.message.packet.next_hop_mtu
+
+    def run(self, match_payloads=False):
+        """Searches the largest size between low and high that gets a reply, and stores it in mtu
+
+        The first probe tries high, so that paths without a bottleneck take one probe. When a router
+        reports its MTU, that size is probed next, otherwise the search halves the range at each probe.
+
+        :param match_payloads: Unused, replies are matched by identifier
+        :type match_payloads: bool"""
+        self.responses.clear()
+        self.mtu = None
+        low, high = self.low, self.high
+        size = high
+        seq = 1
+        while low <= high:
+            fits, reported = self.probe(size, seq)
+            seq = self.increase_seq(seq)
+            if fits:
+                self.mtu = size
+                low = size + 1
+            else:
+                high = size - 1
+                if reported is not None and low <= reported <= high:
+                    # Everything above the reported MTU would be rejected by the same router
+                    high = reported
+                    size = reported
+                    continue
+            size = (low + high) // 2
+
+
+class Flood(Communicator):
+    """Sends echo requests in batches as fast as possible, or at a given rate, and receives the replies concurrently
+
+    Like ping -f, to load test firewalls and rate limiters: packets are built before sending starts and replies
+    are matched to requests by sequence number as they arrive, on a receiving thread."""
+    POLL_INTERVAL = 0.05    # How often the receiving thread checks whether sending is over, in seconds
+
+    def __init__(self, target, count, payload=b'', timeout=1, rate=None, batch=64, seed_id=None, verbose=False,
+                 output=sys.stdout, source=None, tracer=None, transport=None, family=None, receive_buffer=None,
+                 send_buffer=None, window=None):
+        """Creates an instance that can flood the target device
+
+        :param target: IP or hostname of the remote device
+        :type target: str
+        :param count: How many requests to send
+        :type count: int
+        :param payload: Payload of every request
+        :type payload: bytes
+        :param timeout: Time to wait for replies once every request is sent, in seconds
+        :type timeout: Union[int, float]
+        :param rate: Requests to send per second, None for as fast as possible
+        :type rate: Union[None, float]
+        :param batch: Requests sent with each system call
+        :type batch: int
+        :param window: Most requests waiting for a reply at once, at most 0xFFFF so that the sequence number of a
+        request waiting is never reused, None for no limit up to 0xFFFF requests and 0xFFFF beyond. If no reply makes
+        room within timeout, the requests waiting are given up on, and their late replies counted as duplicates
+        :type window: Union[None, int]
+
+        See Communicator for the other parameters"""
+        super().__init__(target, None, timeout, 0, seed_id=seed_id, verbose=verbose, output=output, source=source,
+                         tracer=tracer, transport=transport, family=family, receive_buffer=receive_buffer,
+                         send_buffer=send_buffer)
+        self.count = count
+        self.payload = payload
+        self.rate = rate
+        self.batch = max(1, batch)
+        if window is not None and not 0 < window <= 0xFFFF:
+            raise ValueError('window must be between 1 and 0xFFFF, the number of sequence numbers')
+        if window is None and count > 0xFFFF:
+            # Sequence numbers wrap around, a request must get its reply or be given up on before its number is reused
+            window = 0xFFFF
+        self.window = window
+        self.output = output
+        self.verbose = verbose
+        self.clear()
+
+    def clear(self):
+        """Forgets the results of the previous run"""
+        self.rtts = array.array('d')
+        self.stats_sent = 0
+        self.stats_received = 0
+        self.stats_duplicates = 0
+        self.stats_kernel_drops = None
+        self.duration = 0
+        self._given_up = 0
+        self._progress = threading.Event()
+
+    def run(self, match_payloads=False):
+        """Sends all the requests, then waits up to timeout for the last replies
+
+        :param match_payloads: Unused, replies are matched by identifier and sequence number
+        :type match_payloads: bool"""
+        self.clear()
+        identifier = self.seed_id
+        # Sequence numbers go from 1 to 0xFFFF then wrap around, as in increase_seq
+        packets = [self.packet_class(self.packet_class.ECHO_REQUEST, self.payload, identifier,
+                                     index % 0xFFFF + 1).packet for index in range(self.count)]
+        sent_at = array.array('d', bytes(8 * 0x10000))
+        pending = bytearray(0x10000)
+        finished = threading.Event()
+        drops_before = self.socket.kernel_drops
+        receiver = threading.Thread(target=self._receive, args=(identifier, sent_at, pending, finished),
+                                    name='pythonping-flood', daemon=True)
+        receiver.start()
+        start = time.perf_counter()
+        try:
+            offset = 0
+            while offset < self.count:
+                size = self.batch if not self.window else min(self.batch, self._wait_for_room(pending))
+                chunk = packets[offset:offset + size]
+                offset += len(chunk)
+                # Stamped before sending, so that replies never arrive before their request is stamped
+                now = time.perf_counter()
+                for index in range(offset - len(chunk), offset):
+                    sequence_number = index % 0xFFFF + 1
+                    sent_at[sequence_number] = now
+                    pending[sequence_number] = 1
+                sent = 0
+                while sent < len(chunk):
+                    count = self.socket.send_batch(chunk[sent:])
+                    if not count:
+                        # Send buffer full on a non-blocking transport
+                        time.sleep(0)
+                    sent += count
+                self.stats_sent += sent
+                if self.rate:
+                    delay = start + self.stats_sent / self.rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            self.duration = time.perf_counter() - start
+            finished.set()
+            receiver.join()
+        if drops_before is not None:
+            self.stats_kernel_drops = self.socket.kernel_drops - drops_before
+        if self.verbose:
+            print(self.report(), file=self.output)
+
+    def _wait_for_room(self, pending):
+        deadline = time.perf_counter() + self.timeout
+        while True:
+            # Cleared before checking, so that a reply arriving in between wakes the wait up
+            self._progress.clear()
+            room = self.window - (self.stats_sent - self.stats_received - self._given_up)
+            if room > 0:
+                return room
+            time_left = deadline - time.perf_counter()
+            if time_left <= 0:
+                # Lost requests would stall sending forever, their late replies are not matched to the requests
+                # reusing their sequence numbers
+                pending[:] = bytes(len(pending))
+                self._given_up = self.stats_sent - self.stats_received
+                return self.window
+            self._progress.wait(time_left)
+
+    def _receive(self, identifier, sent_at, pending, finished):
+        parse = self.packet_class.parse
+        echo_reply = self.packet_class.ECHO_REPLY.type_id
+        deadline = None
+        while True:
+            if deadline is None and finished.is_set():
+                deadline = time.perf_counter() + self.timeout
+            time_left = self.POLL_INTERVAL
+            if deadline is not None:
+                if self.stats_received >= self.stats_sent:
+                    return
+                time_left = min(time_left, deadline - time.perf_counter())
+                if time_left <= 0:
+                    return
+            raw_packet, _, _ = self.socket.receive(time_left)
+            if not raw_packet:
+                continue
+            received = time.perf_counter()
+            try:
+                message_type, _, _, packet_id, sequence_number = parse(raw_packet)
+            except struct.error:
+                continue
+            if packet_id != identifier or message_type != echo_reply:
+                continue
+            if pending[sequence_number]:
+                pending[sequence_number] = 0
+                self.rtts.append(received - sent_at[sequence_number])
+                self.stats_received += 1
+                if self.window:
+                    self._progress.set()
+            else:
+                self.stats_duplicates += 1
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Computes the throughput, loss and round trip times of the last run
+
+        :param percentiles: Percentiles of the round trip time to compute (nearest rank)
+        :type percentiles: Iterable[float]
+        :return: Requests sent, replies received, duplicate replies, loss ratio, sending duration in seconds, requests
+        sent and replies received per second, kernel drops (None if unknown), min, mean and max round trip time in
+        seconds, and one rtt_p<percentile> per percentile, None if no reply was received
+        :rtype: dict"""
+        rtts = sorted(self.rtts)
+        duration = self.duration
+        summary = {
+            'sent': self.stats_sent,
+            'received': self.stats_received,
+            'duplicates': self.stats_duplicates,
+            'loss_ratio': 1 - self.stats_received / self.stats_sent if self.stats_sent else None,
+            'duration': duration,
+            'pps_sent': self.stats_sent / duration if duration else None,
+            'pps_received': self.stats_received / duration if duration else None,
+            'kernel_drops': self.stats_kernel_drops,
+            'rtt_min': rtts[0] if rtts else None,
+            'rtt_avg': sum(rtts) / len(rtts) if rtts else None,
+            'rtt_max': rtts[-1] if rtts else None,
+        }
+        for percentile in percentiles:
+            summary['rtt_p{0:g}'.format(percentile)] = \
+                rtts[max(0, math.ceil(percentile / 100 * len(rtts)) - 1)] if rtts else None
+        return summary
+
+    def report(self):
+        """Describes the results of the last run
+
+        :return: Human-readable throughput, loss and round trip times
+        :rtype: str"""
+        summary = self.summary()
+        lines = ['{0} sent, {1} received, {2} duplicates, {3:.2%} loss in {4:.3f}s'.format(
+            summary['sent'], summary['received'], summary['duplicates'], summary['loss_ratio'] or 0,
+            summary['duration'])]
+        if summary['duration']:
+            lines.append('{0:.0f} requests/s sent, {1:.0f} replies/s received'.format(
+                summary['pps_sent'], summary['pps_received']))
+        if summary['kernel_drops']:
+            lines.append('{0} packets dropped by the kernel (receive buffer full)'.format(summary['kernel_drops']))
+        if summary['rtt_min'] is not None:
+            lines.append('Round Trip Times min/avg/max/p50/p90/p99 is {0}/{1}/{2}/{3}/{4}/{5} ms'.format(
+                *(represent_seconds_in_ms(summary[key])
+                  for key in ('rtt_min', 'rtt_avg', 'rtt_max', 'rtt_p50', 'rtt_p90', 'rtt_p99'))))
+        return '\n'.join(lines)
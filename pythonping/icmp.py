@@ -120,10 +120,57 @@ class Types(ICMPType):
         INFORMATION_REQUEST = (type_id, 30)
 
 
+class TypesV6(ICMPType):
+    class DestinationUnreachable(ICMPType):
+        type_id = 1
+        NO_ROUTE = (type_id, 0,)
+        ADMINISTRATIVELY_PROHIBITED = (type_id, 1,)
+        BEYOND_SCOPE_OF_SOURCE = (type_id, 2,)
+        ADDRESS_UNREACHABLE = (type_id, 3,)
+        PORT_UNREACHABLE = (type_id, 4,)
+        SOURCE_POLICY_FAILED = (type_id, 5,)
+        REJECT_ROUTE = (type_id, 6,)
+        SOURCE_ROUTING_HEADER_ERROR = (type_id, 7,)
+
+    class PacketTooBig(ICMPType):
+        type_id = 2
+        PACKET_TOO_BIG = (type_id, 0,)
+
+    class TimeExceeded(ICMPType):
+        type_id = 3
+        HOP_LIMIT_EXCEEDED_IN_TRANSIT = (type_id, 0)
+        FRAGMENT_REASSEMBLY_TIME_EXCEEDED = (type_id, 1)
+
+    class ParameterProblem(ICMPType):
+        type_id = 4
+        ERRONEOUS_HEADER_FIELD = (type_id, 0)
+        UNRECOGNIZED_NEXT_HEADER = (type_id, 1)
+        UNRECOGNIZED_IPV6_OPTION = (type_id, 2)
+
+    class EchoRequest(ICMPType):
+        type_id = 128
+        ECHO_REQUEST = (type_id, 0,)
+
+    class EchoReply(ICMPType):
+        type_id = 129
+        ECHO_REPLY = (type_id, 0,)
+
+
 class ICMP:
     LEN_TO_PAYLOAD = 41     # Ethernet, IP and ICMP header lengths combined
-
-    def __init__(self, message_type=Types.EchoReply, payload=None, identifier=None, sequence_number=1):
+    IP_HEADER_LENGTH = 20   # Raw sockets return the IP header in front of the ICMP packet
+    HEADER = struct.Struct("BBHHH")
+    ECHO_REQUEST = Types.EchoRequest
+    ECHO_REPLY = Types.EchoReply
+    TIME_EXCEEDED = Types.TimeExceeded
+    # Error messages quoting the IP header and the first 8 bytes of the packet that caused them
+    ERROR_TYPES = (Types.DestinationUnreachable.type_id, Types.SourceQuench.type_id, Types.Redirect.type_id,
+                   Types.TimeExceeded.type_id, Types.BadIPHeader.type_id)
+    # Serialized packet and checksum are cached until a field changes
+    __slots__ = ('_message_type', '_message_code', '_payload', '_id', '_sequence_number', 'received_checksum',
+                 '_raw', '_packet', '_checksum')
+
+    def __init__(self, message_type=None, payload=None, identifier=None, sequence_number=1):
         """Creates an ICMP packet
 
         :param message_type: Type of ICMP message to send
@@ -132,33 +179,96 @@ class ICMP:
         :type payload: Union[str, bytes]
         :param identifier: ID of this ICMP packet
         :type identifier: int"""
-        self.message_code = 0
-        if issubclass(message_type, ICMPType):
-            self.message_type = message_type.type_id
+        if message_type is None:
+            message_type = self.ECHO_REPLY
+        self._message_code = 0
+        if isinstance(message_type, type) and issubclass(message_type, ICMPType):
+            self._message_type = message_type.type_id
         elif isinstance(message_type, tuple):
-            self.message_type = message_type[0]
-            self.message_code = message_type[1]
+            self._message_type = message_type[0]
+            self._message_code = message_type[1]
         elif isinstance(message_type, int):
-            self.message_type = message_type
+            self._message_type = message_type
         if payload is None:
             payload = bytes('1', 'utf8')
         elif isinstance(payload, str):
             payload = bytes(payload, 'utf8')
-        self.payload = payload
+        self._payload = payload
         if identifier is None:
             identifier = os.getpid()
-        self.id = identifier & 0xFFFF           # Prevent identifiers bigger than 16 bits
-        self.sequence_number = sequence_number
+        self._id = identifier & 0xFFFF           # Prevent identifiers bigger than 16 bits
+        self._sequence_number = sequence_number
         self.received_checksum = None
-        self.raw = None
+        self._raw = None
+        self._packet = None
+        self._checksum = None
+
+    def _invalidate(self):
+        """Forgets the serialized packet and checksum, after a field changed"""
+        self._raw = None
+        self._packet = None
+        self._checksum = None
+
+    @property
+    def message_type(self):
+        return self._message_type
+
+    @message_type.setter
+    def message_type(self, value):
+        self._message_type = value
+        self._invalidate()
+
+    @property
+    def message_code(self):
+        return self._message_code
+
+    @message_code.setter
+    def message_code(self, value):
+        self._message_code = value
+        self._invalidate()
+
+    @property
+    def payload(self):
+        return self._payload
+
+    @payload.setter
+    def payload(self, value):
+        self._payload = value
+        self._invalidate()
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value):
+        self._id = value
+        self._invalidate()
+
+    @property
+    def sequence_number(self):
+        return self._sequence_number
+
+    @sequence_number.setter
+    def sequence_number(self, value):
+        self._sequence_number = value
+        self._invalidate()
 
     @property
     def packet(self):
         """The raw packet with header, ready to be sent from a socket"""
-        p = self._header(check=self.expected_checksum) + self.payload
-        if self.raw is None:
-            self.raw = p
-        return p
+        if self._packet is None:
+            self._packet = self._header(check=self.expected_checksum) + self._payload
+        return self._packet
+
+    @property
+    def raw(self):
+        """The packet as received, with the IP header returned by raw sockets, or as sent"""
+        return self.packet if self._raw is None else self._raw
+
+    @raw.setter
+    def raw(self, value):
+        self._raw = value
 
     def _header(self, check=0):
         """The raw ICMP header
@@ -167,13 +277,7 @@ class ICMP:
         :type check: int
         :return: The packed header
         :rtype: bytes"""
-        # TODO implement sequence number
-        return struct.pack("BBHHH",
-                           self.message_type,
-                           self.message_code,
-                           check,
-                           self.id,
-                           self.sequence_number)
+        return self.HEADER.pack(self._message_type, self._message_code, check, self._id, self._sequence_number)
 
     def __repr__(self):
         return ' '.join('{:02x}'.format(b) for b in self.raw)
@@ -188,34 +292,118 @@ class ICMP:
     @property
     def expected_checksum(self):
         """The checksum expected for this packet, calculated with checksum field set to 0"""
-        return checksum(self._header() + self.payload)
+        if self._checksum is None:
+            self._checksum = checksum(self._header() + self._payload)
+        return self._checksum
 
     @property
     def header_length(self):
         """Length of the ICMP header"""
-        return len(self._header())
+        return self.HEADER.size
 
-    @staticmethod
-    def generate_from_raw(raw):
+    @classmethod
+    def parse(cls, raw, offset=None):
+        """Reads the header fields of a raw packet, without creating an ICMP object
+
+        :param raw: The raw packet, including payload
+        :type raw: Union[bytes, memoryview]
+        :param offset: Where the ICMP header starts in raw, None to skip the IP header returned by raw sockets
+        :type offset: Union[None, int]
+        :return: Type, code, checksum, identifier and sequence number
+        :rtype: (int, int, int, int, int)"""
+        return cls.HEADER.unpack_from(raw, cls.IP_HEADER_LENGTH if offset is None else offset)
+
+    @classmethod
+    def generate_from_raw(cls, raw):
         """Creates a new ICMP representation from the raw bytes
 
         :param raw: The raw packet including payload
         :type raw: bytes
         :return: An ICMP instance representing the packet
         :rtype: ICMP"""
-        packet = ICMP()
+        packet = cls()
         packet.unpack(raw)
         return packet
 
-    def unpack(self, raw):
+    def unpack(self, raw, offset=None):
         """Unpacks a raw packet and stores it in this object
 
         :param raw: The raw packet, including payload
-        :type raw: bytes"""
-        self.raw = raw
-        self.message_type, \
-            self.message_code, \
+        :type raw: bytes
+        :param offset: Where the ICMP header starts in raw, None to skip the IP header returned by raw sockets
+        :type offset: Union[None, int]"""
+        if offset is None:
+            offset = self.IP_HEADER_LENGTH
+        self._message_type, \
+            self._message_code, \
             self.received_checksum, \
-            self.id, \
-            self.sequence_number = struct.unpack("BBHHH", raw[20:28])
-        self.payload = raw[28:]
+            self._id, \
+            self._sequence_number = self.HEADER.unpack_from(raw, offset)
+        self._payload = raw[offset + 8:]
+        self._packet = None
+        self._checksum = None
+        self._raw = raw
+
+    def _quoted_header_length(self):
+        """Length of the IP header quoted in the payload of an error message"""
+        return (self.payload[0] & 0x0F) * 4
+
+    @property
+    def next_hop_mtu(self):
+        """MTU of the next hop reported by a Fragmentation Required message, None for other messages or if not
+        reported"""
+        if (self.message_type, self.message_code) != Types.DestinationUnreachable.FRAGMENTATION_REQUIRED:
+            return None
+        # The MTU is in the last 2 bytes of the header, in network byte order
+        return struct.unpack("!H", struct.pack("H", self.sequence_number))[0] or None
+
+    @property
+    def quoted(self):
+        """The header of the packet that caused this error message, as quoted in the payload
+
+        Only the ICMP header is quoted in full, the payload of the returned packet is cut short.
+        None if this is not an error message or the quote is too short."""
+        if self.message_type not in self.ERROR_TYPES or not self.payload:
+            return None
+        offset = self._quoted_header_length()
+        if len(self.payload) < offset + 8:
+            return None
+        packet = type(self)()
+        packet.unpack(self.payload, offset)
+        return packet
+
+
+class ICMPv6(ICMP):
+    """ICMPv6 packet, as exchanged over an AF_INET6 raw socket
+
+    The kernel computes and verifies the checksum, which covers an IPv6 pseudo-header, and does not
+    return the IPv6 header in front of received packets."""
+    IP_HEADER_LENGTH = 0
+    __slots__ = ()
+    ECHO_REQUEST = TypesV6.EchoRequest
+    ECHO_REPLY = TypesV6.EchoReply
+    TIME_EXCEEDED = TypesV6.TimeExceeded
+    ERROR_TYPES = (TypesV6.DestinationUnreachable.type_id, TypesV6.PacketTooBig.type_id, TypesV6.TimeExceeded.type_id,
+                   TypesV6.ParameterProblem.type_id)
+
+    def _quoted_header_length(self):
+        """The IPv6 header has a fixed length, extension headers are not supported"""
+        return 40
+
+    @property
+    def next_hop_mtu(self):
+        """MTU of the next hop reported by a Packet Too Big message, None for other messages"""
+        if self.message_type != TypesV6.PacketTooBig.type_id:
+            return None
+        # The MTU takes the 4 bytes after the checksum, in network byte order
+        return struct.unpack("!I", struct.pack("HH", self.id, self.sequence_number))[0] or None
+
+    @property
+    def is_valid(self):
+        """Always True, the kernel discards packets with an invalid checksum"""
+        return True
+
+    @property
+    def expected_checksum(self):
+        """Always 0, the kernel fills in the checksum of outgoing packets"""
+        return 0
@@ -1,14 +1,197 @@
+import errno
+import os
 import socket
 import select
+import struct
+import sys
 import time
+from . import tracing
 
 
-class Socket:
+FAMILY_LOOKUP = {"ipv4": socket.AF_INET, "ipv6": socket.AF_INET6}
+# Linux option, not exported by every Python version, None on other systems where 40 means another option
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40 if sys.platform.startswith('linux') else None)
+# Room for the ancillary data carrying the drop counter, a 32 bits integer
+DROP_COUNTER_SPACE = socket.CMSG_SPACE(4) if hasattr(socket, 'CMSG_SPACE') else 0
+
+
+def resolve(destination, family=None):
+    """Resolves a hostname or IP address to all its addresses
+
+    :param destination: Hostname or IP address
+    :type destination: str
+    :param family: Name of the address family to look for (ipv4 or ipv6), None for both
+    :type family: Union[None, str]
+    :return: Unique family names and addresses, in the order given by the resolver
+    :rtype: list"""
+    try:
+        results = socket.getaddrinfo(destination, None, FAMILY_LOOKUP[family] if family else socket.AF_UNSPEC,
+                                     socket.SOCK_DGRAM)
+    except socket.gaierror:
+        raise RuntimeError('Cannot resolve address "' + destination + '", try verify your DNS or host file')
+    names = {value: name for name, value in FAMILY_LOOKUP.items()}
+    addresses = []
+    for address_family, _, _, _, address in results:
+        if address_family in names and (names[address_family], address[0]) not in addresses:
+            addresses.append((names[address_family], address[0]))
+    return addresses
+
+
+def resolve_preferred(destination, family=None):
+    """Resolves a hostname or IP address to the address to use, preferring IPv4 when it has both
+
+    :param destination: Hostname or IP address
+    :type destination: str
+    :param family: Name of the address family to use (ipv4 or ipv6), None for both
+    :type family: Union[None, str]
+    :return: Address family and address
+    :rtype: (int, str)"""
+    addresses = resolve(destination, family)
+    if not addresses:
+        raise RuntimeError('Cannot resolve address "' + destination + '" to an IPv4 or IPv6 address')
+    family_name, address = min(addresses, key=lambda address: address[0] != 'ipv4')
+    return FAMILY_LOOKUP[family_name], address
+
+
+def enable_drop_counter(raw_socket):
+    """Asks the kernel to report how many packets it dropped because the receive buffer of a socket was full
+
+    :param raw_socket: The socket
+    :type raw_socket: socket.socket
+    :return: Whether the kernel reports drops, read them with receive_counting_drops (Linux only)
+    :rtype: bool"""
+    if SO_RXQ_OVFL is None or not DROP_COUNTER_SPACE:
+        return False
+    try:
+        raw_socket.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    except OSError:
+        return False
+    return True
+
+
+def receive_counting_drops(raw_socket, buffer_size):
+    """Receives a packet with the drop counter enabled by enable_drop_counter
+
+    :param raw_socket: The socket
+    :type raw_socket: socket.socket
+    :param buffer_size: Size in bytes of the largest packet received
+    :type buffer_size: int
+    :return: The packet, the remote socket, and the packets dropped since the socket was created, None if not reported
+    (the kernel reports drops only once there are some)
+    :rtype: (bytes, tuple, Union[None, int])"""
+    packet, ancillary, _, source = raw_socket.recvmsg(buffer_size, DROP_COUNTER_SPACE)
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+            return packet, source, struct.unpack('I', data[:4])[0]
+    return packet, source, None
+
+
+_SENDMMSG = []     # sendmmsg of the C library and its structures once loaded, see _load_sendmmsg
+
+
+def _load_sendmmsg():
+    """Loads sendmmsg from the C library with ctypes, on the first call only
+
+    :return: The function and the mmsghdr and iovec structures, None if the platform has no sendmmsg
+    :rtype: Union[None, tuple]"""
+    if not _SENDMMSG:
+        import ctypes
+        import ctypes.util
+
+        class IoVec(ctypes.Structure):
+            _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+        class MsgHdr(ctypes.Structure):
+            _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                        ('msg_iov', ctypes.POINTER(IoVec)), ('msg_iovlen', ctypes.c_size_t),
+                        ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                        ('msg_flags', ctypes.c_int)]
+
+        class MMsgHdr(ctypes.Structure):
+            _fields_ = [('msg_hdr', MsgHdr), ('msg_len', ctypes.c_uint)]
+
+        loaded = None
+        try:
+            sendmmsg = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True).sendmmsg
+        except (OSError, AttributeError, TypeError):
+            pass
+        else:
+            sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+            sendmmsg.restype = ctypes.c_int
+            loaded = (ctypes, sendmmsg, MMsgHdr, IoVec)
+        _SENDMMSG.append(loaded)
+    return _SENDMMSG[0]
+
+
+def _socket_address(family, address):
+    """Packs an IP address as a C sockaddr_in or sockaddr_in6 structure, with port 0
+
+    :param family: Address family, socket.AF_INET or socket.AF_INET6
+    :type family: int
+    :param address: IP address
+    :type address: str
+    :return: The packed structure
+    :rtype: bytes"""
+    if family == socket.AF_INET6:
+        return struct.pack('=HHI16sI', family, 0, 0, socket.inet_pton(family, address), 0)
+    return struct.pack('=HH4s8x', family, 0, socket.inet_aton(address))
+
+
+class Transport:
+    """Carries ICMP packets to a destination and back, extend it to replace the raw socket"""
+    tracer = None
+    family = socket.AF_INET
+    kernel_drops = None     # Packets dropped by the kernel as the receive buffer was full, None if unknown
+
+    def __init__(self):
+        raise NotImplementedError('Cannot create instances of Transport')
+
+    def send(self, packet):
+        """Sends a raw ICMP packet (without IP header) to the destination
+
+        :param packet: The raw packet to send
+        :type packet: bytes"""
+        raise NotImplementedError()
+
+    def send_batch(self, packets):
+        """Sends many raw ICMP packets to the destination, as fast as the transport can
+
+        :param packets: The raw packets to send
+        :type packets: Sequence[bytes]
+        :return: How many packets were sent, the first ones
+        :rtype: int"""
+        for packet in packets:
+            self.send(packet)
+        return len(packets)
+
+    def receive(self, timeout=2):
+        """Listen for incoming packets until timeout
+
+        :param timeout: Time after which stop listening
+        :type timeout: Union[int, float]
+        :return: The packet (with IP header), the remote socket, and the time left before timeout
+        :rtype: (bytes, tuple, float)"""
+        raise NotImplementedError()
+
+    def set_ttl(self, ttl):
+        """Sets the time to live (hop limit in IPv6) of the packets sent from now on
+
+        :param ttl: Maximum number of hops
+        :type ttl: int"""
+        raise NotImplementedError()
+
+
+class Socket(Transport):
     DONT_FRAGMENT = (socket.SOL_IP, 10, 1)           # Option value for raw socket
+    DONT_FRAGMENT_V6 = (socket.IPPROTO_IPV6, 62, 1)  # Option value for IPv6 raw socket (IPV6_DONTFRAG)
+    PROBE_MTU = (socket.SOL_IP, 10, 3)               # Don't Fragment, ignoring the path MTU known to the kernel
+    PROBE_MTU_V6 = (socket.IPPROTO_IPV6, 23, 3)      # Same for IPv6 raw socket (IPV6_MTU_DISCOVER)
+    V6_OPTIONS = {DONT_FRAGMENT: DONT_FRAGMENT_V6, PROBE_MTU: PROBE_MTU_V6}
     PROTO_LOOKUP = {"icmp": socket.IPPROTO_ICMP, "tcp": socket.IPPROTO_TCP, "udp": socket.IPPROTO_UDP,
-                    "ip": socket.IPPROTO_IP, "raw": socket.IPPROTO_RAW}
+                    "ip": socket.IPPROTO_IP, "raw": socket.IPPROTO_RAW, "icmpv6": socket.IPPROTO_ICMPV6}
 
-    def __init__(self, destination, protocol, options=(), buffer_size=2048, source=None):
+    def __init__(self, destination, protocol, options=(), buffer_size=2048, source=None, family=None,
+                 receive_buffer=None, send_buffer=None):
         """Creates a network socket to exchange messages
 
         :param destination: Destination IP address
@@ -20,18 +203,34 @@ class Socket:
         :param source: Source IP to use - implemented in future releases
         :type source: Union[None, str]
         :param buffer_size: Size in bytes of the listening buffer for incoming packets (replies)
-        :type buffer_size: int"""
-        try:
-            self.destination = socket.gethostbyname(destination)
-        except socket.gaierror as e:
-            raise RuntimeError('Cannot resolve address "' + destination + '", try verify your DNS or host file')
+        :type buffer_size: int
+        :param family: Name of the address family to use (ipv4 or ipv6), None to prefer IPv4 when the destination has
+        both
+        :type family: Union[None, str]
+        :param receive_buffer: Size in bytes of the kernel buffer holding replies not read yet (SO_RCVBUF), None for
+        the system default. Replies arriving when it is full are dropped, and counted in kernel_drops
+        :type receive_buffer: Union[None, int]
+        :param send_buffer: Size in bytes of the kernel buffer holding requests not sent yet (SO_SNDBUF), None for the
+        system default
+        :type send_buffer: Union[None, int]"""
+        self.family, self.destination = resolve_preferred(destination, family)
 
+        if self.family == socket.AF_INET6:
+            if protocol.lower() == 'icmp':
+                protocol = 'icmpv6'
+            options = Socket.V6_OPTIONS.get(options, options)
         self.protocol = Socket.getprotobyname(protocol)
         self.buffer_size = buffer_size
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, self.protocol)
+        self.socket = socket.socket(self.family, socket.SOCK_RAW, self.protocol)
         self.source = source
+        self.tracer = None
         if options:
             self.socket.setsockopt(*options)
+        if receive_buffer:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        if send_buffer:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer)
+        self.kernel_drops = 0 if enable_drop_counter(self.socket) else None
 
     # Implementing a version of socket.getprotobyname for this library since built-in is not thread safe
     # for python 3.5, 3.6, and 3.7:
@@ -56,6 +255,60 @@ class Socket:
             self.socket.bind((self.source, 0))
         self.socket.sendto(packet, (self.destination, 0))
 
+    def send_batch(self, packets):
+        """Sends many raw packets with one sendmmsg system call per batch, or one sendto each where not available
+
+        :param packets: The raw packets to send
+        :type packets: Sequence[bytes]
+        :return: How many packets were sent, less than all if the send buffer is full on a non-blocking socket
+        :rtype: int"""
+        if self.source:
+            self.socket.bind((self.source, 0))
+        loaded = _load_sendmmsg()
+        if loaded is None:
+            sent = 0
+            try:
+                for packet in packets:
+                    self.socket.sendto(packet, (self.destination, 0))
+                    sent += 1
+            except BlockingIOError:
+                pass
+            return sent
+        ctypes, sendmmsg, MMsgHdr, IoVec = loaded
+        count = len(packets)
+        # Buffers referenced by the structures must stay alive until the call returns
+        buffers = [ctypes.c_char_p(bytes(packet)) for packet in packets]
+        address = ctypes.create_string_buffer(_socket_address(self.family, self.destination))
+        vectors = (IoVec * count)()
+        messages = (MMsgHdr * count)()
+        for index, buffer in enumerate(buffers):
+            vectors[index].iov_base = ctypes.cast(buffer, ctypes.c_void_p)
+            vectors[index].iov_len = len(packets[index])
+            header = messages[index].msg_hdr
+            header.msg_name = ctypes.cast(address, ctypes.c_void_p)
+            header.msg_namelen = len(address.raw)
+            header.msg_iov = ctypes.pointer(vectors[index])
+            header.msg_iovlen = 1
+        sent = 0
+        while sent < count:
+            result = sendmmsg(self.socket.fileno(), ctypes.addressof(messages) + sent * ctypes.sizeof(MMsgHdr),
+                              count - sent, 0)
+            if result < 0:
+                error = ctypes.get_errno()
+                if error in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                    break
+                if error == errno.EINTR:
+                    continue
+                raise OSError(error, os.strerror(error))
+            sent += result
+        return sent
+
+    def set_ttl(self, ttl):
+        if self.family == socket.AF_INET6:
+            self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+        else:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+
     def receive(self, timeout=2):
         """Listen for incoming packets until timeout
 
@@ -69,10 +322,19 @@ class Socket:
             data_ready = select.select([self.socket], [], [], time_left)
             elapsed_in_select = time.perf_counter() - start_select
             time_left -= elapsed_in_select
+            if self.tracer is not None:
+                self.tracer.mark(tracing.Stages.SELECT)
             if not data_ready[0]:
                 # Timeout
                 return b'', '', time_left
-            packet, source = self.socket.recvfrom(self.buffer_size)
+            if self.kernel_drops is None:
+                packet, source = self.socket.recvfrom(self.buffer_size)
+            else:
+                packet, source, drops = receive_counting_drops(self.socket, self.buffer_size)
+                if drops is not None:
+                    self.kernel_drops = drops
+            if self.tracer is not None:
+                self.tracer.mark(tracing.Stages.RECEIVE)
             return packet, source, time_left
 
     def __del__(self):
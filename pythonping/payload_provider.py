@@ -1,5 +1,10 @@
 """Module generating ICMP payloads (with no header)"""
 
+import hmac
+import os
+import struct
+import time
+
 
 class PayloadProvider:
     def __init__(self):
@@ -32,6 +37,9 @@ class List(PayloadProvider):
             return ret
         raise StopIteration
 
+    def __len__(self):
+        return len(self._payloads)
+
 
 class Repeat(PayloadProvider):
     def __init__(self, pattern, count):
@@ -41,6 +49,9 @@ class Repeat(PayloadProvider):
         :type pattern: Union[str, bytes]
         :param count: How many payloads to generate
         :type count: int"""
+        if isinstance(pattern, str):
+            # Encode once here rather than once per packet
+            pattern = bytes(pattern, 'utf8')
         self.pattern = pattern
         self.count = count
         self._counter = 0
@@ -55,11 +66,16 @@ class Repeat(PayloadProvider):
             return self.pattern
         raise StopIteration
 
+    def __len__(self):
+        return self.count
+
 
 class Sweep(PayloadProvider):
     def __init__(self, pattern, start_size, end_size):
         """Creates a provider of payloads of increasing size
 
+        Payloads are memoryview slices of a single buffer, copy them with bytes() to keep them independently
+
         :param pattern: The existing payload, may be cut or replicated to fit the size
         :type pattern: Union[str, bytes]
         :param start_size: The first payload size to start with, included
@@ -70,12 +86,13 @@ class Sweep(PayloadProvider):
             raise ValueError('end_size must be greater or equal than start_size')
         if len(pattern) == 0:
             raise ValueError('pattern cannot be empty')
-        self.pattern = pattern
+        # Extend the length of the pattern if needed
+        self.pattern = pattern * max(1, -(-end_size // len(pattern)))
         self.start_size = start_size
         self.end_size = end_size
-        # Extend the length of the pattern if needed
-        while not len(self.pattern) >= end_size:
-            self.pattern += pattern
+        # Build the largest payload in one allocation, each payload is a view of its beginning, with no copy
+        extended = bytes(self.pattern, 'utf8') if isinstance(self.pattern, str) else bytes(self.pattern)
+        self._buffer = memoryview(extended)[:end_size]
         self._current_size = self.start_size
 
     def __iter__(self):
@@ -84,7 +101,78 @@ class Sweep(PayloadProvider):
 
     def __next__(self):
         if self._current_size <= self.end_size:
-            ret = self.pattern[0:self._current_size]
+            ret = self._buffer[:self._current_size]
             self._current_size += 1
             return ret
         raise StopIteration
+
+    def __len__(self):
+        return self.end_size - self.start_size + 1
+
+
+class Timestamp(PayloadProvider):
+    """Payloads carrying their send time and a cookie authenticating it, so that the RTT is computed from the reply
+
+    The sender keeps no state per request: the RTT of a reply comes from the payload it echoes, even for
+    replies arriving after the timeout or out of order."""
+    HEADER = struct.Struct('!d8s')      # Send time in seconds of clock, then cookie
+    COOKIE_SIZE = 8
+
+    def __init__(self, count, size=16, key=None, clock=time.perf_counter):
+        """Creates a provider of timestamped payloads
+
+        :param count: How many payloads to generate
+        :type count: int
+        :param size: Size of each payload, at least 16 bytes to hold the send time and the cookie
+        :type size: int
+        :param key: Secret key of the cookie, None for a random key
+        :type key: Union[None, bytes]
+        :param clock: Monotonic clock giving the send time, in seconds
+        :type clock: callable"""
+        self.count = count
+        self.size = max(size, self.HEADER.size)
+        self.key = os.urandom(16) if key is None else key
+        self.clock = clock
+        self._padding = bytes(self.size - self.HEADER.size)
+        self._counter = 0
+
+    def _cookie(self, timestamp):
+        return hmac.new(self.key, timestamp, 'sha256').digest()[:self.COOKIE_SIZE]
+
+    def __iter__(self):
+        self._counter = 0
+        return self
+
+    def __next__(self):
+        if self._counter < self.count:
+            self._counter += 1
+            return self.generate()
+        raise StopIteration
+
+    def generate(self):
+        """Generates a payload holding the current time, regardless of count
+
+        :return: The payload
+        :rtype: bytes"""
+        timestamp = struct.pack('!d', self.clock())
+        return timestamp + self._cookie(timestamp) + self._padding
+
+    def __len__(self):
+        return self.count
+
+    def rtt(self, payload, received=None):
+        """Computes the round trip time of a reply from the payload it echoes
+
+        :param payload: Payload of the reply
+        :type payload: bytes
+        :param received: When the reply was received, in seconds of clock, None for now
+        :type received: Union[None, float]
+        :return: Round trip time in seconds, None if the payload was not generated with this key
+        :rtype: Union[None, float]"""
+        if len(payload) < self.HEADER.size:
+            return None
+        timestamp = bytes(payload[:8])
+        if not hmac.compare_digest(bytes(payload[8:self.HEADER.size]), self._cookie(timestamp)):
+            return None
+        sent, _ = self.HEADER.unpack_from(payload)
+        return (self.clock() if received is None else received) - sent
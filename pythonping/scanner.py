@@ -0,0 +1,271 @@
+"""Module scanning large IPv4 networks for hosts replying to pings, keeping no state per request
+
+As zmap does, the identifier and sequence number of each request are a keyed hash of its destination, so that
+a reply is validated from its source address alone, and its payload holds its send time (see
+payload_provider.Timestamp), so that the round trip time is computed from the reply alone. Destinations are
+visited in the order of a random cyclic group permutation, spreading the requests over the networks scanned.
+Memory use does not depend on the number of destinations."""
+
+import bisect
+import hashlib
+import ipaddress
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from . import icmp
+from . import payload_provider
+
+# Bases making the Miller-Rabin test deterministic for numbers below 2 ** 64
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+def is_prime(number):
+    """Tests whether a number is prime
+
+    :param number: The number, below 2 ** 64
+    :type number: int
+    :return: Whether it is prime
+    :rtype: bool"""
+    if number < 2:
+        return False
+    for base in MILLER_RABIN_BASES:
+        if number % base == 0:
+            return number == base
+    odd, exponent = number - 1, 0
+    while odd % 2 == 0:
+        odd //= 2
+        exponent += 1
+    for base in MILLER_RABIN_BASES:
+        value = pow(base, odd, number)
+        if value in (1, number - 1):
+            continue
+        for _ in range(exponent - 1):
+            value = value * value % number
+            if value == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def next_prime(number):
+    """Finds the smallest prime greater than a number
+
+    :param number: The number
+    :type number: int
+    :return: The prime
+    :rtype: int"""
+    candidate = number + 1
+    while not is_prime(candidate):
+        candidate += 1
+    return candidate
+
+
+def prime_factors(number):
+    """Finds the distinct prime factors of a number, by trial division
+
+    :param number: The number, at least 1
+    :type number: int
+    :return: The prime factors
+    :rtype: set"""
+    factors = set()
+    divisor = 2
+    while divisor * divisor <= number:
+        while number % divisor == 0:
+            factors.add(divisor)
+            number //= divisor
+        divisor += 1
+    if number > 1:
+        factors.add(number)
+    return factors
+
+
+class CyclicPermutation:
+    """Visits every integer of range(size) once, in a random order, keeping only the current one
+
+    The order is the one of the powers of a random generator of the multiplicative group of integers modulo
+    the smallest prime greater than size, starting from a random element. Elements above size are skipped."""
+    def __init__(self, size, seed=None):
+        """Draws a random permutation
+
+        :param size: Number of integers to visit
+        :type size: int
+        :param seed: Seed of the random generator and first element, None for a different order each time
+        :type seed: Union[None, int]"""
+        choices = random.Random(seed)
+        self.size = size
+        self.prime = next_prime(size)
+        self.generator = self._draw_generator(choices)
+        self.first = choices.randrange(1, self.prime)
+
+    def _draw_generator(self, choices):
+        order = self.prime - 1
+        if order == 1:
+            return 1
+        factors = prime_factors(order)
+        while True:
+            # A generator is an element whose powers are not 1 before the order of the group
+            candidate = choices.randrange(2, self.prime)
+            if all(pow(candidate, order // factor, self.prime) != 1 for factor in factors):
+                return candidate
+
+    def __iter__(self):
+        prime = self.prime
+        generator = self.generator
+        size = self.size
+        element = self.first
+        while True:
+            if element <= size:
+                yield element - 1
+            element = element * generator % prime
+            if element == self.first:
+                return
+
+    def __len__(self):
+        return self.size
+
+
+class Scanner:
+    """Sends an echo request to every address of IPv4 networks and reports the hosts replying"""
+    POLL_INTERVAL = 0.05    # How often the receiving thread checks whether sending is done, in seconds
+
+    def __init__(self, networks, rate=None, timeout=1, size=16, key=None, seed=None, raw_socket=None,
+                 buffer_size=2048, receive_buffer=1 << 22):
+        """Creates a scanner, nothing is sent until run is called
+
+        :param networks: Networks to scan, in CIDR notation, or a single one
+        :type networks: Union[str, ipaddress.IPv4Network, Iterable[Union[str, ipaddress.IPv4Network]]]
+        :param rate: Requests to send per second, None for as fast as possible
+        :type rate: Union[None, float]
+        :param timeout: Time in seconds to wait for replies once every request is sent
+        :type timeout: Union[int, float]
+        :param size: Size of the payload of each request, in bytes, at least 16 to hold the send time
+        :type size: int
+        :param key: Secret key of the hash validating replies, None for a random key
+        :type key: Union[None, bytes]
+        :param seed: Seed of the order in which addresses are visited, None for a different order each run
+        :type seed: Union[None, int]
+        :param raw_socket: Raw ICMP socket to send and receive with, None to open one
+        :type raw_socket: Union[None, socket.socket]
+        :param buffer_size: Size in bytes of the largest packet received
+        :type buffer_size: int
+        :param receive_buffer: Size in bytes of the kernel receive buffer of the socket opened, None for the default
+        :type receive_buffer: Union[None, int]"""
+        if isinstance(networks, (str, ipaddress.IPv4Network)):
+            networks = [networks]
+        # First address of each network, and index of that address among all the addresses scanned
+        self.first_addresses = []
+        self.offsets = []
+        self.size = 0
+        for network in networks:
+            network = ipaddress.IPv4Network(network, strict=False)
+            self.first_addresses.append(int(network.network_address))
+            self.offsets.append(self.size)
+            self.size += network.num_addresses
+        self.rate = rate
+        self.timeout = timeout
+        self.key = os.urandom(16) if key is None else key
+        self.seed = seed
+        self.buffer_size = buffer_size
+        self.provider = payload_provider.Timestamp(0, size)
+        if raw_socket is None:
+            raw_socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            if receive_buffer:
+                raw_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        self.socket = raw_socket
+        self.stats_sent = 0
+        self.stats_send_errors = 0
+        self.stats_received = 0
+        self.stats_invalid = 0
+        self.duration = 0
+
+    def address(self, index):
+        """Finds the address at an index among all the addresses scanned
+
+        :param index: The index, below size
+        :type index: int
+        :return: The packed address
+        :rtype: bytes"""
+        network = bisect.bisect_right(self.offsets, index) - 1
+        return struct.pack('!I', self.first_addresses[network] + index - self.offsets[network])
+
+    def probe_fields(self, address):
+        """Computes the identifier and sequence number of the request to an address, a keyed hash of the address
+
+        :param address: The packed address
+        :type address: bytes
+        :return: Identifier and sequence number
+        :rtype: (int, int)"""
+        return struct.unpack('!HH', hashlib.blake2b(address, digest_size=4, key=self.key).digest())
+
+    def run(self, callback=None):
+        """Sends a request to every address, then waits up to timeout for the last replies
+
+        :param callback: Called from the receiving thread with the address and the round trip time in seconds (None
+        if the payload was truncated) of each valid reply, hosts replying twice are reported twice
+        :type callback: Union[None, callable]"""
+        self.stats_sent = 0
+        self.stats_send_errors = 0
+        self.stats_received = 0
+        self.stats_invalid = 0
+        finished = threading.Event()
+        self.socket.settimeout(self.POLL_INTERVAL)
+        receiver = threading.Thread(target=self._receive, args=(callback, finished), name='pythonping-scanner',
+                                    daemon=True)
+        receiver.start()
+        start = time.perf_counter()
+        try:
+            for index in CyclicPermutation(self.size, self.seed):
+                address = self.address(index)
+                identifier, sequence_number = self.probe_fields(address)
+                packet = icmp.ICMP(icmp.Types.EchoRequest, self.provider.generate(), identifier,
+                                   sequence_number).packet
+                try:
+                    self.socket.sendto(packet, (socket.inet_ntoa(address), 0))
+                except OSError:
+                    # E.g. no route to the host, or the send buffer is full
+                    self.stats_send_errors += 1
+                self.stats_sent += 1
+                if self.rate:
+                    delay = start + self.stats_sent / self.rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            self.duration = time.perf_counter() - start
+            finished.set()
+            receiver.join()
+
+    def _receive(self, callback, finished):
+        header_end = icmp.ICMP.IP_HEADER_LENGTH + icmp.ICMP.HEADER.size
+        echo_reply = icmp.Types.EchoReply.type_id
+        deadline = None
+        while True:
+            if deadline is None and finished.is_set():
+                deadline = time.perf_counter() + self.timeout
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            try:
+                raw_packet, _ = self.socket.recvfrom(self.buffer_size)
+            except socket.timeout:
+                continue
+            received = self.provider.clock()
+            if len(raw_packet) < header_end:
+                continue
+            message_type, _, _, identifier, sequence_number = icmp.ICMP.parse(raw_packet)
+            if message_type != echo_reply:
+                continue
+            # Source address in the IP header
+            address = raw_packet[12:16]
+            if (identifier, sequence_number) != self.probe_fields(address):
+                self.stats_invalid += 1
+                continue
+            self.stats_received += 1
+            if callback is not None:
+                callback(socket.inet_ntoa(address), self.provider.rtt(raw_packet[header_end:], received))
+
+    def close(self):
+        """Closes the socket"""
+        self.socket.close()
@@ -0,0 +1,249 @@
+"""Module simulating a network in memory, to run the engine without root nor a real network"""
+
+import heapq
+import itertools
+import random
+import socket
+import struct
+import threading
+import time
+from . import icmp
+from . import network
+from . import tracing
+
+
+def ip_header(source, destination, payload_length, protocol=socket.IPPROTO_ICMP, ttl=64):
+    """Creates a minimal IPv4 header, as the kernel places in front of packets read from a raw socket
+
+    :param source: Source IPv4 address
+    :type source: str
+    :param destination: Destination IPv4 address
+    :type destination: str
+    :param payload_length: Length of what follows the header, in bytes
+    :type payload_length: int
+    :param protocol: Protocol number of the payload
+    :type protocol: int
+    :param ttl: Time to live
+    :type ttl: int
+    :return: The packed header
+    :rtype: bytes"""
+    header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + payload_length, 0, 0, ttl, protocol, 0,
+                         socket.inet_aton(source), socket.inet_aton(destination))
+    # icmp.checksum returns the checksum already swapped for little endian packing
+    return header[:10] + struct.pack('<H', icmp.checksum(header)) + header[12:]
+
+
+class Network:
+    """In-process responder echoing requests, with configurable latency, loss, reordering, duplication and truncation
+
+    Every random choice comes from a generator seeded with seed, so the same seed produces the same
+    sequence of events"""
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, reorder=0.0, reorder_delay=None, duplicate=0.0,
+                 truncate=None, distribution=None, seed=None, address='127.0.0.1', hops=0, mtu=None):
+        """Creates a simulated network
+
+        :param latency: Round trip time of every reply, in seconds
+        :type latency: float
+        :param jitter: Maximum random variation of latency, in both directions, in seconds
+        :type jitter: float
+        :param loss: Probability for a request to get no reply
+        :type loss: float
+        :param reorder: Probability for a reply to be held back by reorder_delay, so that later replies overtake it
+        :type reorder: float
+        :param reorder_delay: Additional delay of reordered replies in seconds, defaults to twice latency plus 1ms
+        :type reorder_delay: Union[None, float]
+        :param duplicate: Probability for a reply to be delivered twice
+        :type duplicate: float
+        :param truncate: Maximum number of payload bytes echoed back, None to echo the whole payload
+        :type truncate: Union[None, int]
+        :param distribution: Function returning the latency in seconds given a random.Random, replaces latency and jitter
+        :type distribution: Union[None, callable]
+        :param seed: Seed of the random choices
+        :type seed: Union[None, int]
+        :param address: Local address the replies are sent to
+        :type address: str
+        :param hops: Number of routers between the local address and every destination, see router_address
+        :type hops: int
+        :param mtu: Path MTU, larger requests get Fragmentation Required as if Don't Fragment was set, None for no limit
+        :type mtu: Union[None, int]"""
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay if reorder_delay is not None else latency * 2 + 0.001
+        self.duplicate = duplicate
+        self.truncate = truncate
+        self.distribution = distribution
+        self.address = address
+        self.hops = hops
+        self.mtu = mtu
+        self.random = random.Random(seed)
+        self.stats_requests = 0
+        self.stats_replies = 0
+        self.stats_lost = 0
+        self.stats_duplicated = 0
+        self.stats_reordered = 0
+        self._lock = threading.Lock()
+
+    def socket(self, destination=None):
+        """Creates a transport to a destination on this network, to give to a Communicator
+
+        :param destination: Destination IP address, None to only send with sendto
+        :type destination: Union[None, str]
+        :return: The transport
+        :rtype: Socket"""
+        return Socket(self, destination)
+
+    def _latency(self):
+        if self.distribution is not None:
+            return max(0.0, self.distribution(self.random))
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def router_address(hop):
+        """Address of the router at a given hop, in the 198.18.0.0/15 benchmarking range
+
+        :param hop: Distance of the router from the local address, starting from 1
+        :type hop: int
+        :return: The address of the router
+        :rtype: str"""
+        return '198.18.{0}.{1}'.format(hop >> 8 & 0xFF, hop & 0xFF)
+
+    def replies(self, request, destination, ttl=64):
+        """Decides the fate of a request
+
+        :param request: The raw ICMP request, without IP header
+        :type request: bytes
+        :param destination: Address the request was sent to
+        :type destination: str
+        :param ttl: Time to live of the request, routers reply with Time Exceeded when it runs out
+        :type ttl: int
+        :return: The replies with IP header, each with the address sending it and its delay in seconds
+        :rtype: list"""
+        request = bytes(request)
+        parsed = icmp.ICMP.generate_from_raw(bytes(20) + request)
+        if parsed.message_type != icmp.Types.EchoRequest.type_id:
+            return []
+        if self.mtu is not None and 20 + len(request) > self.mtu:
+            # The first router, or the destination if directly connected, reports the MTU of the next hop
+            source = self.router_address(1) if self.hops else destination
+            quote = ip_header(self.address, destination, len(request), ttl=ttl) + request[:8]
+            next_hop_mtu = struct.unpack('H', struct.pack('!H', self.mtu))[0]
+            reply = icmp.ICMP(icmp.Types.DestinationUnreachable.FRAGMENTATION_REQUIRED, payload=quote, identifier=0,
+                              sequence_number=next_hop_mtu).packet
+        elif ttl <= self.hops:
+            # The router quotes the IP header and the first 8 bytes of the request
+            source = self.router_address(ttl)
+            quote = ip_header(self.address, destination, len(request), ttl=1) + request[:8]
+            reply = icmp.ICMP(icmp.Types.TimeExceeded, payload=quote, identifier=0, sequence_number=0).packet
+        else:
+            source = destination
+            payload = parsed.payload if self.truncate is None else parsed.payload[:self.truncate]
+            reply = icmp.ICMP(icmp.Types.EchoReply, payload=payload, identifier=parsed.id,
+                              sequence_number=parsed.sequence_number).packet
+        reply = ip_header(source, self.address, len(reply)) + reply
+        with self._lock:
+            self.stats_requests += 1
+            if self.random.random() < self.loss:
+                self.stats_lost += 1
+                return []
+            copies = 1
+            if self.random.random() < self.duplicate:
+                self.stats_duplicated += 1
+                copies = 2
+            delivered = []
+            for _ in range(copies):
+                delay = self._latency()
+                if self.random.random() < self.reorder:
+                    self.stats_reordered += 1
+                    delay += self.reorder_delay
+                delivered.append((reply, source, delay))
+            self.stats_replies += copies
+        return delivered
+
+
+class Socket(network.Transport):
+    """Transport exchanging packets with a simulated Network"""
+    def __init__(self, simulated_network, destination):
+        """Creates a transport to a destination on a simulated network
+
+        :param simulated_network: The network carrying the packets
+        :type simulated_network: Network
+        :param destination: Destination IP address
+        :type destination: str"""
+        self.network = simulated_network
+        self.destination = destination
+        self.ttl = 64
+        self.timeout = None
+        self._pending = []
+        self._counter = itertools.count()
+        # Sending and receiving may happen on different threads, a receiver waiting is woken up by new requests
+        self._lock = threading.Condition()
+
+    def send(self, packet):
+        self.sendto(packet, (self.destination, 0))
+
+    def sendto(self, packet, address):
+        """Sends a request to any destination, as socket.socket.sendto
+
+        :param packet: The raw ICMP request
+        :type packet: bytes
+        :param address: Destination IP address and port
+        :type address: tuple"""
+        replies = self.network.replies(packet, address[0], self.ttl)
+        # Latency starts when the request leaves, after the responder crafted the replies
+        now = time.perf_counter()
+        with self._lock:
+            for reply, source, delay in replies:
+                heapq.heappush(self._pending, (now + delay, next(self._counter), reply, source))
+            self._lock.notify_all()
+
+    def set_ttl(self, ttl):
+        self.ttl = ttl
+
+    def receive(self, timeout=2):
+        deadline = time.perf_counter() + timeout
+        while True:
+            now = time.perf_counter()
+            with self._lock:
+                ready = self._pending and self._pending[0][0] <= now
+                if ready:
+                    _, _, packet, source = heapq.heappop(self._pending)
+                elif now < deadline:
+                    next_delivery = self._pending[0][0] if self._pending else deadline
+                    self._lock.wait(min(deadline, next_delivery) - now)
+                    continue
+            if ready:
+                if self.tracer is not None:
+                    self.tracer.mark(tracing.Stages.SELECT)
+                    self.tracer.mark(tracing.Stages.RECEIVE)
+                return packet, (source, 0), deadline - now
+            if now >= deadline:
+                if self.tracer is not None:
+                    self.tracer.mark(tracing.Stages.SELECT)
+                return b'', '', 0
+
+    def settimeout(self, timeout):
+        """Sets how long recvfrom waits for a packet, as socket.socket.settimeout
+
+        :param timeout: Time in seconds, None to wait forever
+        :type timeout: Union[None, float]"""
+        self.timeout = timeout
+
+    def recvfrom(self, buffer_size):
+        """Receives the next reply, as socket.socket.recvfrom
+
+        :param buffer_size: Largest packet received, longer packets are truncated
+        :type buffer_size: int
+        :return: The packet with IP header, and the address and port sending it
+        :rtype: (bytes, tuple)"""
+        timeout = self.timeout
+        while True:
+            packet, source, _ = self.receive(1 if timeout is None else timeout)
+            if packet:
+                return packet[:buffer_size], source
+            if timeout is not None:
+                raise socket.timeout('timed out')
+
+    def close(self):
+        """Nothing to release, as socket.socket.close"""
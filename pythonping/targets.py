@@ -0,0 +1,250 @@
+"""Module monitoring many IPv4 targets with little memory per target
+
+The state of each target lives at its index in parallel arrays of a TargetTable, about 32 bytes per target
+instead of kilobytes for a Communicator and its ResponseList. Requests are built from the index, which picks one
+of the ICMP identifiers reserved by the table, and replies are matched back to their index from the identifier and
+the source address."""
+
+import array
+import math
+import socket
+import struct
+import time
+from . import SEED_IDs, _allocate_seed_id, icmp
+
+
+class TargetTable:
+    """IPv4 targets and their state, in parallel arrays indexed by target
+
+    The table reserves an ICMP identifier for each of its first MAX_IDENTIFIERS targets, in SEED_IDs as ping does, so
+    that concurrent pings do not get its replies. Targets beyond share them: the target at an index uses the
+    identifier of the index modulo MAX_IDENTIFIERS. Release the identifiers with close."""
+    MAX_LOSSES = 0xFFFF         # Consecutive losses stop being counted past this
+    MAX_IDENTIFIERS = 0x1000    # Most identifiers reserved, leaving the others to concurrent pings
+
+    def __init__(self, addresses=(), interval=1, payload=b''):
+        """Creates a table
+
+        :param addresses: IPv4 addresses of the targets
+        :type addresses: Iterable[str]
+        :param interval: Time between two requests to the same target, in seconds
+        :type interval: float
+        :param payload: Payload of the requests
+        :type payload: bytes"""
+        self.interval = interval
+        self.payload = payload
+        self.addresses = array.array('I')   # Address, as an integer in network order
+        self.rtts = array.array('d')        # Round trip time of the last reply in seconds, NaN if none yet
+        self.losses = array.array('H')      # Requests lost since the last reply
+        self.due = array.array('d')         # When the next request is due, in seconds of time.perf_counter
+        self.sequences = array.array('H')   # Sequence number of the last request
+        self.sent_at = array.array('d')     # When the request waiting for a reply was sent, 0 if none is waiting
+        self.cursor = 0                     # Index of the next target to send a request to
+        self.identifiers = array.array('H')     # Identifiers reserved, by index modulo MAX_IDENTIFIERS
+        self._slots = {}                        # Index modulo MAX_IDENTIFIERS, by identifier
+        self.extend(addresses)
+
+    def add(self, address):
+        """Adds a target, due now
+
+        :param address: IPv4 address of the target
+        :type address: str
+        :return: Index of the target
+        :rtype: int"""
+        self.addresses.append(struct.unpack('!I', socket.inet_aton(address))[0])
+        self.rtts.append(math.nan)
+        self.losses.append(0)
+        self.due.append(0)
+        self.sequences.append(0)
+        self.sent_at.append(0)
+        index = len(self.addresses) - 1
+        if len(self.identifiers) < self.MAX_IDENTIFIERS:
+            identifier = _allocate_seed_id()
+            self._slots[identifier] = len(self.identifiers)
+            self.identifiers.append(identifier)
+        return index
+
+    def extend(self, addresses):
+        """Adds targets, due now
+
+        :param addresses: IPv4 addresses of the targets
+        :type addresses: Iterable[str]"""
+        for address in addresses:
+            self.add(address)
+
+    def address(self, index):
+        """Finds the address of a target
+
+        :param index: Index of the target
+        :type index: int
+        :return: IPv4 address
+        :rtype: str"""
+        return socket.inet_ntoa(struct.pack('!I', self.addresses[index]))
+
+    def identifier(self, index):
+        """Finds the ICMP identifier of the requests to a target
+
+        :param index: Index of the target
+        :type index: int
+        :return: The identifier
+        :rtype: int"""
+        return self.identifiers[index % self.MAX_IDENTIFIERS]
+
+    def schedule(self, start=None):
+        """Spreads the next request of every target evenly over one interval, in order of index
+
+        :param start: When the request to the first target is due, in seconds of time.perf_counter, None for now
+        :type start: Union[None, float]"""
+        if start is None:
+            start = time.perf_counter()
+        step = self.interval / len(self) if len(self) else 0
+        for index in range(len(self)):
+            self.due[index] = start + index * step
+        self.cursor = 0
+
+    def request(self, index, now=None):
+        """Builds the next request to a target, counting the previous one as lost if it got no reply
+
+        :param index: Index of the target
+        :type index: int
+        :param now: When the request is sent, in seconds of time.perf_counter, None for now
+        :type now: Union[None, float]
+        :return: The raw ICMP request
+        :rtype: bytes"""
+        if now is None:
+            now = time.perf_counter()
+        if self.sent_at[index] and self.losses[index] < self.MAX_LOSSES:
+            self.losses[index] += 1
+        sequence_number = self.sequences[index] % 0xFFFF + 1
+        self.sequences[index] = sequence_number
+        self.sent_at[index] = now
+        self.due[index] = now + self.interval
+        return icmp.ICMP(icmp.Types.EchoRequest, self.payload, self.identifier(index), sequence_number).packet
+
+    def due_targets(self, now=None):
+        """Finds the targets whose request is due, in round robin order from the cursor, and moves the cursor past them
+
+        Requests sent in order keep the due times sorted from the cursor, so only the targets due are visited.
+
+        :param now: Current time, in seconds of time.perf_counter, None for now
+        :type now: Union[None, float]
+        :return: Indexes of the targets
+        :rtype: Iterator[int]"""
+        if now is None:
+            now = time.perf_counter()
+        for _ in range(len(self)):
+            index = self.cursor
+            if self.due[index] > now:
+                return
+            self.cursor = (index + 1) % len(self)
+            yield index
+
+    def match(self, raw_packet, now=None):
+        """Finds the target of a reply and records its round trip time
+
+        Targets whose indexes share the identifier of the reply are told apart by their address.
+
+        :param raw_packet: The packet, with IP header, as read from a raw socket
+        :type raw_packet: bytes
+        :param now: When the reply was received, in seconds of time.perf_counter, None for now
+        :type now: Union[None, float]
+        :return: Index of the target, None if the reply is not for a request waiting for it
+        :rtype: Union[None, int]"""
+        if now is None:
+            now = time.perf_counter()
+        try:
+            message_type, _, _, identifier, sequence_number = icmp.ICMP.parse(raw_packet)
+        except struct.error:
+            return None
+        slot = self._slots.get(identifier)
+        if message_type != icmp.Types.EchoReply.type_id or slot is None:
+            return None
+        # Source address in the IP header
+        source, = struct.unpack_from('!I', raw_packet, 12)
+        for index in range(slot, len(self.addresses), self.MAX_IDENTIFIERS):
+            if self.addresses[index] == source:
+                if self.sequences[index] != sequence_number or not self.sent_at[index]:
+                    # Duplicate, or reply to a request already counted as lost
+                    return None
+                self.rtts[index] = now - self.sent_at[index]
+                self.losses[index] = 0
+                self.sent_at[index] = 0
+                return index
+        return None
+
+    def close(self):
+        """Releases the identifiers reserved, for other pings to use them, no reply is matched anymore"""
+        for identifier in self.identifiers:
+            SEED_IDs.remove(identifier)
+        self.identifiers = array.array('H')
+        self._slots = {}
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+class Monitor:
+    """Pings every target of a TargetTable once per interval, from one raw socket and one thread"""
+    POLL_INTERVAL = 0.05    # Longest wait for replies before checking for requests due, in seconds
+    BATCH = 64              # Most requests sent before reading the replies waiting
+
+    def __init__(self, table, raw_socket=None, buffer_size=2048, receive_buffer=1 << 22):
+        """Creates a monitor, nothing is sent until run is called
+
+        :param table: The targets
+        :type table: TargetTable
+        :param raw_socket: Raw ICMP socket to send and receive with, None to open one
+        :type raw_socket: Union[None, socket.socket]
+        :param buffer_size: Size in bytes of the largest packet received
+        :type buffer_size: int
+        :param receive_buffer: Size in bytes of the kernel receive buffer of the socket opened, None for the default
+        :type receive_buffer: Union[None, int]"""
+        self.table = table
+        self.buffer_size = buffer_size
+        if raw_socket is None:
+            raw_socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            if receive_buffer:
+                raw_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        self.socket = raw_socket
+        self.stats_sent = 0
+        self.stats_received = 0
+        self.stats_send_errors = 0
+
+    def run(self, duration):
+        """Sends the requests due and matches the replies for a while, schedule the table first to spread the first
+        requests over an interval
+
+        :param duration: How long to run, in seconds
+        :type duration: float"""
+        table = self.table
+        end = time.perf_counter() + duration
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                return
+            for sent, index in enumerate(table.due_targets(now), 1):
+                try:
+                    self.socket.sendto(table.request(index, now), (table.address(index), 0))
+                except OSError:
+                    # E.g. no route to the host, or the send buffer is full
+                    self.stats_send_errors += 1
+                self.stats_sent += 1
+                if sent == self.BATCH:
+                    break
+            next_due = table.due[table.cursor] if len(table) else end
+            self._receive(min(next_due, end, now + self.POLL_INTERVAL))
+
+    def _receive(self, until):
+        # Replies waiting are read even if requests are due already, so that they are matched when sending lags behind
+        while True:
+            self.socket.settimeout(max(0, until - time.perf_counter()))
+            try:
+                raw_packet, _ = self.socket.recvfrom(self.buffer_size)
+            except (socket.timeout, BlockingIOError):
+                return
+            if self.table.match(raw_packet) is not None:
+                self.stats_received += 1
+
+    def close(self):
+        """Closes the socket"""
+        self.socket.close()
@@ -0,0 +1,116 @@
+"""Module recording where the time of each probe goes, stage by stage"""
+
+import collections
+import time
+
+
+class Stages:
+    """Names of the stages recorded while sending a probe and listening for its reply
+
+    A mark is recorded at the end of each stage, so the time spent in a stage is the time elapsed
+    since the previous mark of the same probe. This is a static class, not meant to be instantiated"""
+    START = 'start'             # Probe begins, no work done yet
+    BUILD = 'build'             # ICMP object created
+    CHECKSUM = 'checksum'       # Checksum calculated
+    PACK = 'pack'               # Header packed and joined with the payload
+    SEND = 'send'               # Packet handed to the socket
+    SELECT = 'select'           # Waiting for the socket to be readable, this is where network RTT is spent
+    RECEIVE = 'receive'         # Packet read from the socket
+    UNPACK = 'unpack'           # Received packet unpacked
+    MATCH = 'match'             # Received packet matched (or not) against the request
+    ALL = (START, BUILD, CHECKSUM, PACK, SEND, SELECT, RECEIVE, UNPACK, MATCH)
+    NETWORK = (SELECT,)
+
+    def __init__(self):
+        raise TypeError('Stages may not be instantiated')
+
+
+class Tracer:
+    """Collects timestamped marks for each stage of each probe in a bounded ring buffer"""
+    def __init__(self, capacity=4096, callback=None, clock=time.perf_counter):
+        """Creates a tracer that can be given to a Communicator
+
+        :param capacity: Maximum number of marks to keep, older marks are discarded first
+        :type capacity: int
+        :param callback: Function called for each mark as callback(probe, stage, timestamp)
+        :type callback: Union[None, callable]
+        :param clock: Monotonic clock returning seconds as float
+        :type clock: callable"""
+        self.events = collections.deque(maxlen=capacity)
+        self.callback = callback
+        self.clock = clock
+        self.probe = None
+
+    def begin(self, probe):
+        """Starts tracing a new probe, following marks will be assigned to it
+
+        :param probe: Any hashable key identifying the probe, e.g. the sequence number
+        :type probe: Hashable"""
+        self.probe = probe
+        self.mark(Stages.START)
+
+    def mark(self, stage):
+        """Records the end of a stage for the current probe
+
+        :param stage: Name of the stage, one of Stages
+        :type stage: str"""
+        timestamp = self.clock()
+        self.events.append((self.probe, stage, timestamp))
+        if self.callback is not None:
+            self.callback(self.probe, stage, timestamp)
+
+    def clear(self):
+        self.events.clear()
+        self.probe = None
+
+    def breakdown(self):
+        """Splits the wall time of every probe among its stages
+
+        :return: For each probe, the seconds spent in each stage, in order of recording
+        :rtype: collections.OrderedDict"""
+        probes = collections.OrderedDict()
+        last_marks = {}
+        for probe, stage, timestamp in self.events:
+            stages = probes.setdefault(probe, collections.OrderedDict())
+            if probe in last_marks:
+                stages[stage] = stages.get(stage, 0) + timestamp - last_marks[probe]
+            last_marks[probe] = timestamp
+        return probes
+
+    def summary(self):
+        """Aggregates the breakdown of all probes
+
+        :return: For each stage, the total and mean seconds across probes, and the number of probes
+        :rtype: dict"""
+        breakdown = self.breakdown()
+        totals = collections.OrderedDict((stage, 0) for stage in Stages.ALL[1:])
+        for stages in breakdown.values():
+            for stage, elapsed in stages.items():
+                totals[stage] = totals.get(stage, 0) + elapsed
+        probes = len(breakdown)
+        network = sum(totals[stage] for stage in Stages.NETWORK)
+        return {
+            'probes': probes,
+            'total': totals,
+            'mean': collections.OrderedDict(
+                (stage, total / probes if probes else 0) for stage, total in totals.items()
+            ),
+            'network': network,
+            'overhead': sum(totals.values()) - network
+        }
+
+    def report(self):
+        """Human-readable table of where the wall time of the probes went
+
+        :return: The report, one line per stage
+        :rtype: str"""
+        summary = self.summary()
+        wall = summary['network'] + summary['overhead']
+        lines = ['{0:<10}{1:>14}{2:>10}'.format('stage', 'mean (us)', 'share')]
+        for stage, mean in summary['mean'].items():
+            share = summary['total'][stage] / wall * 100 if wall else 0
+            lines.append('{0:<10}{1:>14.2f}{2:>9.1f}%'.format(stage, mean * 1000000, share))
+        lines.append('{0} probes, network {1:.2f}ms, library overhead {2:.2f}ms'.format(
+            summary['probes'], summary['network'] * 1000, summary['overhead'] * 1000
+        ))
+        return '\n'.join(lines)
@@ -1,8 +1,33 @@
 """Module containing service classes and functions"""
 
-import string
+import functools
+import os
 import random
 
+# Uppercase letters and digits, as string.ascii_uppercase + string.digits without importing string (and re)
+ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+# Maps every byte value onto the alphabet, the first 256 % 36 characters are slightly more frequent
+_TO_ALPHABET = bytes(ALPHABET[value % len(ALPHABET)] for value in range(256))
+PAYLOAD_CACHE_SIZE = 32
+
+
+def random_bytes(size, seed=None):
+    """Returns random uppercase letters and digits, generated in bulk
+
+    :param size: Number of bytes to generate
+    :type size: int
+    :param seed: Seed of a pseudo-random generator, to get the same bytes for the same seed, None to use os.urandom
+    :type seed: Union[None, int]
+    :return: Random bytes
+    :rtype: bytes"""
+    if size <= 0:
+        return b''
+    if seed is None:
+        data = os.urandom(size)
+    else:
+        data = random.Random(seed).getrandbits(size * 8).to_bytes(size, 'little')
+    return data.translate(_TO_ALPHABET)
+
 
 def random_text(size):
     """Returns a random text of the specified size
@@ -11,4 +36,17 @@ def random_text(size):
     :type size int
     :return: Random string
     :rtype: str"""
-    return ''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(size))
+    return random_bytes(size).decode('ascii')
+
+
+@functools.lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def cached_payload(size):
+    """Returns a random payload of the specified size, the same for every call with the same size
+
+    The most recently used sizes are kept in memory, so that frequent pings do not pay for creating the payload.
+
+    :param size: Size of the payload
+    :type size: int
+    :return: Random bytes
+    :rtype: bytes"""
+    return random_bytes(size)
@@ -11,6 +11,8 @@ setup(name='pythonping',
       author_email='me@alessandromaggio.com',
       license='MIT',
       packages=['pythonping'],
+      extras_require={'numpy': ['numpy']},
+      entry_points={'console_scripts': ['pythonping=pythonping.cli:main']},
       keywords=['ping', 'icmp', 'network'],
       classifiers=[
             'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,90 @@
+import unittest
+from pythonping import analytics, executor, icmp
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class AnalyticsTestCase(unittest.TestCase):
+    """Tests for the analytics module"""
+
+    @staticmethod
+    def array_from_times(times):
+        """Generates records from a list of time elapsed, None for a request with no reply"""
+        responses = executor.ResponseList()
+        for sequence, time_elapsed in enumerate(times, 1):
+            request = icmp.ICMP(icmp.Types.EchoRequest, sequence_number=sequence)
+            if time_elapsed is None:
+                responses.append(executor.Response(None, 2, request, timestamp=sequence))
+            else:
+                message = executor.Message('', icmp.ICMP(icmp.Types.EchoReply), '127.0.0.1')
+                responses.append(executor.Response(message, time_elapsed, request, timestamp=sequence))
+        return responses.to_numpy()
+
+    def test_to_numpy(self):
+        """Verifies every field is exported"""
+        array = self.array_from_times([0.1, None])
+        self.assertEqual(list(array['rtt']), [0.1, 2], 'Wrong RTT')
+        self.assertEqual(list(array['success']), [True, False], 'Wrong success flag')
+        self.assertEqual(list(array['error']), [0, -1], 'Wrong error code')
+        self.assertEqual(list(array['sequence']), [1, 2], 'Wrong sequence number')
+        self.assertEqual(list(array['timestamp']), [1, 2], 'Wrong timestamp')
+
+    def test_percentiles(self):
+        """Verifies percentiles only consider successful responses"""
+        array = self.array_from_times([1, 2, 3, None, 4, 5])
+        self.assertEqual(list(analytics.percentiles(array, [0, 50, 100])), [1, 3, 5], 'Wrong percentiles')
+        self.assertTrue(numpy.isnan(analytics.percentiles(self.array_from_times([None]), [50])).all(),
+                        'Percentile of no successful response is not NaN')
+
+    def test_loss_bursts(self):
+        """Verifies runs of losses are found"""
+        starts, lengths = analytics.loss_bursts(self.array_from_times([None, 1, None, None, None, 1, None]))
+        self.assertEqual(list(starts), [0, 2, 6], 'Wrong start of loss bursts')
+        self.assertEqual(list(lengths), [1, 3, 1], 'Wrong length of loss bursts')
+
+    def test_window_aggregates(self):
+        """Verifies aggregates by number of responses and by duration"""
+        array = self.array_from_times([1, None, 2, 4, None, None])
+        windows = analytics.window_aggregates(array, size=2)
+        self.assertEqual(list(windows['sent']), [2, 2, 2], 'Wrong number of responses per window')
+        self.assertEqual(list(windows['lost']), [1, 0, 2], 'Wrong number of lost responses per window')
+        self.assertEqual(list(windows['rtt_avg'][:2]), [1, 3], 'Wrong mean RTT per window')
+        self.assertEqual(list(windows['rtt_max'][:2]), [1, 4], 'Wrong max RTT per window')
+        self.assertTrue(numpy.isnan(windows['rtt_avg'][2]), 'Mean RTT of a window with no reply is not NaN')
+        windows = analytics.window_aggregates(array, seconds=3)
+        self.assertEqual(list(windows['sent']), [3, 3], 'Wrong number of responses per window of time')
+
+    def test_window_aggregates_unknown_time(self):
+        """Verifies responses with no timestamp belong to no window of time, and no response gives no window"""
+        array = self.array_from_times([1, None, 2, 4])
+        array['timestamp'][1] = numpy.nan
+        windows = analytics.window_aggregates(array, seconds=2)
+        self.assertEqual(list(windows['sent']), [1, 2], 'Response with no timestamp counted in a window')
+        self.assertEqual(list(windows['lost']), [0, 0], 'Wrong number of lost responses per window')
+        array['timestamp'] = numpy.nan
+        self.assertEqual(len(analytics.window_aggregates(array, seconds=2)['sent']), 0,
+                         'Window of responses with no timestamp')
+        for empty in (self.array_from_times([]), array[:0]):
+            for parameters in ({'size': 2}, {'seconds': 2}):
+                windows = analytics.window_aggregates(empty, **parameters)
+                self.assertTrue(all(len(values) == 0 for values in windows.values()),
+                                'Window of no response with {0}'.format(parameters))
+
+    def test_summarize(self):
+        """Verifies vectorized statistics per target match the pure Python ones"""
+        results = executor.MultiResponseList()
+        for target, times in (('a', [3, 1, 2, None]), ('b', [None, None]), ('c', [5])):
+            for response in self.array_from_times(times):
+                message = executor.Message('', icmp.ICMP(icmp.Types.EchoReply), '') if response['success'] else None
+                results.append(target, executor.Response(message, float(response['rtt'])))
+        for percentile in (0, 50, 99):
+            expected = results._summarize(percentile)
+            summaries = analytics.summarize(results.target_column, results.rtt_column, results.success_column,
+                                            len(results.targets), percentile)
+            for field, values in expected.items():
+                self.assertEqual([None if numpy.isnan(value) else value for value in summaries[field]], values,
+                                 'Wrong {0} for percentile {1}'.format(field, percentile))
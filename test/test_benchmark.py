@@ -0,0 +1,37 @@
+import unittest
+from benchmark import micro, scaling
+
+
+class MicroBenchmarkTestCase(unittest.TestCase):
+    """Tests for the microbenchmark harness"""
+
+    def test_run(self):
+        """Verifies every benchmark runs and produces a time per call for each size"""
+        results = micro.run(sizes=[1, 3], repeat=1, min_time=0)
+        self.assertEqual(set(results['results']), set(micro.BENCHMARKS), 'Not all benchmarks were run')
+        for name, sizes in results['results'].items():
+            self.assertEqual(set(sizes), {'1', '3'}, 'Wrong sizes for benchmark {0}'.format(name))
+
+    def test_compare(self):
+        """Verifies regressions are found only beyond the tolerance"""
+        baseline = {'results': {'a': {'1': 1.0, '2': 1.0}}}
+        current = {'results': {'a': {'1': 1.1, '2': 1.5}, 'b': {'1': 9.0}}}
+        self.assertEqual(micro.compare(baseline, current, 0.2), [('a', '2', 1.0, 1.5)],
+                         'Unable to find the regression')
+
+
+class ScalingBenchmarkTestCase(unittest.TestCase):
+    """Tests for the end-to-end scaling benchmark"""
+
+    def test_run(self):
+        """Verifies a small matrix runs and reports every metric"""
+        results = scaling.run(targets=[2], sizes=[8], threads=[1, 2], count=4, latency=0, timeout=0.1,
+                              in_flight=[1, 2])
+        self.assertEqual(len(results['results']), 4, 'Wrong number of scenarios')
+        for row in results['results']:
+            self.assertEqual(row['probes'], 8, 'Wrong number of probes')
+            self.assertEqual(row['total_in_flight'], row['in_flight'] * row['threads'], 'Wrong requests in flight')
+            self.assertEqual(row['lost'], 0, 'Lost probes on a perfect simulated network')
+            for metric in ('probes_per_second', 'cpu_per_probe', 'memory_per_in_flight', 'rtt_overhead'):
+                self.assertIsNotNone(row[metric], 'Missing metric {0}'.format(metric))
+            self.assertGreater(row['memory_per_in_flight'], 0, 'Memory of the requests in flight not counted')
@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+from pythonping import cache, executor, icmp, ping
+
+
+class FakeClock:
+    """Clock returning a time set by the test"""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    """Tests for ResultCache"""
+
+    @staticmethod
+    def craft_responses(success):
+        """Generates a ResponseList with one successful or timed out response"""
+        message = executor.Message('', icmp.ICMP(icmp.Types.EchoReply), '127.0.0.1') if success else None
+        return executor.ResponseList([executor.Response(message, 0.1)])
+
+    def test_cache_key(self):
+        """Verifies keys do not depend on the order of parameters"""
+        self.assertEqual(cache.cache_key('a', count=1, size=2), cache.cache_key('a', size=2, count=1),
+                         'Key depends on the order of parameters')
+        self.assertNotEqual(cache.cache_key('a', count=1), cache.cache_key('a', count=2),
+                            'Same key for different parameters')
+        key = cache.cache_key('a', payload=bytearray(b'abc'))
+        hash(key)
+        self.assertEqual(key, cache.cache_key('a', payload=memoryview(b'abc')),
+                         'Payloads with the same content have different keys')
+        self.assertEqual(key, cache.cache_key('a', payload=b'abc'), 'Payload keyed by its type')
+
+    def test_ttl(self):
+        """Verifies successful and unsuccessful results expire after their own TTL"""
+        clock = FakeClock()
+        results = cache.ResultCache(ttl=10, negative_ttl=1, clock=clock)
+        reachable, unreachable = self.craft_responses(True), self.craft_responses(False)
+        results.put('up', reachable)
+        results.put('down', unreachable)
+        self.assertIs(results.get('up'), reachable, 'Fresh result not returned')
+        self.assertIs(results.get('down'), unreachable, 'Fresh negative result not returned')
+        clock.now = 5
+        self.assertIs(results.get('up'), reachable, 'Result expired before its TTL')
+        self.assertIsNone(results.get('down'), 'Negative result not expired after its TTL')
+        clock.now = 10
+        self.assertIsNone(results.get('up'), 'Result not expired after its TTL')
+        self.assertEqual((results.stats_hits, results.stats_misses), (3, 2), 'Wrong hit and miss counts')
+        results = cache.ResultCache(ttl=10, negative_ttl=0, clock=clock)
+        results.put('down', unreachable)
+        self.assertEqual(len(results), 0, 'Negative result cached with a negative TTL of 0')
+
+    def test_max_entries(self):
+        """Verifies the least recently used result is evicted"""
+        results = cache.ResultCache(max_entries=2, clock=FakeClock())
+        for key in ('a', 'b'):
+            results.put(key, self.craft_responses(True))
+        results.get('a')
+        results.put('c', self.craft_responses(True))
+        self.assertEqual(len(results), 2, 'Cache grew beyond max entries')
+        self.assertIsNone(results.get('b'), 'Least recently used result not evicted')
+        self.assertIsNotNone(results.get('a'), 'Recently used result evicted')
+
+    def test_ping(self):
+        """Verifies ping answers repeated calls from the cache"""
+        # NOTE, this may be considered an e2e test
+        results = cache.ResultCache(ttl=60)
+        first = ping('127.0.0.1', count=1, cache=results)
+        self.assertIs(ping('127.0.0.1', count=1, cache=results), first, 'Repeated ping not answered from the cache')
+        self.assertIsNot(ping('127.0.0.1', count=2, cache=results), first, 'Cached result used for other parameters')
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Tests for SingleFlight"""
+
+    def test_run(self):
+        """Verifies concurrent calls with the same key share one run"""
+        flights = cache.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow():
+            started.set()
+            release.wait()
+            return 'result'
+
+        leader = threading.Thread(target=lambda: results.append(flights.run('key', slow)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flights.run('key', slow))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while flights.stats_shared < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 3, 'Result not shared')
+        self.assertEqual(flights.stats_runs, 1, 'Function called more than once')
+        self.assertEqual(flights.run('key', lambda: 'again'), ('again', False), 'Completed run reused')
+
+    def test_error(self):
+        """Verifies the error of a run is raised to its caller"""
+        flights = cache.SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flights.run('key', lambda: 1 / 0)
+        self.assertEqual(flights.run('key', lambda: 1), (1, False), 'Failed run not forgotten')
+
+    def test_ping(self):
+        """Verifies concurrent pings to the same target share one probe run"""
+        # NOTE, this may be considered an e2e test
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ping('127.0.0.1', count=2, interval=0.05,
+                                                                        coalesce=True)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 10, 'Not every caller got responses')
+        self.assertLess(len({id(responses) for responses in results}), 10, 'No caller shared a probe run')
@@ -0,0 +1,67 @@
+import io
+import os
+import socket
+import tempfile
+import unittest
+from pythonping import capture, executor, icmp, payload_provider, ping, simulation
+
+
+def read_pcap(data):
+    """Reads the link type and the records of a pcap file, as (timestamp, original length, packet)"""
+    _, _, _, _, _, snapshot_length, link_type = capture.FILE_HEADER.unpack_from(data)
+    offset = capture.FILE_HEADER.size
+    records = []
+    while offset < len(data):
+        seconds, microseconds, length, original_length = capture.RECORD_HEADER.unpack_from(data, offset)
+        offset += capture.RECORD_HEADER.size
+        records.append((seconds + microseconds / 1e6, original_length, data[offset:offset + length]))
+        offset += length
+    return link_type, records
+
+
+class CaptureTestCase(unittest.TestCase):
+    """Tests for Capture"""
+
+    def test_record(self):
+        """Verifies packets are buffered, written in batches and cut to the snapshot length"""
+        file = io.BytesIO()
+        packets = [bytes([index]) * 40 for index in range(10)] + [b'x' * 500]
+        with capture.Capture(file, buffer_size=200, snapshot_length=300) as recorder:
+            self.assertEqual(len(file.getvalue()), capture.FILE_HEADER.size,
+                             'Packets written before the buffer is full')
+            for index, packet in enumerate(packets):
+                recorder.record(packet, 1000 + index / 4)
+            self.assertLess(recorder.stats_writes, len(packets), 'Packets not written in batches')
+        link_type, records = read_pcap(file.getvalue())
+        self.assertEqual(link_type, capture.LINKTYPE_RAW, 'Wrong link type')
+        self.assertEqual([packet for _, _, packet in records], packets[:10] + [b'x' * 300], 'Wrong packets')
+        self.assertEqual(records[-1][1], 500, 'Original length of a cut packet not kept')
+        self.assertEqual([timestamp for timestamp, _, _ in records[:3]], [1000, 1000.25, 1000.5], 'Wrong timestamps')
+
+    def test_transport(self):
+        """Verifies requests and replies of a Communicator are recorded with an IP header"""
+        file = io.BytesIO()
+        recorder = capture.Capture(file)
+        network = simulation.Network()
+        comm = executor.Communicator('10.0.0.1', payload_provider.Repeat(b'abc', 2), 0.1, 0, seed_id=7,
+                                     transport=network.socket('10.0.0.1'), capture=recorder)
+        comm.run()
+        recorder.close()
+        _, records = read_pcap(file.getvalue())
+        self.assertEqual(len(records), 4, 'Not every packet recorded')
+        request, reply = records[0][2], records[1][2]
+        self.assertEqual(request[16:20], socket.inet_aton('10.0.0.1'), 'Wrong destination of the request')
+        self.assertEqual(icmp.ICMP.parse(request)[0], icmp.Types.EchoRequest.type_id, 'Request not recorded first')
+        self.assertEqual(icmp.ICMP.parse(reply)[0], icmp.Types.EchoReply.type_id, 'Reply not recorded')
+        self.assertEqual(request[20:], list(comm.responses)[0].source_request.packet, 'Wrong request recorded')
+
+    def test_ping(self):
+        """Verifies the packets of a ping are written to a file"""
+        # NOTE, this may be considered an e2e test
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ping.pcap')
+            with capture.Capture(path) as recorder:
+                ping('127.0.0.1', count=2, capture=recorder)
+            with open(path, 'rb') as file:
+                _, records = read_pcap(file.read())
+        self.assertGreaterEqual(len(records), 4, 'Packets of the ping not recorded')
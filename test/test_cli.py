@@ -0,0 +1,34 @@
+import io
+import unittest
+from pythonping import cli, executor, icmp
+
+
+class CliTestCase(unittest.TestCase):
+    """Tests for the command line interface"""
+
+    def test_read_targets(self):
+        """Verifies blank lines and comments are skipped"""
+        lines = io.StringIO('127.0.0.1\n\n  # comment\n::1  # inline comment\n')
+        self.assertEqual(cli.read_targets(lines), ['127.0.0.1', '::1'], 'Wrong targets read')
+
+    def test_format_result(self):
+        """Verifies results are formatted as fping does"""
+        reply = executor.Message('', icmp.ICMP(icmp.Types.EchoReply), '127.0.0.1')
+        responses = executor.ResponseList([executor.Response(reply, 0.001), executor.Response(None, 0.5),
+                                           executor.Response(reply, 0.003)])
+        self.assertEqual(cli.format_result('host', responses),
+                         'host : xmt/rcv/%loss = 3/2/33%, min/avg/max = 1.0/2.0/3.0', 'Wrong line for a target')
+        self.assertEqual(cli.format_result('host', executor.ResponseList([executor.Response(None, 0.5)])),
+                         'host : xmt/rcv/%loss = 1/0/100%', 'Wrong line for an unreachable target')
+
+    def test_run(self):
+        """Verifies every target gets a line and the exit code tells whether all replied"""
+        # NOTE, this may be considered an e2e test
+        out, err = io.StringIO(), io.StringIO()
+        exit_code = cli.run(cli.parse_arguments(['127.0.0.1', 'invalid.invalid', '-c', '2']), out, err)
+        self.assertEqual(exit_code, cli.EXIT_ERROR, 'Wrong exit code with an unresolved target')
+        self.assertTrue(out.getvalue().startswith('127.0.0.1 : xmt/rcv/%loss = 2/2/0%'), 'Wrong output')
+        self.assertIn('invalid.invalid', err.getvalue(), 'Unresolved target not reported')
+        out = io.StringIO()
+        self.assertEqual(cli.run(cli.parse_arguments(['127.0.0.1', '-u']), out), cli.EXIT_ALIVE, 'Wrong exit code')
+        self.assertEqual(out.getvalue(), '', 'Alive target printed with -u')
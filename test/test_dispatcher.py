@@ -0,0 +1,67 @@
+import socket
+import threading
+import unittest
+from pythonping import dispatcher, icmp, ping
+
+
+class DispatcherTestCase(unittest.TestCase):
+    """Tests for Dispatcher"""
+
+    def test_identify(self):
+        """Verifies replies and error messages are routed to the identifier of the request"""
+        ipv4 = dispatcher.Dispatcher(socket.AF_INET)
+        ip_header = b'\x45' + bytes(19)
+        reply = icmp.ICMP(icmp.Types.EchoReply, identifier=42).packet
+        self.assertEqual(ipv4.identify(ip_header + reply), 42, 'Failed to identify an echo reply')
+        request = icmp.ICMP(icmp.Types.EchoRequest, identifier=43).packet
+        error = icmp.ICMP(icmp.Types.TimeExceeded, payload=ip_header + request[:8], identifier=0).packet
+        self.assertEqual(ipv4.identify(ip_header + error), 43, 'Failed to identify the request quoted by an error')
+        self.assertIsNone(ipv4.identify(b'\x45'), 'Identified a truncated packet')
+        ipv6 = dispatcher.Dispatcher(socket.AF_INET6)
+        self.assertEqual(ipv6.identify(icmp.ICMPv6(icmp.TypesV6.EchoReply, identifier=44).packet), 44,
+                         'Failed to identify an ICMPv6 echo reply')
+
+    def test_concurrent_pings(self):
+        """Verifies concurrent pings share one socket and each gets its own replies"""
+        # NOTE, this may be considered an e2e test
+        results = []
+
+        def run():
+            results.append(ping('127.0.0.1', count=3, timeout=1, dispatch=True))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([responses.stats_packets_returned for responses in results], [3] * 8,
+                         'Not every thread received its replies')
+        shared = dispatcher.DISPATCHERS[socket.AF_INET]
+        self.assertGreaterEqual(shared.stats_dispatched, 24, 'Replies not routed by the dispatcher')
+
+    def test_send_buffer_full(self):
+        """Verifies a request is sent once the send buffer of the shared socket has room again"""
+        class FullSocket:
+            """Socket whose send buffer is full for the first attempts"""
+            def __init__(self):
+                self.writable, self.peer = socket.socketpair()
+                self.attempts = 0
+                self.sent = []
+
+            def fileno(self):
+                return self.writable.fileno()
+
+            def sendto(self, packet, address):
+                self.attempts += 1
+                if self.attempts < 3:
+                    raise BlockingIOError()
+                self.sent.append((packet, address))
+
+        shared = dispatcher.Dispatcher(socket.AF_INET)
+        shared.socket = full = FullSocket()
+        try:
+            shared.send(b'request', '127.0.0.1')
+        finally:
+            full.writable.close()
+            full.peer.close()
+        self.assertEqual(full.sent, [(b'request', ('127.0.0.1', 0))], 'Request not sent after the buffer had room')
@@ -1,7 +1,10 @@
 import collections
+import threading
 import unittest
 from pythonping import executor
 from pythonping import icmp
+from pythonping import payload_provider
+from pythonping import simulation
 
 
 class SuccessfulResponseMock(executor.Response):
@@ -62,8 +65,51 @@ class ResponseTestCase(unittest.TestCase):
                          'Unable to classify a Network Unreachable error correctly')
         self.assertEqual(executor.Response(None, 0.1).error_message, 'No response',
                          'Unable to generate correct message when response is not received')
+        reply = executor.Message('', icmp.ICMPv6(icmp.TypesV6.EchoReply), '::1')
+        self.assertEqual(executor.Response(reply, 0.1).error_message, None,
+                         'Generated error message when ICMPv6 response was correct')
+        too_big = executor.Message('', icmp.ICMPv6(icmp.TypesV6.PacketTooBig), '::1')
+        self.assertEqual(executor.Response(too_big, 0.1).error_message, 'Packet Too Big',
+                         'Unable to classify an ICMPv6 Packet Too Big error correctly')
         pass
 
+    def test_from_raw(self):
+        """Verifies a response read from a socket is decoded only when its message is accessed"""
+        reply = icmp.ICMP(icmp.Types.EchoReply, payload=b'abc', identifier=1, sequence_number=2)
+        raw = bytes(20) + reply.packet
+        response = executor.Response.from_raw(raw, icmp.ICMP, reply.message_type, reply.message_code, '10.0.0.1', 0.1)
+        self.assertEqual(response.status, executor.Status.Ok, 'Wrong status of an echo reply')
+        self.assertTrue(response.success, 'Unable to validate a successful raw response')
+        self.assertIsNone(response._message, 'Message decoded before being accessed')
+        self.assertEqual(response.message.packet.sequence_number, 2, 'Wrong sequence number of the decoded message')
+        self.assertEqual(response.message.source, '10.0.0.1', 'Wrong source of the decoded message')
+        self.assertFalse(hasattr(response, '__dict__'), 'Response does not use slots')
+
+    def test_set_message(self):
+        """Verifies the message can be replaced until the response is appended to a list, and the status follows it"""
+        response = executor.Response(None, 0.1)
+        reply = executor.Message('', icmp.ICMP(icmp.Types.EchoReply), '127.0.0.1')
+        response.message = reply
+        self.assertIs(response.message, reply, 'Message not replaced')
+        self.assertTrue(response.success, 'Status not updated to the new message')
+        self.assertEqual(response.source, '127.0.0.1', 'Source not updated to the new message')
+        response.message = None
+        self.assertEqual(response.status, executor.Status.Timeout, 'Status not updated once the message is removed')
+        responses = executor.ResponseList([response])
+        with self.assertRaises(AttributeError):
+            response.message = reply
+        self.assertFalse(responses.success(), 'Response counted by the list changed')
+
+    def test_status(self):
+        """Verifies the status is found from the type of the reply"""
+        self.assertEqual(executor.Response(None, 0.1).status, executor.Status.Timeout, 'Wrong status of a timeout')
+        self.assertEqual(self.craft_response_of_type(icmp.Types.TimeExceeded).status, executor.Status.TimeExceeded,
+                         'Wrong status of Time Exceeded')
+        self.assertEqual(self.craft_response_of_type(icmp.Types.Redirect).status, executor.Status.Error,
+                         'Wrong status of an unexpected type')
+        self.assertEqual(self.craft_response_of_type((3, 42)).error_message, 'Unreachable',
+                         'Wrong error message of an unknown unreachable code')
+
     def time_elapsed(self):
         """Verifies the time elapsed is presented correctly"""
         self.assertEqual(executor.Response(None, 1).time_elapsed_ms, 1000, 'Bad ms representation for 1 second')
@@ -306,6 +352,109 @@ class ResponseListTestCase(unittest.TestCase):
             "Unable to calculate packet loss correctly when failing responses are mixed with successful responses"
         )
 
+    def test_loss_report(self):
+        """Verifies lost packets are split between kernel drops and network loss"""
+        rs = executor.ResponseList([SuccessfulResponseMock(None, 1)] + [FailingResponseMock(None, 1)] * 3)
+        self.assertIsNone(rs.stats_network_lost, 'Network loss known without kernel drops')
+        self.assertIn('kernel drops unknown', rs.loss_report(), 'Report does not tell kernel drops are unknown')
+        rs.stats_kernel_drops = 1
+        self.assertEqual(rs.stats_network_lost, 2, 'Wrong number of packets lost in the network')
+        self.assertIn('1 dropped by the kernel', repr(rs), 'Kernel drops not reported')
+
+    def test_decided(self):
+        """Verifies the outcome is known as soon as the remaining responses cannot change it"""
+        ok, ko = SuccessfulResponseMock(None, 1), FailingResponseMock(None, 1)
+        rs = executor.ResponseList([ko, ok])
+        self.assertTrue(rs.decided(executor.SuccessOn.One), 'Unable to decide success on one after a success')
+        self.assertFalse(rs.decided(executor.SuccessOn.All), 'Unable to decide failure on all after a failure')
+        self.assertIsNone(rs.decided(executor.SuccessOn.Most, 4), 'Decided success on most too early')
+        self.assertIsNone(rs.decided(executor.SuccessOn.Most), 'Decided success on most without knowing the total')
+        rs.append(ok)
+        rs.append(ok)
+        self.assertTrue(rs.decided(executor.SuccessOn.Most, 5), 'Unable to decide success on most with 3 out of 5')
+        rs = executor.ResponseList([ko, ko])
+        self.assertIsNone(rs.decided(executor.SuccessOn.One, 4), 'Decided failure on one too early')
+        self.assertFalse(rs.decided(executor.SuccessOn.Most, 4), 'Unable to decide failure on most with 2 lost out of 4')
+        self.assertFalse(rs.decided(executor.SuccessOn.One, 2), 'Unable to decide failure on one when all are lost')
+        self.assertTrue(executor.ResponseList([ok, ok]).decided(executor.SuccessOn.All, 2),
+                        'Unable to decide success on all when all are successful')
+
+
+class MultiResponseListTestCase(unittest.TestCase):
+    """Tests for MultiResponseList"""
+
+    @staticmethod
+    def craft_results():
+        """Generates results of three targets: one always replying, one losing half, one never replying"""
+        ok = [SuccessfulResponseMock(None, rtt) for rtt in (1, 2, 3, 4)]
+        return executor.MultiResponseList({
+            'a': ok,
+            'b': [ok[3], FailingResponseMock(None, 2), ok[1], FailingResponseMock(None, 2)],
+            'c': [FailingResponseMock(None, 2)] * 2
+        })
+
+    def test_columns(self):
+        """Verifies responses of every target share the same columns"""
+        results = self.craft_results()
+        self.assertEqual(len(results), 10, 'Wrong number of responses')
+        self.assertEqual(results.targets, ['a', 'b', 'c'], 'Wrong targets')
+        self.assertEqual(list(results.target_column), [0] * 4 + [1] * 4 + [2] * 2, 'Wrong target column')
+        self.assertEqual(list(results.error_column), [-1] * 10, 'Wrong error column for responses with no message')
+
+    def test_summaries(self):
+        """Verifies statistics of each target, without NumPy"""
+        summaries = self.craft_results()._summarize(50)
+        self.assertEqual(summaries['sent'], [4, 4, 2], 'Wrong number of responses per target')
+        self.assertEqual(summaries['loss_ratio'], [0, 0.5, 1], 'Wrong loss ratio per target')
+        self.assertEqual(summaries['rtt_min'], [1, 2, None], 'Wrong min RTT per target')
+        self.assertEqual(summaries['rtt_avg'], [2.5, 3, None], 'Wrong mean RTT per target')
+        self.assertEqual(summaries['rtt_percentile'], [2, 2, None], 'Wrong RTT percentile per target')
+        self.assertEqual(self.craft_results().summaries(50), dict(summaries, target=['a', 'b', 'c']),
+                         'Statistics differ with NumPy')
+
+    def test_queries(self):
+        """Verifies targets can be filtered and ranked by any statistic"""
+        results = self.craft_results()
+        self.assertEqual(results.filter('loss_ratio', above=0.05), ['b', 'c'], 'Wrong targets with loss')
+        self.assertEqual(results.filter('rtt_max', below=4), [], 'Wrong targets with low max RTT')
+        self.assertEqual([target for target, _ in results.worst(3, 'rtt_avg')], ['b', 'a', 'c'],
+                         'Wrong ranking of targets by mean RTT')
+        self.assertEqual(results.summary('a')['returned'], 4, 'Wrong summary of one target')
+
+
+class RttEstimatorTestCase(unittest.TestCase):
+    """Tests for RttEstimator"""
+
+    def test_update(self):
+        """Verifies the timeout follows the smoothed RTT and variation"""
+        estimator = executor.RttEstimator(floor=0.001, ceiling=2)
+        self.assertEqual(estimator.timeout, 2, 'Timeout before the first sample is not the ceiling')
+        estimator.update(0.1)
+        self.assertAlmostEqual(estimator.timeout, 0.3, msg='Wrong timeout after the first sample')
+        estimator.update(0.1)
+        self.assertAlmostEqual(estimator.srtt, 0.1, msg='Wrong smoothed RTT')
+        self.assertAlmostEqual(estimator.rttvar, 0.0375, msg='Wrong RTT variation')
+        self.assertAlmostEqual(estimator.timeout, 0.25, msg='Wrong timeout after the second sample')
+
+    def test_clamp(self):
+        """Verifies the timeout stays between floor and ceiling"""
+        estimator = executor.RttEstimator(floor=0.05, ceiling=1)
+        estimator.update(0.0001)
+        self.assertEqual(estimator.timeout, 0.05, 'Timeout below the floor')
+        for _ in range(10):
+            estimator.backoff()
+        self.assertEqual(estimator.timeout, 1, 'Timeout above the ceiling')
+
+    def test_set_ceiling(self):
+        """Verifies a new ceiling applies at once and keeps the samples"""
+        estimator = executor.RttEstimator(floor=0.001, ceiling=0.3)
+        estimator.set_ceiling(5)
+        self.assertEqual(estimator.timeout, 5, 'Timeout before the first sample is not the new ceiling')
+        estimator.update(0.1)
+        estimator.set_ceiling(0.2)
+        self.assertEqual(estimator.timeout, 0.2, 'Timeout above the new ceiling')
+        self.assertAlmostEqual(estimator.srtt, 0.1, msg='Samples lost with a new ceiling')
+
 
 class CommunicatorTestCase(unittest.TestCase):
     """Tests for Communicator"""
@@ -318,3 +467,160 @@ class CommunicatorTestCase(unittest.TestCase):
                          'Not returned to 1 when exceeding sequence number maximum length')
         self.assertEqual(executor.Communicator.increase_seq(0xFFFE), 0xFFFF,
                          'Increasing sequence number 0xFFFE did not return 0xFFFF')
+
+    def test_stop_on(self):
+        """Verifies the run stops as soon as the outcome is known"""
+        network = simulation.Network()
+        comm = executor.Communicator('10.0.0.1', payload_provider.Repeat(b'a', 4), 0.05, 0, seed_id=1,
+                                     transport=network.socket('10.0.0.1'))
+        comm.run(stop_on=executor.SuccessOn.One)
+        self.assertEqual(len(comm.responses), 1, 'Did not stop at the first reply')
+        comm.run(stop_on=executor.SuccessOn.Most)
+        self.assertEqual(len(comm.responses), 3, 'Did not stop once most replies arrived')
+        network.loss = 1
+        comm.run(stop_on=executor.SuccessOn.Most)
+        self.assertEqual(len(comm.responses), 2, 'Did not stop once most requests were lost')
+        self.assertFalse(comm.responses.success(executor.SuccessOn.Most), 'Wrong outcome after stopping')
+
+    def test_stop_event(self):
+        """Verifies the run stops after the ping in progress once the event is set"""
+        stop_event = threading.Event()
+        stop_event.set()
+        comm = executor.Communicator('10.0.0.1', payload_provider.Repeat(b'a', 4), 0.05, 0, seed_id=1,
+                                     transport=simulation.Network().socket('10.0.0.1'))
+        comm.run(stop_event=stop_event)
+        self.assertEqual(len(comm.responses), 1, 'Did not stop once the event was set')
+
+    def test_adaptive_timeout(self):
+        """Verifies lost requests on a fast path time out quickly with an RTT estimator"""
+        network = simulation.Network(latency=0.001)
+        estimator = executor.RttEstimator(floor=0.005, ceiling=2)
+        comm = executor.Communicator('10.0.0.1', payload_provider.Repeat(b'a', 4), 2, 0, seed_id=1,
+                                     transport=network.socket('10.0.0.1'), rtt_estimator=estimator)
+        comm.run()
+        self.assertLess(estimator.timeout, 0.1, 'Timeout did not adapt to a fast path')
+        network.loss = 1
+        comm.run()
+        self.assertLess(comm.responses.rtt_max, 1, 'Lost request waited the full timeout')
+
+    def test_timestamp_payload(self):
+        """Verifies late replies get their own round trip time with timestamped payloads"""
+        network = simulation.Network(latency=0.03)
+        comm = executor.Communicator('10.0.0.1', payload_provider.Timestamp(3), 0.02, 0, seed_id=1,
+                                     transport=network.socket('10.0.0.1'))
+        comm.run()
+        late = [response for response in comm.responses if response.success]
+        self.assertTrue(late, 'No late reply received')
+        self.assertTrue(all(response.time_elapsed >= 0.03 for response in late),
+                        'Round trip time of a late reply measured from the request it was matched with')
+
+
+class TracerouteTestCase(unittest.TestCase):
+    """Tests for Traceroute"""
+
+    def test_run(self):
+        """Verifies one response per hop is returned, ending with the target"""
+        network = simulation.Network(latency=0.001, hops=3)
+        comm = executor.Traceroute('10.0.0.1', 0.5, max_hops=10, seed_id=1, transport=network.socket('10.0.0.1'))
+        comm.run()
+        hops = list(comm.responses)
+        self.assertEqual(len(hops), 4, 'Wrong number of hops')
+        for ttl, hop in enumerate(hops[:3], 1):
+            self.assertEqual(hop.message.source, network.router_address(ttl), 'Wrong router at hop {0}'.format(ttl))
+            self.assertEqual(hop.error_message, 'TTL Expired in Transit', 'Wrong error at hop {0}'.format(ttl))
+        self.assertTrue(hops[3].success, 'Target not reached')
+        self.assertEqual(hops[3].message.source, '10.0.0.1', 'Last hop is not the target')
+
+    def test_lost_hop(self):
+        """Verifies hops that do not answer time out"""
+        network = simulation.Network(loss=1, hops=3)
+        comm = executor.Traceroute('10.0.0.1', 0.05, max_hops=5, seed_id=1, transport=network.socket('10.0.0.1'))
+        comm.run()
+        self.assertEqual(len(comm.responses), 5, 'Not all hops are reported when the target is not reached')
+        self.assertFalse(comm.responses.success(), 'Lost hops reported as successful')
+
+
+class MtuDiscoveryTestCase(unittest.TestCase):
+    """Tests for MtuDiscovery"""
+
+    @staticmethod
+    def discover(network, low=68, high=1500):
+        """Runs an MTU discovery over a simulated network and returns it"""
+        comm = executor.MtuDiscovery('10.0.0.1', 0.05, low, high, seed_id=1, transport=network.socket('10.0.0.1'))
+        comm.run()
+        return comm
+
+    def test_no_bottleneck(self):
+        """Verifies a path accepting the largest size is found with one probe"""
+        comm = self.discover(simulation.Network())
+        self.assertEqual(comm.mtu, 1500, 'Wrong MTU without bottleneck')
+        self.assertEqual(len(comm.responses), 1, 'More than one probe without bottleneck')
+
+    def test_reported_mtu(self):
+        """Verifies the MTU reported by routers is probed directly"""
+        comm = self.discover(simulation.Network(mtu=1400, hops=2))
+        self.assertEqual(comm.mtu, 1400, 'Wrong MTU with a router reporting it')
+        self.assertEqual(len(comm.responses), 2, 'Reported MTU not probed directly')
+        self.assertEqual(list(comm.responses)[0].error_message, 'Fragmentation Required',
+                         'Fragmentation Required not reported')
+
+    def test_no_reply(self):
+        """Verifies no MTU is found, in a logarithmic number of probes, when nothing gets a reply"""
+        comm = self.discover(simulation.Network(loss=1))
+        self.assertIsNone(comm.mtu, 'Found an MTU on a network losing everything')
+        self.assertLessEqual(len(comm.responses), 12, 'Too many probes for a binary search')
+
+
+class FloodTestCase(unittest.TestCase):
+    """Tests for Flood"""
+
+    def test_run(self):
+        """Verifies every request is sent and replies are matched concurrently"""
+        network = simulation.Network(latency=0.001, loss=0.1, duplicate=0.05, seed=5)
+        flood = executor.Flood('10.0.0.1', 500, b'flood', timeout=0.2, batch=32, transport=network.socket('10.0.0.1'))
+        flood.run()
+        summary = flood.summary()
+        self.assertEqual(summary['sent'], 500, 'Not every request was sent')
+        self.assertEqual(summary['received'], 500 - network.stats_lost, 'Wrong number of replies received')
+        self.assertEqual(summary['duplicates'], network.stats_duplicated, 'Wrong number of duplicates')
+        self.assertAlmostEqual(summary['loss_ratio'], network.stats_lost / 500, msg='Wrong loss ratio')
+        self.assertGreaterEqual(summary['rtt_p50'], 0.001, 'Round trip time shorter than the latency')
+        self.assertIn('500 sent', flood.report(), 'Report does not mention the requests sent')
+
+    def test_rate(self):
+        """Verifies the rate limits how fast requests are sent"""
+        network = simulation.Network()
+        flood = executor.Flood('10.0.0.1', 100, timeout=0.1, rate=1000, batch=10, transport=network.socket('10.0.0.1'))
+        flood.run()
+        self.assertGreaterEqual(flood.duration, 0.09, 'Requests sent faster than the rate')
+
+    def test_window(self):
+        """Verifies no more requests than the window wait for a reply, and losses do not stall sending"""
+        network = simulation.Network(latency=0.01)
+        flood = executor.Flood('10.0.0.1', 40, timeout=0.5, batch=64, window=10, transport=network.socket('10.0.0.1'))
+        flood.run()
+        self.assertEqual(flood.stats_received, 40, 'Not every reply received')
+        self.assertGreaterEqual(flood.duration, 0.03, 'More requests than the window waited for a reply')
+        network.loss = 1
+        flood = executor.Flood('10.0.0.1', 20, timeout=0.05, window=10, transport=network.socket('10.0.0.1'))
+        flood.run()
+        self.assertEqual(flood.stats_sent, 20, 'Sending stalled by lost requests')
+
+    def test_window_given_up(self):
+        """Verifies late replies to requests given up on are not matched"""
+        network = simulation.Network(latency=0.08)
+        flood = executor.Flood('10.0.0.1', 4, timeout=0.05, window=2, transport=network.socket('10.0.0.1'))
+        flood.run()
+        self.assertEqual(flood.stats_sent, 4, 'Not every request was sent')
+        self.assertEqual(flood.stats_duplicates, 2, 'Late replies not counted as duplicates')
+        # Replies to the last requests may still be matched, with the right round trip time
+        self.assertTrue(all(rtt < 0.12 for rtt in flood.rtts), 'Late reply matched to a request given up on')
+
+    def test_sequence_numbers(self):
+        """Verifies a sequence number is never reused by a request while the earlier one waits for its reply"""
+        transport = simulation.Network().socket('10.0.0.1')
+        self.assertEqual(executor.Flood('10.0.0.1', 0x10000, transport=transport).window, 0xFFFF,
+                         'Requests beyond the sequence numbers sent with no window')
+        self.assertIsNone(executor.Flood('10.0.0.1', 0xFFFF, transport=transport).window, 'Window of a short flood')
+        with self.assertRaises(ValueError):
+            executor.Flood('10.0.0.1', 10, window=0x10000, transport=transport)
@@ -95,6 +95,28 @@ class ICMPTestCase(unittest.TestCase):
         packet = icmp.ICMP.generate_from_raw(ip_header_offset + b'\x08\x00\x9c\xd0X1\x01\x00random text does here')
         self.assertNotEqual(packet.received_checksum, packet.expected_checksum, 'Checksum validation failed')
 
+    def test_quoted(self):
+        """Verifies the header of the original packet is extracted from error messages"""
+        ip_header_offset = b''.join([b'0' for _ in range(20)])
+        request = icmp.ICMP(icmp.Types.EchoRequest, payload='banana', identifier=19700, sequence_number=5).packet
+        quote = b'\x45' + bytes(19) + request[:8]
+        packet = icmp.ICMP.generate_from_raw(ip_header_offset + icmp.ICMP(icmp.Types.TimeExceeded, payload=quote).packet)
+        self.assertEqual(packet.quoted.message_type, icmp.Types.EchoRequest.type_id, 'Failed to extract quoted type')
+        self.assertEqual(packet.quoted.id, 19700, 'Failed to extract quoted id')
+        self.assertEqual(packet.quoted.sequence_number, 5, 'Failed to extract quoted sequence number')
+        packet = icmp.ICMP.generate_from_raw(ip_header_offset + request)
+        self.assertIsNone(packet.quoted, 'Found a quote in a packet that is not an error message')
+
+    def test_next_hop_mtu(self):
+        """Verifies the next-hop MTU is read from Fragmentation Required messages only"""
+        ip_header_offset = b''.join([b'0' for _ in range(20)])
+        packet = icmp.ICMP.generate_from_raw(ip_header_offset + b'\x03\x04\x00\x00\x00\x00\x05\x78')
+        self.assertEqual(packet.next_hop_mtu, 1400, 'Failed to extract next-hop MTU')
+        packet = icmp.ICMP.generate_from_raw(ip_header_offset + b'\x03\x01\x00\x00\x00\x00\x05\x78')
+        self.assertIsNone(packet.next_hop_mtu, 'Extracted next-hop MTU from Host Unreachable')
+        packet = icmp.ICMPv6.generate_from_raw(b'\x02\x00\x00\x00\x00\x00\x05\x00')
+        self.assertEqual(packet.next_hop_mtu, 1280, 'Failed to extract next-hop MTU from Packet Too Big')
+
     def test_checksum_creation(self):
         """Verifies it generates the correct checksum, given packet data"""
         packet = icmp.ICMP(icmp.Types.EchoRequest, payload='random text goes here', identifier=16)
@@ -110,3 +132,42 @@ class ICMPTestCase(unittest.TestCase):
         packet = icmp.ICMP(icmp.Types.EchoReply, payload='foo', identifier=11)
         self.assertEqual(packet._header(), b'\x00\x00\x00\x00\x0b\x00\x01\x00',
                          'Blank header creation failed (without checksum)')
+
+    def test_cached_packet(self):
+        """Verifies the serialized packet is reused until a field changes"""
+        packet = icmp.ICMP(icmp.Types.EchoRequest, payload='foo', identifier=11)
+        self.assertIs(packet.packet, packet.packet, 'Packet serialized again without changes')
+        self.assertEqual(packet.raw, packet.packet, 'Raw packet differs from the serialized packet')
+        packet.sequence_number = 2
+        self.assertEqual(packet.packet, icmp.ICMP(icmp.Types.EchoRequest, payload='foo', identifier=11,
+                                                  sequence_number=2).packet, 'Packet not updated after a change')
+        self.assertFalse(hasattr(packet, '__dict__'), 'ICMP does not use slots')
+        self.assertFalse(hasattr(icmp.ICMPv6(), '__dict__'), 'ICMPv6 does not use slots')
+
+    def test_parse(self):
+        """Verifies the header fields are read without creating a packet"""
+        raw = b''.join([b'0' for _ in range(20)]) + b'\x00\x00\xbe\xdb\x01\x00\x01\x00banana'
+        self.assertEqual(icmp.ICMP.parse(raw), (0, 0, 56254, 1, 1), 'Failed to parse header fields')
+        self.assertEqual(icmp.ICMP.parse(memoryview(raw), 20), icmp.ICMP.parse(raw), 'Failed to parse a memoryview')
+        self.assertEqual(icmp.ICMPv6.parse(raw[20:]), (0, 0, 56254, 1, 1), 'Failed to parse ICMPv6 header fields')
+
+
+class ICMPv6TestCase(unittest.TestCase):
+    """Tests for the ICMPv6 class"""
+
+    def test_pack(self):
+        """Verifies the checksum is left to the kernel"""
+        self.assertEqual(
+            icmp.ICMPv6(icmp.TypesV6.EchoRequest, payload='banana', identifier=19700).packet,
+            b'\x80\x00\x00\x00\xf4L\x01\x00banana',
+            "Fail to pack ICMPv6 structure to packet"
+        )
+
+    def test_unpack(self):
+        """Verifies that reads data correctly from a packet without IP header"""
+        packet = icmp.ICMPv6.generate_from_raw(b'\x81\x00\xbe\xdb\x01\x00\x02\x00banana')
+        self.assertEqual(packet.message_type, icmp.TypesV6.EchoReply.type_id, 'Failed to extract message type')
+        self.assertEqual(packet.id, 1, 'Failed to extract id')
+        self.assertEqual(packet.sequence_number, 2, 'Failed to extract sequence number')
+        self.assertEqual(packet.payload, b'banana', 'Failed to extract payload')
+        self.assertTrue(packet.is_valid, 'Checksum verified by the kernel considered invalid')
@@ -1,4 +1,6 @@
 import unittest
+from unittest import mock
+from pythonping import icmp, network
 from pythonping.network import Socket
 
 class UtilsTestCase(unittest.TestCase):
@@ -9,4 +11,58 @@ class UtilsTestCase(unittest.TestCase):
     def test_raise_explicative_error_on_name_resolution_failure(self):
         """Test a runtime error is generated if the name cannot be resolved"""
         with self.assertRaises(RuntimeError):
-            Socket('invalid', 'raw')
\ No newline at end of file
+            Socket('invalid', 'raw')
+
+    def test_resolve(self):
+        """Test addresses are resolved with their family"""
+        self.assertEqual(network.resolve('127.0.0.1'), [('ipv4', '127.0.0.1')], 'Unable to resolve an IPv4 address')
+        self.assertEqual(network.resolve('::1'), [('ipv6', '::1')], 'Unable to resolve an IPv6 address')
+        with self.assertRaises(RuntimeError):
+            network.resolve('::1', 'ipv4')
+        with self.assertRaises(RuntimeError):
+            network.resolve('invalid')
+
+    def test_kernel_drops(self):
+        """Test packets dropped by the kernel as the receive buffer is full are counted"""
+        # NOTE, this may be considered an e2e test
+        sock = Socket('127.0.0.1', 'icmp', receive_buffer=1)
+        self.assertEqual(sock.kernel_drops, 0, 'Drop counter not enabled')
+        for sequence_number in range(100):
+            sock.send(icmp.ICMP(icmp.Types.EchoRequest, payload=bytes(500), sequence_number=sequence_number).packet)
+        while sock.receive(0.1)[0]:
+            pass
+        # The kernel reports the drops with the next packet queued
+        sock.send(icmp.ICMP(icmp.Types.EchoRequest, sequence_number=100).packet)
+        while sock.receive(0.1)[0]:
+            pass
+        self.assertGreater(sock.kernel_drops, 0, 'Kernel drops not counted')
+
+    def test_drop_counter_unsupported(self):
+        """Verifies no socket option is set where the drop counter option is unknown"""
+        class RecordingSocket:
+            """Socket recording the options set"""
+            def __init__(self):
+                self.options = []
+
+            def setsockopt(self, *option):
+                self.options.append(option)
+
+        recording = RecordingSocket()
+        with mock.patch.object(network, 'SO_RXQ_OVFL', None):
+            self.assertFalse(network.enable_drop_counter(recording), 'Drop counter enabled with no option')
+        self.assertEqual(recording.options, [], 'Socket option set with no drop counter option')
+
+    def test_send_batch(self):
+        """Test a batch of packets is sent at once"""
+        # NOTE, this may be considered an e2e test
+        sock = Socket('127.0.0.1', 'icmp')
+        packets = [icmp.ICMP(icmp.Types.EchoRequest, identifier=4321, sequence_number=sequence_number).packet
+                   for sequence_number in range(10)]
+        self.assertEqual(sock.send_batch(packets), 10, 'Not every packet of the batch was sent')
+        replies = 0
+        packet = sock.receive(0.5)[0]
+        while packet:
+            message_type, _, _, identifier, _ = icmp.ICMP.parse(packet)
+            replies += identifier == 4321 and message_type == icmp.Types.EchoReply.type_id
+            packet = sock.receive(0.5)[0]
+        self.assertEqual(replies, 10, 'Not every packet of the batch got a reply')
@@ -67,3 +67,48 @@ class PayloadProviderTestCase(unittest.TestCase):
         """Verifies that it is not possible to generate a payload with an empty pattern"""
         with self.assertRaises(ValueError):
             payload_provider.Sweep(b'', 1, 10)
+
+    def test_sweep_content(self):
+        """Verifies that a sweep provider repeats the pattern without copying it for each payload"""
+        payloads = list(payload_provider.Sweep('abc', 1, 7))
+        self.assertEqual([bytes(payload) for payload in payloads],
+                         [b'a', b'ab', b'abc', b'abca', b'abcab', b'abcabc', b'abcabca'],
+                         'Pattern not repeated correctly')
+        self.assertTrue(all(payload.obj is payloads[0].obj for payload in payloads),
+                        'Payloads do not share the same buffer')
+        self.assertEqual(payload_provider.Sweep('abc', 1, 7).pattern, 'abcabcabc', 'Pattern not extended to fit')
+        self.assertEqual(payload_provider.Sweep(b'abc', 1, 2).pattern, b'abc', 'Pattern changed when long enough')
+
+    def test_repeat_encodes_text(self):
+        """Verifies that a repeat provider encodes a text pattern once"""
+        provider = payload_provider.Repeat('text', 2)
+        self.assertEqual(list(provider), [b'text', b'text'], 'Text pattern not encoded')
+
+    def test_len(self):
+        """Verifies that providers know how many payloads they generate"""
+        self.assertEqual(len(payload_provider.List([b'a', b'b'])), 2, 'Wrong length of list provider')
+        self.assertEqual(len(payload_provider.Repeat(b'a', 5)), 5, 'Wrong length of repeat provider')
+        self.assertEqual(len(payload_provider.Sweep(b'a', 10, 20)), 11, 'Wrong length of sweep provider')
+
+    def test_timestamp(self):
+        """Verifies that the round trip time is computed from a timestamped payload"""
+        now = [10.0]
+        provider = payload_provider.Timestamp(3, size=32, clock=lambda: now[0])
+        payloads = list(provider)
+        self.assertEqual(len(payloads), 3, 'Wrong number of timestamped payloads')
+        self.assertTrue(all(len(payload) == 32 for payload in payloads), 'Wrong size of timestamped payloads')
+        now[0] = 10.25
+        self.assertEqual(provider.rtt(payloads[0]), 0.25, 'Wrong round trip time')
+        self.assertEqual(provider.rtt(payloads[0], 11), 1, 'Wrong round trip time at a given reception time')
+        self.assertEqual(len(next(iter(payload_provider.Timestamp(1, size=1)))), 16,
+                         'Timestamped payload smaller than its header')
+
+    def test_timestamp_cookie(self):
+        """Verifies that payloads which were not generated by the provider have no round trip time"""
+        provider = payload_provider.Timestamp(1)
+        payload = next(iter(provider))
+        tampered = bytearray(payload)
+        tampered[0] ^= 1
+        self.assertIsNone(provider.rtt(bytes(tampered)), 'Tampered timestamp accepted')
+        self.assertIsNone(provider.rtt(payload[:12]), 'Truncated payload accepted')
+        self.assertIsNone(payload_provider.Timestamp(1).rtt(payload), 'Payload of another key accepted')
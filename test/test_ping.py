@@ -1,6 +1,9 @@
+import collections
 import unittest
 import os
-from pythonping import ping
+from unittest import mock
+import pythonping
+from pythonping import discover_mtu, executor, network, ping
 
 
 class PingCase(unittest.TestCase):
@@ -20,3 +23,95 @@ class PingCase(unittest.TestCase):
             self.assertEqual(ping('8.8.8.8', count=4, size=992, match=True).success(), False,
                              'Sent 4 large pings to google DNS A with payload match on,'
                              + 'expected all to fail since they truncate large payloads')
+
+
+class PackageTestCase(unittest.TestCase):
+    """Tests for the names exported by the package"""
+
+    def test_all(self):
+        """Verifies every name exported by the package can be imported"""
+        for name in pythonping.__all__:
+            self.assertIsNotNone(getattr(pythonping, name), 'Unable to import {0}'.format(name))
+        names = {}
+        exec('from pythonping import *', names)
+        self.assertEqual(names['executor'].SuccessOn, pythonping.SuccessOn, 'Modules of the package not exported')
+
+
+class MtuCacheTestCase(unittest.TestCase):
+    """Tests for the path MTUs kept by discover_mtu"""
+
+    def test_eviction(self):
+        """Verifies the MTUs of the targets probed least recently are evicted"""
+        # NOTE, this may be considered an e2e test
+        with mock.patch.object(pythonping, 'MTU_CACHE', collections.OrderedDict()), \
+                mock.patch.object(pythonping, 'MAX_MTU_CACHE', 2):
+            for target in ('127.0.0.1', '127.0.0.2', '127.0.0.1', '127.0.0.3'):
+                self.assertEqual(discover_mtu(target, timeout=0.5), 1500, 'Wrong MTU of the loopback')
+            self.assertEqual(list(pythonping.MTU_CACHE), [('127.0.0.1', None), ('127.0.0.3', None)],
+                             'Wrong MTUs evicted')
+
+
+class DualStackTestCase(unittest.TestCase):
+    """Tests for pinging every address family of a target"""
+
+    @staticmethod
+    def resolve_to(addresses):
+        """Makes the resolver return addresses for the target dual.test"""
+        resolve = network.resolve
+
+        def fake_resolve(destination, family=None):
+            if destination == 'dual.test':
+                return addresses
+            return resolve(destination, family)
+
+        return mock.patch.object(network, 'resolve', fake_resolve)
+
+    def test_family_failing(self):
+        """Verifies a family failing does not hide the responses of the other one"""
+        # NOTE, this may be considered an e2e test
+        with self.resolve_to([('ipv6', 'invalid::address'), ('ipv4', '127.0.0.1')]):
+            responses = ping('dual.test', count=1, family='dual')
+        self.assertTrue(responses.success(), 'Responses of the working family not returned')
+
+    def test_first_address_of_each_family(self):
+        """Verifies one address of each family is pinged, and the slower family is asked to stop"""
+        calls = []
+
+        def fake_ping(target, family=None, stop_event=None, **kwargs):
+            calls.append((family, target, stop_event))
+            return executor.ResponseList()
+
+        with self.resolve_to([('ipv4', '10.0.0.1'), ('ipv6', '::1'), ('ipv4', '10.0.0.2'), ('ipv6', '::2')]), \
+                mock.patch.object(pythonping, 'ping', fake_ping):
+            pythonping._ping_dual_stack('dual.test', count=1)
+        self.assertEqual(sorted((family, target) for family, target, _ in calls),
+                         [('ipv4', '10.0.0.1'), ('ipv6', '::1')], 'Not only the first address of each family pinged')
+        self.assertTrue(all(stop_event.is_set() for _, _, stop_event in calls), 'Slower family not asked to stop')
+
+    def test_every_family_failing(self):
+        """Verifies the error is raised when every family fails"""
+        with self.resolve_to([('ipv6', 'invalid::address'), ('ipv4', 'invalid.address')]):
+            with self.assertRaises(RuntimeError):
+                ping('dual.test', count=1, family='dual')
+
+
+class AdaptiveTimeoutTestCase(unittest.TestCase):
+    """Tests for the estimators kept by ping with adaptive_timeout"""
+
+    def test_ceiling(self):
+        """Verifies the timeout of each call is the maximum of the estimator kept for the target"""
+        # NOTE, this may be considered an e2e test
+        ping('127.0.0.1', count=1, timeout=0.3, adaptive_timeout=True)
+        ping('127.0.0.1', count=1, timeout=5, adaptive_timeout=True)
+        self.assertEqual(pythonping.RTT_ESTIMATORS[('127.0.0.1', None)].ceiling, 5,
+                         'Ceiling of the first call kept')
+
+    def test_eviction(self):
+        """Verifies the estimators of the targets pinged least recently are evicted"""
+        # NOTE, this may be considered an e2e test
+        with mock.patch.object(pythonping, 'RTT_ESTIMATORS', collections.OrderedDict()), \
+                mock.patch.object(pythonping, 'MAX_RTT_ESTIMATORS', 2):
+            for target in ('127.0.0.1', '127.0.0.2', '127.0.0.1', '127.0.0.3'):
+                ping(target, count=1, timeout=1, adaptive_timeout=True)
+            self.assertEqual(list(pythonping.RTT_ESTIMATORS), [('127.0.0.1', None), ('127.0.0.3', None)],
+                             'Wrong estimators evicted')
@@ -0,0 +1,80 @@
+import unittest
+from pythonping import icmp, scan, scanner, simulation
+
+
+class PermutationTestCase(unittest.TestCase):
+    """Tests for the cyclic group permutation"""
+
+    def test_primes(self):
+        """Verifies primes are told apart from composite numbers"""
+        self.assertEqual([number for number in range(30) if scanner.is_prime(number)],
+                         [2, 3, 5, 7, 11, 13, 17, 19, 23, 29], 'Wrong small primes')
+        self.assertFalse(scanner.is_prime(3215031751), 'Strong pseudoprime to bases 2, 3, 5 and 7 found prime')
+        self.assertEqual(scanner.next_prime(1 << 24), 16777259, 'Wrong prime following a /8')
+        self.assertEqual(scanner.prime_factors(360), {2, 3, 5}, 'Wrong prime factors')
+
+    def test_permutation(self):
+        """Verifies every integer is visited once, in a different order for different seeds"""
+        for size in (0, 1, 2, 10, 1000):
+            order = list(scanner.CyclicPermutation(size, seed=size))
+            self.assertEqual(sorted(order), list(range(size)), 'Not every integer visited once for ' + str(size))
+        self.assertEqual(list(scanner.CyclicPermutation(1000, seed=1)), list(scanner.CyclicPermutation(1000, seed=1)),
+                         'Same seed gave different orders')
+        self.assertNotEqual(list(scanner.CyclicPermutation(1000, seed=1)),
+                            list(scanner.CyclicPermutation(1000, seed=2)), 'Different seeds gave the same order')
+        self.assertNotEqual(list(scanner.CyclicPermutation(1000, seed=1)), list(range(1000)),
+                            'Integers visited in order')
+
+
+class ScannerTestCase(unittest.TestCase):
+    """Tests for Scanner"""
+
+    def test_address(self):
+        """Verifies indexes span every network scanned, in order"""
+        scan_engine = scanner.Scanner(['10.0.0.0/31', '192.168.1.7/30'], raw_socket=simulation.Network().socket())
+        self.assertEqual(scan_engine.size, 6, 'Wrong number of addresses')
+        self.assertEqual([bytes(scan_engine.address(index)) for index in range(6)],
+                         [bytes([10, 0, 0, 0]), bytes([10, 0, 0, 1]), bytes([192, 168, 1, 4]),
+                          bytes([192, 168, 1, 5]), bytes([192, 168, 1, 6]), bytes([192, 168, 1, 7])],
+                         'Wrong addresses')
+
+    def test_run(self):
+        """Verifies every address is probed once and replies are validated and timed from their content"""
+        network = simulation.Network(latency=0.002, loss=0.3, seed=3)
+        scan_engine = scanner.Scanner(['10.0.0.0/26', '10.0.1.0/28'], timeout=0.1,
+                                      raw_socket=network.socket())
+        replies = []
+        scan_engine.run(lambda address, rtt: replies.append((address, rtt)))
+        self.assertEqual(scan_engine.stats_sent, 80, 'Not every address was probed')
+        self.assertEqual(network.stats_requests, 80, 'Wrong number of requests')
+        self.assertEqual(len(replies), 80 - network.stats_lost, 'Wrong number of replies')
+        self.assertEqual(len(set(address for address, _ in replies)), len(replies), 'Address replied twice')
+        self.assertTrue(all(address.startswith(('10.0.0.', '10.0.1.')) for address, _ in replies),
+                        'Reply from an address not scanned')
+        self.assertTrue(all(0.002 <= rtt < 0.1 for _, rtt in replies), 'Wrong round trip time')
+
+    def test_invalid(self):
+        """Verifies replies that do not carry the hash of their source are not reported"""
+        network = simulation.Network()
+        raw_socket = network.socket()
+        scan_engine = scanner.Scanner('10.0.0.1/32', timeout=0.05, raw_socket=raw_socket)
+        identifier, sequence_number = scan_engine.probe_fields(bytes([10, 0, 0, 1]))
+        forged = icmp.ICMP(icmp.Types.EchoRequest, b'', identifier ^ 1, sequence_number).packet
+        raw_socket.sendto(forged, ('10.0.0.1', 0))
+        replies = []
+        scan_engine.run(lambda address, rtt: replies.append((address, rtt)))
+        self.assertEqual(scan_engine.stats_invalid, 1, 'Forged reply not rejected')
+        self.assertEqual(len(replies), 1, 'Valid reply not reported')
+
+    def test_rate(self):
+        """Verifies the rate limits how fast requests are sent"""
+        scan_engine = scanner.Scanner('10.0.0.0/27', rate=1000, timeout=0, raw_socket=simulation.Network().socket())
+        scan_engine.run()
+        self.assertGreaterEqual(scan_engine.duration, 0.03, 'Requests sent faster than the rate')
+
+    def test_scan(self):
+        """Verifies the loopback network replies"""
+        # NOTE, this may be considered an e2e test
+        replies = scan('127.0.0.0/30', timeout=0.2)
+        self.assertEqual(sorted(address for address, _ in replies),
+                         ['127.0.0.0', '127.0.0.1', '127.0.0.2', '127.0.0.3'], 'Loopback addresses did not reply')
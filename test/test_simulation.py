@@ -0,0 +1,68 @@
+import unittest
+from pythonping import executor, icmp, payload_provider, simulation
+
+
+class SimulationTestCase(unittest.TestCase):
+    """Tests for the simulated network"""
+
+    @staticmethod
+    def run_communicator(network, count=10, payload=b'banana', match=False):
+        """Runs a Communicator over a simulated network and returns its responses"""
+        comm = executor.Communicator('10.0.0.1', payload_provider.Repeat(payload, count), 0.05, 0,
+                                     seed_id=1, transport=network.socket('10.0.0.1'))
+        comm.run(match_payloads=match)
+        return comm.responses
+
+    def test_ip_header(self):
+        """Verifies the IP header has the right length and a valid checksum"""
+        header = simulation.ip_header('10.0.0.1', '127.0.0.1', 8)
+        self.assertEqual(len(header), 20, 'Wrong IP header length')
+        self.assertEqual(icmp.checksum(header), 0, 'Invalid IP header checksum')
+
+    def test_echo(self):
+        """Verifies every request gets its reply on a perfect network"""
+        responses = self.run_communicator(simulation.Network(latency=0.001))
+        self.assertTrue(responses.success(executor.SuccessOn.All), 'Not all requests got a reply')
+        self.assertGreaterEqual(responses.rtt_min, 0.001, 'Reply arrived before the latency elapsed')
+
+    def test_loss(self):
+        """Verifies lost requests time out"""
+        responses = self.run_communicator(simulation.Network(loss=1))
+        self.assertEqual(responses.stats_packets_returned, 0, 'Received replies on a network losing everything')
+
+    def test_deterministic(self):
+        """Verifies the same seed produces the same events"""
+        outcomes = []
+        for _ in range(2):
+            responses = self.run_communicator(simulation.Network(loss=0.5, seed=42))
+            outcomes.append([response.success for response in responses])
+        self.assertEqual(outcomes[0], outcomes[1], 'Same seed produced different losses')
+
+    def test_truncate(self):
+        """Verifies truncated replies fail payload matching"""
+        network = simulation.Network(truncate=3)
+        self.assertTrue(self.run_communicator(network, 2).success(executor.SuccessOn.All),
+                        'Truncated replies failed without payload matching')
+        self.assertFalse(self.run_communicator(network, 2, match=True).success(executor.SuccessOn.One),
+                         'Truncated replies succeeded with payload matching')
+
+    def test_duplicate(self):
+        """Verifies duplicated requests are delivered twice"""
+        network = simulation.Network(duplicate=1)
+        self.assertEqual(network.socket('10.0.0.1').network, network, 'Socket not bound to its network')
+        self.assertEqual(len(network.replies(icmp.ICMP(icmp.Types.EchoRequest, identifier=1).packet, '10.0.0.1')), 2,
+                         'Request not duplicated')
+        self.assertEqual(network.replies(icmp.ICMP(icmp.Types.EchoReply, identifier=1).packet, '10.0.0.1'), [],
+                         'Replied to something other than an echo request')
+
+    def test_hops(self):
+        """Verifies routers reply with Time Exceeded quoting the request when the TTL runs out"""
+        network = simulation.Network(hops=2)
+        request = icmp.ICMP(icmp.Types.EchoRequest, identifier=7, sequence_number=1).packet
+        [(reply, source, _)] = network.replies(request, '10.0.0.1', ttl=2)
+        self.assertEqual(source, network.router_address(2), 'Time Exceeded not sent by the router')
+        reply = icmp.ICMP.generate_from_raw(reply)
+        self.assertEqual(reply.message_type, icmp.Types.TimeExceeded.type_id, 'Router did not reply with Time Exceeded')
+        self.assertEqual(reply.quoted.id, 7, 'Router did not quote the request')
+        [(reply, source, _)] = network.replies(request, '10.0.0.1', ttl=3)
+        self.assertEqual(source, '10.0.0.1', 'Reply not sent by the destination')
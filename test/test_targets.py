@@ -0,0 +1,112 @@
+import math
+import unittest
+from unittest import mock
+import pythonping
+from pythonping import icmp, simulation, targets
+
+
+def reply_from(address, identifier, sequence_number):
+    """Builds an echo reply as read from a raw socket"""
+    packet = icmp.ICMP(icmp.Types.EchoReply, b'', identifier, sequence_number).packet
+    return simulation.ip_header(address, '127.0.0.1', len(packet)) + packet
+
+
+class TargetTableTestCase(unittest.TestCase):
+    """Tests for TargetTable"""
+
+    def craft_table(self, addresses, **kwargs):
+        """Creates a table released at the end of the test"""
+        table = targets.TargetTable(addresses, **kwargs)
+        self.addCleanup(table.close)
+        return table
+
+    def test_size(self):
+        """Verifies the state of a target takes tens of bytes"""
+        table = self.craft_table(['10.0.0.1'])
+        size = sum(column.itemsize for column in (table.addresses, table.rtts, table.losses, table.due,
+                                                  table.sequences, table.sent_at))
+        self.assertLessEqual(size, 32, 'State of a target too large')
+        self.assertEqual(table.address(0), '10.0.0.1', 'Wrong address')
+
+    def test_match(self):
+        """Verifies replies are matched to the target whose request they answer"""
+        table = self.craft_table(['10.0.0.1', '10.0.0.2'])
+        identifier = table.identifier(1)
+        request = icmp.ICMP.generate_from_raw(bytes(20) + table.request(1, now=10))
+        self.assertEqual((request.id, request.sequence_number), (identifier, 1), 'Request not built from the index')
+        self.assertIsNone(table.match(reply_from('10.0.0.1', identifier, 1), now=10.5),
+                          'Reply from another address matched')
+        self.assertIsNone(table.match(reply_from('10.0.0.2', identifier, 2), now=10.5),
+                          'Reply to another request matched')
+        self.assertIsNone(table.match(reply_from('10.0.0.2', table.identifier(0), 1), now=10.5),
+                          'Reply to another identifier matched')
+        self.assertEqual(table.match(reply_from('10.0.0.2', identifier, 1), now=10.5), 1, 'Reply not matched')
+        self.assertEqual(table.rtts[1], 0.5, 'Wrong round trip time')
+        self.assertIsNone(table.match(reply_from('10.0.0.2', identifier, 1), now=10.6), 'Duplicate reply matched')
+        self.assertTrue(math.isnan(table.rtts[0]), 'Round trip time of a target not replying')
+
+    def test_losses(self):
+        """Verifies requests getting no reply before the next one are counted as lost"""
+        table = self.craft_table(['10.0.0.1'])
+        for now in range(1, 4):
+            table.request(0, now)
+        self.assertEqual(table.losses[0], 2, 'Wrong number of losses')
+        table.match(reply_from('10.0.0.1', table.identifier(0), 3), now=3.1)
+        self.assertEqual(table.losses[0], 0, 'Losses not reset by a reply')
+
+    def test_identifiers(self):
+        """Verifies identifiers are reserved from those of ping, and released once the table is closed"""
+        with mock.patch.object(targets.TargetTable, 'MAX_IDENTIFIERS', 4):
+            table = targets.TargetTable('10.0.0.{0}'.format(index) for index in range(10))
+            self.assertEqual(len(set(table.identifiers)), 4, 'Wrong number of identifiers reserved')
+            self.assertTrue(set(table.identifiers) <= set(pythonping.SEED_IDs), 'Identifiers not reserved')
+            self.assertEqual(table.identifier(9), table.identifier(1),
+                             'Targets beyond the identifiers do not share them')
+        identifiers = list(table.identifiers)
+        table.close()
+        self.assertFalse(set(identifiers) & set(pythonping.SEED_IDs), 'Identifiers not released')
+
+    def test_shared_identifier(self):
+        """Verifies targets whose indexes share an identifier are told apart by address"""
+        with mock.patch.object(targets.TargetTable, 'MAX_IDENTIFIERS', 4):
+            table = self.craft_table('10.0.0.{0}'.format(index) for index in range(10))
+            for index in (1, 5):
+                table.request(index, now=1)
+            identifier = table.identifier(1)
+            self.assertEqual(table.match(reply_from(table.address(5), identifier, 1), now=2), 5,
+                             'Reply matched to a target with the same identifier')
+            self.assertEqual(table.match(reply_from(table.address(1), identifier, 1), now=2), 1, 'Reply not matched')
+
+    def test_due_targets(self):
+        """Verifies only the targets due are visited, in round robin order"""
+        table = self.craft_table(['10.0.0.{0}'.format(index) for index in range(4)], interval=4)
+        table.schedule(start=0)
+        self.assertEqual(list(table.due_targets(now=1.5)), [0, 1], 'Wrong targets due')
+        for index in (0, 1):
+            table.request(index, now=1.5)
+        self.assertEqual(list(table.due_targets(now=4)), [2, 3], 'Wrong targets due after the first ones')
+        for index in (2, 3):
+            table.request(index, now=4)
+        self.assertEqual(list(table.due_targets(now=5.5)), [0, 1], 'Targets not visited again once due')
+
+
+class MonitorTestCase(unittest.TestCase):
+    """Tests for Monitor"""
+
+    def test_run(self):
+        """Verifies every target is pinged once per interval and its state updated"""
+        network = simulation.Network(latency=0.002, loss=0.2, seed=4)
+        table = targets.TargetTable(['10.0.{0}.{1}'.format(index >> 8, index & 0xFF) for index in range(300)],
+                                    interval=0.1)
+        self.addCleanup(table.close)
+        monitor = targets.Monitor(table, raw_socket=network.socket())
+        table.schedule()
+        monitor.run(0.35)
+        self.assertGreaterEqual(monitor.stats_sent, 900, 'Targets not pinged once per interval')
+        self.assertLessEqual(monitor.stats_sent, 1200, 'Targets pinged more than once per interval')
+        self.assertTrue(all(sequence >= 3 for sequence in table.sequences), 'Target not pinged every interval')
+        # Replies still in flight when the run ends are not received
+        self.assertLessEqual(monitor.stats_received, network.stats_replies, 'Reply matched twice')
+        self.assertGreaterEqual(monitor.stats_received, network.stats_replies - 50, 'Replies not matched')
+        self.assertTrue(all(rtt >= 0.002 for rtt in table.rtts if not math.isnan(rtt)), 'Wrong round trip time')
+        self.assertGreater(sum(table.losses), 0, 'Lost requests not counted')
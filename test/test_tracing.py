@@ -0,0 +1,53 @@
+import unittest
+from pythonping import tracing
+
+
+class FakeClock:
+    """Clock returning predefined timestamps, one per call"""
+    def __init__(self, timestamps):
+        self.timestamps = iter(timestamps)
+
+    def __call__(self):
+        return next(self.timestamps)
+
+
+class TracerTestCase(unittest.TestCase):
+    """Tests for Tracer"""
+
+    def test_breakdown(self):
+        """Verifies the time between marks is assigned to the stage closing it"""
+        tracer = tracing.Tracer(clock=FakeClock([0, 1, 3, 10, 20, 25]))
+        tracer.begin(1)
+        tracer.mark(tracing.Stages.BUILD)
+        tracer.mark(tracing.Stages.SEND)
+        tracer.begin(2)
+        tracer.mark(tracing.Stages.BUILD)
+        tracer.mark(tracing.Stages.SELECT)
+        breakdown = tracer.breakdown()
+        self.assertEqual(dict(breakdown[1]), {tracing.Stages.BUILD: 1, tracing.Stages.SEND: 2},
+                         'Wrong breakdown for first probe')
+        self.assertEqual(dict(breakdown[2]), {tracing.Stages.BUILD: 10, tracing.Stages.SELECT: 5},
+                         'Wrong breakdown for second probe')
+
+    def test_summary(self):
+        """Verifies network time is separated from library overhead"""
+        tracer = tracing.Tracer(clock=FakeClock([0, 1, 5, 6]))
+        tracer.begin(1)
+        tracer.mark(tracing.Stages.SEND)
+        tracer.mark(tracing.Stages.SELECT)
+        tracer.mark(tracing.Stages.RECEIVE)
+        summary = tracer.summary()
+        self.assertEqual(summary['probes'], 1, 'Wrong number of probes')
+        self.assertEqual(summary['network'], 4, 'Wrong network time')
+        self.assertEqual(summary['overhead'], 2, 'Wrong library overhead')
+        self.assertIn('1 probes', tracer.report(), 'Report does not mention the number of probes')
+
+    def test_capacity_and_callback(self):
+        """Verifies the ring buffer is bounded and the callback sees every mark"""
+        seen = []
+        tracer = tracing.Tracer(capacity=3, callback=lambda probe, stage, ts: seen.append(stage))
+        tracer.begin(1)
+        for _ in range(5):
+            tracer.mark(tracing.Stages.SELECT)
+        self.assertEqual(len(tracer.events), 3, 'Ring buffer grew beyond its capacity')
+        self.assertEqual(len(seen), 6, 'Callback not called for every mark')
@@ -12,3 +12,18 @@ class UtilsTestCase(unittest.TestCase):
             self.assertEqual(
                 len(utils.random_text(size)), size,
                 'Unable to generate a random string of {0} characters'.format(size))
+
+    def test_random_bytes_alphabet(self):
+        """Verifies that random_bytes only generates uppercase letters and digits"""
+        self.assertTrue(set(utils.random_bytes(2000)) <= set(utils.ALPHABET), 'Generated bytes out of the alphabet')
+
+    def test_random_bytes_seed(self):
+        """Verifies that random_bytes generates the same bytes for the same seed"""
+        self.assertEqual(utils.random_bytes(100, seed=1), utils.random_bytes(100, seed=1),
+                         'Generated different bytes with the same seed')
+        self.assertEqual(utils.random_bytes(0, seed=1), b'', 'Generated bytes for size 0')
+
+    def test_cached_payload(self):
+        """Verifies that cached_payload returns the same payload for the same size"""
+        self.assertIs(utils.cached_payload(1400), utils.cached_payload(1400), 'Payload not cached')
+        self.assertEqual(len(utils.cached_payload(33)), 33, 'Cached payload of wrong size')